@@ -0,0 +1,68 @@
+"""
+Per-request cost of API key verification with and without the verified-token cache.
+
+Calls `verify_token` the way `verify_api_key` does for every request, cycling
+through a pool of distinct keys so the cached run sees the same hit pattern a
+busy deployment would.
+
+Usage:
+    python benchmarks/auth_bench.py --requests 200000 --keys 1000
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+os.environ.setdefault("SECRET_KEY", "benchmark-secret-key-with-enough-bytes")
+os.environ.setdefault("ALGORITHM", "HS256")
+
+from utils import auth
+
+
+def run(tokens, total: int, cached: bool) -> list:
+    latencies = []
+    for i in range(total):
+        token = tokens[i % len(tokens)]
+        if not cached:
+            auth.token_cache.entries.clear()
+        started = time.perf_counter()
+        assert auth.verify_token(token) is not None
+        latencies.append(time.perf_counter() - started)
+    return latencies
+
+
+def report(label: str, latencies: list) -> None:
+    latencies.sort()
+    total = sum(latencies)
+    print(
+        f"{label:>10}: {len(latencies) / total:>10.0f} verifications/s  "
+        f"mean={statistics.mean(latencies) * 1e6:.2f}us  "
+        f"p50={latencies[len(latencies) // 2] * 1e6:.2f}us  "
+        f"p99={latencies[int(len(latencies) * 0.99)] * 1e6:.2f}us"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=200000)
+    parser.add_argument("--keys", type=int, default=1000)
+    args = parser.parse_args()
+
+    tokens = [
+        auth.create_access_token({"userId": f"user-{i}", "exp": int(time.time()) + 3600})
+        for i in range(args.keys)
+    ]
+    print(f"algorithm={auth.ALGORITHM} keys={args.keys} requests={args.requests}")
+    report("uncached", run(tokens, args.requests, cached=False))
+    auth.token_cache.entries.clear()
+    auth.token_cache.hits = auth.token_cache.misses = 0
+    report("cached", run(tokens, args.requests, cached=True))
+    print(f"token cache: {auth.token_cache.stats()}")
+
+
+if __name__ == "__main__":
+    main()
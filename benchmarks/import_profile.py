@@ -0,0 +1,154 @@
+"""
+Import-time profile of the app's cold start, per module and per package.
+
+Imports the entry point in fresh interpreters with `python -X importtime`, takes
+the median over several runs and reports the total, the slowest modules by
+cumulative time and the self time of each top-level package. Modules that must
+stay off the startup path (the provider SDKs, MongoDB drivers and Prisma, which
+are imported on first use) are checked too: the script exits non-zero if one
+shows up, or if the total exceeds --budget-ms or regressed against a saved
+--compare run by more than --threshold percent, so it can gate CI.
+
+Usage:
+    python benchmarks/import_profile.py
+    python benchmarks/import_profile.py --module function_app --output imports.json
+    python benchmarks/import_profile.py --compare imports.json --budget-ms 1500
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from collections import defaultdict
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+# Imported lazily by the app; seeing one at import time is a regression.
+FORBIDDEN = ["openai", "google.generativeai", "pymongo", "motor", "prisma"]
+
+
+def import_times(module: str) -> dict:
+    """
+    Import a module in a fresh interpreter.
+
+    :return: Dictionary of module name to (self, cumulative) microseconds.
+    """
+    env = {
+        **os.environ,
+        "PYTHONPATH": os.pathsep.join(filter(None, [ROOT, os.getenv("PYTHONPATH")])),
+    }
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT,
+        env=env,
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode != 0:
+        sys.exit(f"import {module} failed:\n{result.stderr[-2000:]}")
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        own, cumulative, name = line[len("import time:") :].split("|")
+        times[name.strip()] = (int(own), int(cumulative))
+    return times
+
+
+def profile(module: str, repeat: int) -> dict:
+    runs = [import_times(module) for _ in range(repeat)]
+    modules = {}
+    for name in runs[0]:
+        samples = [run[name] for run in runs if name in run]
+        modules[name] = {
+            "self_ms": round(statistics.median(s[0] for s in samples) / 1000, 2),
+            "cumulative_ms": round(statistics.median(s[1] for s in samples) / 1000, 2),
+        }
+    packages = defaultdict(float)
+    for name, times in modules.items():
+        packages[name.split(".")[0]] += times["self_ms"]
+    return {
+        "module": module,
+        "repeat": repeat,
+        "total_ms": round(sum(m["self_ms"] for m in modules.values()), 2),
+        "modules_imported": len(modules),
+        "packages": {
+            name: round(ms, 2)
+            for name, ms in sorted(packages.items(), key=lambda item: -item[1])
+        },
+        "modules": modules,
+        "forbidden": [
+            package
+            for package in FORBIDDEN
+            if any(
+                name == package or name.startswith(package + ".") for name in modules
+            )
+        ],
+    }
+
+
+def report(result: dict, top: int) -> None:
+    print(
+        f"import {result['module']}: {result['total_ms']:.1f} ms, "
+        f"{result['modules_imported']} modules (median of {result['repeat']} runs)"
+    )
+    print(f"\n{'package':<32}{'self ms':>10}")
+    for name, ms in list(result["packages"].items())[:top]:
+        print(f"{name:<32}{ms:>10.1f}")
+    slowest = sorted(
+        result["modules"].items(), key=lambda item: -item[1]["cumulative_ms"]
+    )
+    print(f"\n{'module':<48}{'cumulative ms':>14}{'self ms':>10}")
+    for name, times in slowest[:top]:
+        print(f"{name:<48}{times['cumulative_ms']:>14.1f}{times['self_ms']:>10.1f}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--module", default="llmhub", help="entry point to import")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--top", type=int, default=25)
+    parser.add_argument("--output", help="write the profile as JSON")
+    parser.add_argument("--compare", help="JSON profile of an earlier run")
+    parser.add_argument("--threshold", type=float, default=20.0)
+    parser.add_argument("--budget-ms", type=float, default=0.0)
+    args = parser.parse_args()
+
+    result = profile(args.module, args.repeat)
+    report(result, args.top)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(result, f, indent=2)
+
+    failed = False
+    if result["forbidden"]:
+        print(f"\nimported at startup but meant to load lazily: {result['forbidden']}")
+        failed = True
+    if args.budget_ms and result["total_ms"] > args.budget_ms:
+        print(
+            f"\ntotal {result['total_ms']:.1f} ms exceeds the {args.budget_ms:.0f} ms budget"
+        )
+        failed = True
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        change = (
+            (result["total_ms"] - baseline["total_ms"]) / baseline["total_ms"] * 100
+        )
+        print(
+            f"\ntotal {baseline['total_ms']:.1f} -> {result['total_ms']:.1f} ms ({change:+.1f}%)"
+        )
+        new = sorted(set(result["packages"]) - set(baseline["packages"]))
+        if new:
+            print(f"newly imported packages: {new}")
+        if change > args.threshold:
+            print(f"regressed by more than {args.threshold:.0f}%")
+            failed = True
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
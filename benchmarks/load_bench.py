@@ -0,0 +1,121 @@
+"""
+Concurrent load test for /v1/chat/completions against stub upstreams.
+
+The router and every provider adapter are replaced with stubs that sleep for a
+fixed upstream latency, so the numbers reflect how many requests a single
+worker can keep in flight rather than real provider performance.
+
+Usage:
+    python benchmarks/load_bench.py --requests 500 --concurrency 200 --latency 0.25
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+os.environ.setdefault("GEMINI_API_KEY", "stub")
+os.environ.setdefault("SECRET_KEY", "load-test-secret")
+os.environ.setdefault("ALGORITHM", "HS256")
+
+import httpx
+
+import llmhub
+from llmhub import pipeline
+from service.chat import service_router
+from service.chat.completion import Completion, CompletionUsage
+from utils.auth import create_access_token
+from utils.postgres import ApiCallLogSink
+
+logging.getLogger().setLevel(logging.WARNING)
+
+
+class StubPool:
+    """Stands in for the asyncpg pool used by the api call log sink."""
+
+    async def fetchrow(self, query, *args):
+        return {"userId": args[1]}
+
+    async def copy_records_to_table(self, table, records, columns):
+        return f"COPY {len(records)}"
+
+
+def make_stub_route(latency: float):
+    async def stub_route(msg, model="automatic"):
+        await asyncio.sleep(latency)
+        return "gpt-4o-mini"
+
+    return stub_route
+
+
+def make_stub_adapter(latency: float):
+    async def stub_adapter(request):
+        await asyncio.sleep(latency)
+        return Completion.from_text(
+            "llmhub-stub",
+            "stub",
+            int(time.time()),
+            "ok",
+            CompletionUsage(prompt_tokens=5, completion_tokens=1, total_tokens=6),
+        )
+
+    return stub_adapter
+
+
+async def run(total: int, concurrency: int, latency: float) -> None:
+    pipeline.route = make_stub_route(latency)
+    stub_adapter = make_stub_adapter(latency)
+    for model, (provider, _) in service_router.MODEL_PROVIDERS.items():
+        service_router.MODEL_PROVIDERS[model] = (provider, stub_adapter)
+    llmhub.pool = StubPool()
+    llmhub.log_sink = ApiCallLogSink(llmhub.pool)
+    await llmhub.log_sink.start()
+
+    token = create_access_token({"userId": "load-test"})
+    payload = {
+        "model": "automatic",
+        "messages": [{"role": "user", "content": "Say hello."}],
+    }
+    semaphore = asyncio.Semaphore(concurrency)
+    transport = httpx.ASGITransport(app=llmhub.app)
+    limits = httpx.Limits(max_connections=concurrency)
+
+    async with httpx.AsyncClient(
+        transport=transport, base_url="http://llmhub", limits=limits, timeout=None
+    ) as client:
+
+        async def one() -> int:
+            async with semaphore:
+                response = await client.post(
+                    "/v1/chat/completions",
+                    json=payload,
+                    headers={"Authorization": f"Bearer {token}"},
+                )
+                return response.status_code
+
+        started = time.perf_counter()
+        statuses = await asyncio.gather(*(one() for _ in range(total)))
+        elapsed = time.perf_counter() - started
+    await llmhub.log_sink.close()
+
+    ok = sum(1 for status in statuses if status == 200)
+    serial = total * latency * 2
+    print(f"requests:           {total} ({ok} ok)")
+    print(f"concurrency:        {concurrency}")
+    print(f"upstream latency:   {latency * 1000:.0f} ms (route + completion)")
+    print(f"elapsed:            {elapsed:.2f} s")
+    print(f"throughput:         {total / elapsed:.1f} req/s")
+    print(f"serial equivalent:  {serial:.2f} s ({serial / elapsed:.1f}x speed-up)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=0.25)
+    args = parser.parse_args()
+    asyncio.run(run(args.requests, args.concurrency, args.latency))
@@ -0,0 +1,106 @@
+"""
+Per-request latency with inline api_call_logs inserts vs the background log sink.
+
+Uses an in-process Postgres stand-in that charges a fixed round-trip time per
+statement plus a small per-row cost, so the comparison isolates where the
+database write happens rather than real Postgres throughput.
+
+Usage:
+    python benchmarks/log_sink_bench.py --requests 2000 --concurrency 100 --rtt 0.004
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from service.chat.completion import Completion, CompletionUsage
+from utils.postgres import ApiCallLogSink, insert_api_call_log
+
+logging.getLogger().setLevel(logging.WARNING)
+
+
+class PostgresStandIn:
+    """Local stand-in for an asyncpg pool with a configurable round-trip time."""
+
+    def __init__(self, rtt: float, per_row: float = 0.00001, max_connections: int = 10):
+        self.rtt = rtt
+        self.per_row = per_row
+        self.connections = asyncio.Semaphore(max_connections)
+        self.round_trips = 0
+        self.rows = 0
+
+    async def _round_trip(self, rows: int) -> None:
+        async with self.connections:
+            self.round_trips += 1
+            self.rows += rows
+            await asyncio.sleep(self.rtt + self.per_row * rows)
+
+    async def fetchrow(self, query, *args):
+        await self._round_trip(1)
+        return {"userId": args[1]}
+
+    async def copy_records_to_table(self, table, records, columns):
+        await self._round_trip(len(records))
+        return f"COPY {len(records)}"
+
+
+COMPLETION = Completion.from_text(
+    "bench",
+    "gpt-4o-mini",
+    0,
+    "ok",
+    CompletionUsage(prompt_tokens=10, completion_tokens=5, total_tokens=15),
+)
+
+
+async def run(mode: str, total: int, concurrency: int, rtt: float):
+    db = PostgresStandIn(rtt)
+    spill_path = os.path.join(tempfile.mkdtemp(), "spill.jsonl")
+    sink = ApiCallLogSink(db, spill_path=spill_path) if mode == "sink" else None
+    if sink:
+        await sink.start()
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def one():
+        async with semaphore:
+            started = time.perf_counter()
+            if sink:
+                sink.submit(COMPLETION, "bench-user", "bench-key")
+            else:
+                await insert_api_call_log(COMPLETION, "bench-user", "bench-key", db)
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(total)))
+    elapsed = time.perf_counter() - started
+    if sink:
+        await sink.close()
+
+    ordered = sorted(latencies)
+    print(f"{mode}")
+    print(f"  p50 log latency:  {statistics.median(ordered) * 1000:.3f} ms")
+    print(f"  p99 log latency:  {ordered[int(len(ordered) * 0.99) - 1] * 1000:.3f} ms")
+    print(f"  wall time:        {elapsed:.2f} s")
+    print(f"  db round trips:   {db.round_trips} for {db.rows} rows")
+
+
+async def main(total: int, concurrency: int, rtt: float) -> None:
+    await run("inline", total, concurrency, rtt)
+    await run("sink", total, concurrency, rtt)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=100)
+    parser.add_argument("--rtt", type=float, default=0.004)
+    args = parser.parse_args()
+    asyncio.run(main(args.requests, args.concurrency, args.rtt))
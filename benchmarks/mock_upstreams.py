@@ -0,0 +1,460 @@
+"""
+Local stand-ins for the upstream services, used by benchmarks/service_bench.py.
+
+- MockOpenAIServer: an HTTP/1.1 server speaking the OpenAI wire format used by
+  Azure OpenAI and the Azure AI (Meta, Mistral) endpoints: chat completions,
+  streamed as server-sent events when asked, and base64 embeddings. It runs on
+  its own event loop in a background thread so serving mock traffic does not
+  show up as lag on the loop under test.
+- MockGemini: replaces the configured google.generativeai module. The SDK
+  talks gRPC over TLS to a fixed host, so it is emulated at the SDK boundary
+  with the same latency model instead of on the wire.
+- PostgresStandIn: an asyncpg pool stand-in charging a round-trip time per
+  statement.
+
+Latencies are described as "fixed:0.2", "uniform:0.1:0.4" or
+"lognormal:0.25:0.5" (median seconds, sigma) and are drawn from seeded
+generators, so runs with the same arguments see the same distributions.
+"""
+
+import asyncio
+import base64
+import hashlib
+import json
+import math
+import random
+import threading
+import time
+import uuid
+
+import numpy as np
+
+
+MODELS = [
+    "claude-3.5-sonnet",
+    "gpt-4o-mini",
+    "gemini-1.5-flash",
+    "mistral-nemo",
+    "meta-llama",
+]
+
+
+class LatencyModel:
+    """
+    A seeded latency distribution parsed from a spec string.
+    """
+
+    def __init__(self, spec: str, seed: int = 0):
+        kind, *params = spec.split(":")
+        values = [float(p) for p in params]
+        if kind == "fixed" and len(values) == 1:
+            self.sample = lambda: values[0]
+        elif kind == "uniform" and len(values) == 2:
+            self.sample = lambda: self.rng.uniform(values[0], values[1])
+        elif kind == "lognormal" and len(values) == 2:
+            mu = math.log(values[0])
+            self.sample = lambda: self.rng.lognormvariate(mu, values[1])
+        else:
+            raise ValueError(
+                f"Invalid latency spec {spec!r}: use fixed:S, uniform:LO:HI or lognormal:MEDIAN:SIGMA."
+            )
+        self.spec = spec
+        self.rng = random.Random(seed)
+
+
+class Upstream:
+    """
+    Timing of one emulated provider: time to first byte, token generation rate
+    and completion length, plus an optional failure rate.
+    """
+
+    def __init__(
+        self,
+        ttfb: str,
+        tokens_per_second: float = 100.0,
+        completion_tokens: int = 64,
+        chunk_tokens: int = 1,
+        error_rate: float = 0.0,
+        seed: int = 0,
+    ):
+        self.ttfb = LatencyModel(ttfb, seed)
+        self.tokens_per_second = tokens_per_second
+        self.completion_tokens = completion_tokens
+        self.chunk_tokens = max(chunk_tokens, 1)
+        self.error_rate = error_rate
+        self.rng = random.Random(seed + 1)
+        self.requests = 0
+        self.errors = 0
+
+    def plan(self, max_tokens) -> tuple:
+        """
+        :return: Tuple of (time to first byte, completion tokens, whether to fail).
+        """
+        self.requests += 1
+        fail = self.rng.random() < self.error_rate
+        self.errors += fail
+        tokens = min(max_tokens or self.completion_tokens, self.completion_tokens)
+        return self.ttfb.sample(), max(tokens, 1), fail
+
+    def generation_time(self, tokens: int) -> float:
+        return tokens / self.tokens_per_second if self.tokens_per_second else 0.0
+
+
+def _prompt_tokens(messages) -> int:
+    return sum(len(str(m.get("content", ""))) // 4 + 4 for m in messages)
+
+
+def _completion_text(tokens: int) -> list:
+    return ["tok" if i else "Mock" for i in range(tokens)]
+
+
+class MockOpenAIServer:
+    """
+    OpenAI-compatible mock upstream on 127.0.0.1, one per emulated provider.
+    """
+
+    def __init__(self, name: str, upstream: Upstream):
+        self.name = name
+        self.upstream = upstream
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+        self.server = None
+        self.port = None
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.port}"
+
+    def start(self) -> "MockOpenAIServer":
+        self.thread.start()
+        self.server = asyncio.run_coroutine_threadsafe(
+            asyncio.start_server(self._serve, "127.0.0.1", 0, backlog=4096), self.loop
+        ).result()
+        self.port = self.server.sockets[0].getsockname()[1]
+        return self
+
+    def stop(self) -> None:
+        async def close():
+            self.server.close()
+            await self.server.wait_closed()
+
+        asyncio.run_coroutine_threadsafe(close(), self.loop).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+
+    async def _serve(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                head = await reader.readuntil(b"\r\n\r\n")
+                request_line, *header_lines = head.decode("latin-1").split("\r\n")
+                method, target, _ = request_line.split(" ", 2)
+                headers = {}
+                for line in header_lines:
+                    if ":" in line:
+                        key, value = line.split(":", 1)
+                        headers[key.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get("content-length", 0)))
+                await self._handle(method, target.split("?", 1)[0], body, writer)
+                if headers.get("connection", "").lower() == "close":
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def _respond(self, writer, status: int, payload: dict) -> None:
+        body = json.dumps(payload).encode()
+        reason = {200: "OK", 404: "Not Found", 500: "Internal Server Error"}[status]
+        writer.write(
+            f"HTTP/1.1 {status} {reason}\r\nContent-Type: application/json\r\n"
+            f"Content-Length: {len(body)}\r\n\r\n".encode() + body
+        )
+        await writer.drain()
+
+    async def _handle(self, method: str, path: str, body: bytes, writer) -> None:
+        if method == "HEAD":
+            # Connection warm-up probes: headers only, as a real server would.
+            writer.write(b"HTTP/1.1 404 Not Found\r\nContent-Length: 0\r\n\r\n")
+            await writer.drain()
+            return
+        if method != "POST":
+            await self._respond(writer, 404, {"error": {"message": "Not found."}})
+            return
+        payload = json.loads(body or b"{}")
+        if path.endswith("/chat/completions"):
+            await self._chat(payload, writer)
+        elif path.endswith("/embeddings"):
+            await self._embeddings(payload, writer)
+        else:
+            await self._respond(writer, 404, {"error": {"message": "Not found."}})
+
+    async def _chat(self, payload: dict, writer) -> None:
+        ttfb, tokens, fail = self.upstream.plan(payload.get("max_tokens"))
+        await asyncio.sleep(ttfb)
+        if fail:
+            await self._respond(
+                writer, 500, {"error": {"message": "Injected upstream failure."}}
+            )
+            return
+        model = payload.get("model") or self.name
+        prompt_tokens = _prompt_tokens(payload.get("messages", []))
+        usage = {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": tokens,
+            "total_tokens": prompt_tokens + tokens,
+        }
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+        created = int(time.time())
+        words = _completion_text(tokens)
+
+        if not payload.get("stream"):
+            await asyncio.sleep(self.upstream.generation_time(tokens))
+            await self._respond(
+                writer,
+                200,
+                {
+                    "id": completion_id,
+                    "object": "chat.completion",
+                    "created": created,
+                    "model": model,
+                    "choices": [
+                        {
+                            "index": 0,
+                            "message": {
+                                "role": "assistant",
+                                "content": " ".join(words),
+                            },
+                            "finish_reason": "stop",
+                        }
+                    ],
+                    "usage": usage,
+                },
+            )
+            return
+
+        writer.write(
+            b"HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\n"
+            b"Transfer-Encoding: chunked\r\n\r\n"
+        )
+
+        def chunk(choices, **extra) -> bytes:
+            event = {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": created,
+                "model": model,
+                "choices": choices,
+                **extra,
+            }
+            return b"data: " + json.dumps(event).encode() + b"\n\n"
+
+        async def send(data: bytes) -> None:
+            writer.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+            await writer.drain()
+
+        step = self.upstream.chunk_tokens
+        for start in range(0, tokens, step):
+            if start:
+                await asyncio.sleep(self.upstream.generation_time(step))
+            delta = {"content": " ".join(words[start : start + step]) + " "}
+            if not start:
+                delta["role"] = "assistant"
+            await send(chunk([{"index": 0, "delta": delta, "finish_reason": None}]))
+        await send(chunk([{"index": 0, "delta": {}, "finish_reason": "stop"}]))
+        if (payload.get("stream_options") or {}).get("include_usage"):
+            await send(chunk([], usage=usage))
+        await send(b"data: [DONE]\n\n")
+        writer.write(b"0\r\n\r\n")
+        await writer.drain()
+
+    async def _embeddings(self, payload: dict, writer) -> None:
+        inputs = payload.get("input")
+        if isinstance(inputs, str) or (inputs and isinstance(inputs[0], int)):
+            inputs = [inputs]
+        ttfb, _, fail = self.upstream.plan(None)
+        await asyncio.sleep(ttfb)
+        if fail:
+            await self._respond(
+                writer, 500, {"error": {"message": "Injected upstream failure."}}
+            )
+            return
+        vectors = _embedding_vectors(inputs, payload.get("dimensions") or 1536)
+        tokens = sum(len(str(item)) // 4 + 1 for item in inputs)
+        await self._respond(
+            writer,
+            200,
+            {
+                "object": "list",
+                "model": payload.get("model"),
+                "data": [
+                    {
+                        "object": "embedding",
+                        "index": i,
+                        "embedding": base64.b64encode(
+                            vector.astype("<f4").tobytes()
+                        ).decode(),
+                    }
+                    for i, vector in enumerate(vectors)
+                ],
+                "usage": {"prompt_tokens": tokens, "total_tokens": tokens},
+            },
+        )
+
+
+def _embedding_vectors(inputs, dimensions: int) -> np.ndarray:
+    # Deterministic per input, so identical texts embed identically.
+    rows = []
+    for item in inputs:
+        seed = int.from_bytes(hashlib.sha256(str(item).encode()).digest()[:8], "little")
+        vector = np.random.default_rng(seed).standard_normal(dimensions)
+        rows.append(vector / np.linalg.norm(vector))
+    return np.asarray(rows, dtype=np.float32)
+
+
+class _Usage:
+    def __init__(self, prompt_tokens: int, completion_tokens: int):
+        self.prompt_token_count = prompt_tokens
+        self.candidates_token_count = completion_tokens
+        self.total_token_count = prompt_tokens + completion_tokens
+
+
+class _GeminiResponse:
+    def __init__(self, text: str, usage=None):
+        self.text = text
+        self.usage_metadata = usage
+
+
+class _GeminiStream:
+    def __init__(self, upstream: Upstream, words: list, usage: _Usage):
+        self.upstream = upstream
+        self.words = words
+        self.usage = usage
+
+    async def __aiter__(self):
+        step = self.upstream.chunk_tokens
+        for start in range(0, len(self.words), step):
+            if start:
+                await asyncio.sleep(self.upstream.generation_time(step))
+            last = start + step >= len(self.words)
+            yield _GeminiResponse(
+                " ".join(self.words[start : start + step]) + " ",
+                self.usage if last else None,
+            )
+
+
+class _GeminiChat:
+    def __init__(self, model: "_GeminiModel", history: list):
+        self.model = model
+        self.history = history
+
+    async def send_message_async(self, content, stream: bool = False):
+        upstream = self.model.upstream
+        ttfb, tokens, fail = upstream.plan(None)
+        await asyncio.sleep(ttfb)
+        if fail:
+            raise RuntimeError("Injected upstream failure.")
+        prompt_tokens = sum(len(str(m["parts"])) // 4 + 4 for m in self.history)
+        usage = _Usage(prompt_tokens, tokens)
+        words = _completion_text(tokens)
+        if stream:
+            return _GeminiStream(upstream, words, usage)
+        await asyncio.sleep(upstream.generation_time(tokens))
+        return _GeminiResponse(" ".join(words), usage)
+
+
+class _GeminiModel:
+    def __init__(self, upstream: Upstream, name: str):
+        self.upstream = upstream
+        self.name = name
+
+    def start_chat(self, history=None):
+        return _GeminiChat(self, history or [])
+
+    async def generate_content_async(self, content):
+        # Used by the LLM router: answer with a model name, fixed per prompt.
+        ttfb, _, fail = self.upstream.plan(None)
+        await asyncio.sleep(ttfb)
+        if fail:
+            raise RuntimeError("Injected upstream failure.")
+        digest = hashlib.sha256(str(content).encode()).digest()[0]
+        return _GeminiResponse(MODELS[digest % len(MODELS)])
+
+
+class MockGemini:
+    """
+    Drop-in for the configured `google.generativeai` module.
+    """
+
+    def __init__(self, upstream: Upstream):
+        self.upstream = upstream
+
+    def GenerativeModel(self, name: str):
+        return _GeminiModel(self.upstream, name)
+
+    async def embed_content_async(self, model, content, output_dimensionality=None):
+        ttfb, _, fail = self.upstream.plan(None)
+        await asyncio.sleep(ttfb)
+        if fail:
+            raise RuntimeError("Injected upstream failure.")
+        vectors = _embedding_vectors(content, output_dimensionality or 768)
+        return {"embedding": vectors.tolist()}
+
+
+class _Connection:
+    async def add_listener(self, channel, callback):
+        pass
+
+    async def remove_listener(self, channel, callback):
+        pass
+
+
+class PostgresStandIn:
+    """
+    Local stand-in for an asyncpg pool with a configurable round-trip time.
+
+    Writes are accepted and counted; reads return no rows.
+    """
+
+    def __init__(self, rtt: float = 0.002, max_connections: int = 10):
+        self.rtt = rtt
+        self.connections = asyncio.Semaphore(max_connections)
+        self.round_trips = 0
+        self.rows = 0
+
+    async def _round_trip(self, rows: int = 1) -> None:
+        async with self.connections:
+            self.round_trips += 1
+            self.rows += rows
+            await asyncio.sleep(self.rtt)
+
+    async def execute(self, query, *args):
+        await self._round_trip()
+        return "OK 0"
+
+    async def executemany(self, query, rows):
+        await self._round_trip(len(rows))
+
+    async def fetch(self, query, *args):
+        await self._round_trip()
+        return []
+
+    async def fetchrow(self, query, *args):
+        await self._round_trip()
+        return None
+
+    async def fetchval(self, query, *args):
+        await self._round_trip()
+        return None
+
+    async def copy_records_to_table(self, table, records, columns):
+        await self._round_trip(len(records))
+        return f"COPY {len(records)}"
+
+    async def acquire(self):
+        return _Connection()
+
+    async def release(self, connection):
+        pass
+
+    async def close(self):
+        pass
@@ -0,0 +1,94 @@
+"""
+Routing latency and agreement benchmark: local classifier vs the Gemini router.
+
+Scores the in-process classifier against the labelled prompt set in
+benchmarks/data/routing_prompts.jsonl. With --gemini (and GEMINI_API_KEY set)
+the same prompts are also sent to the LLM router so latency and agreement can be
+compared side by side.
+
+Usage:
+    python benchmarks/routing_bench.py [--gemini] [--repeat 200]
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from llmhub.classifier import classifier
+
+DATA = os.path.join(os.path.dirname(__file__), "data", "routing_prompts.jsonl")
+
+
+def load_prompts(path: str = DATA):
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def percentile(samples, pct: float) -> float:
+    ordered = sorted(samples)
+    index = min(int(len(ordered) * pct / 100), len(ordered) - 1)
+    return ordered[index]
+
+
+def report(name: str, latencies, decisions, rows) -> None:
+    correct = sum(1 for d, row in zip(decisions, rows) if d == row["label"])
+    print(f"{name}")
+    print(f"  accuracy vs labels: {correct}/{len(rows)} ({correct / len(rows):.1%})")
+    print(f"  p50 latency:        {statistics.median(latencies) * 1000:.3f} ms")
+    print(f"  p99 latency:        {percentile(latencies, 99) * 1000:.3f} ms")
+
+
+def bench_local(rows, repeat: int):
+    decisions = [classifier.predict(row["prompt"])[0] for row in rows]
+    latencies = []
+    for _ in range(repeat):
+        for row in rows:
+            started = time.perf_counter()
+            classifier.predict(row["prompt"])
+            latencies.append(time.perf_counter() - started)
+    return latencies, decisions
+
+
+async def bench_gemini(rows):
+    from llmhub.router import route_llm
+
+    latencies, decisions = [], []
+    for row in rows:
+        started = time.perf_counter()
+        decisions.append(await route_llm(row["prompt"]))
+        latencies.append(time.perf_counter() - started)
+    return latencies, decisions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--data", default=DATA)
+    parser.add_argument("--repeat", type=int, default=200)
+    parser.add_argument("--gemini", action="store_true")
+    args = parser.parse_args()
+
+    rows = load_prompts(args.data)
+    local_latencies, local_decisions = bench_local(rows, args.repeat)
+    report("local classifier", local_latencies, local_decisions, rows)
+
+    if args.gemini:
+        logging.getLogger().setLevel(logging.WARNING)
+        gemini_latencies, gemini_decisions = asyncio.run(bench_gemini(rows))
+        report("gemini router", gemini_latencies, gemini_decisions, rows)
+        agree = sum(1 for a, b in zip(local_decisions, gemini_decisions) if a == b)
+        print(f"agreement local/gemini: {agree}/{len(rows)} ({agree / len(rows):.1%})")
+        speedup = statistics.median(gemini_latencies) / statistics.median(
+            local_latencies
+        )
+        print(f"median speed-up:        {speedup:,.0f}x")
+
+
+if __name__ == "__main__":
+    main()
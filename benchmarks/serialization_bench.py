@@ -0,0 +1,231 @@
+"""
+Per-request (de)serialization CPU for large multi-turn chat payloads.
+
+Measures the CPU time a /v1/chat/completions request spends turning JSON into
+objects and back, for conversations of increasing size, on the previous path
+and the current one:
+
+    decode    request body to CreateChatCompletionRequest. Before: json.loads,
+              then pydantic validation once for the route and once more for the
+              validate_request dependency, as FastAPI did. After:
+              parse_json_body, orjson and a single validation.
+    upstream  provider response body to the gateway's completion object.
+              Before: the OpenAI SDK's json.loads and model construction.
+              After: Completion.from_json.
+    encode    completion to the response body. Before: jsonable_encoder and
+              json.dumps. After: Completion.to_json.
+    cache     response cache round trip. Before: pydantic dump/validate JSON.
+              After: Completion.to_json/from_json.
+
+Usage:
+    python benchmarks/serialization_bench.py --turns 10 100 400 --chars 2000
+    python benchmarks/serialization_bench.py --output ser.json
+    python benchmarks/serialization_bench.py --compare ser.json
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from fastapi.encoders import jsonable_encoder
+from openai._models import construct_type
+from openai.types.chat import ChatCompletion as SDKChatCompletion
+
+from pydantic_types.chat import CreateChatCompletionRequest
+from service.chat.completion import Completion
+from utils.json_body import parse_json_body
+
+WORDS = (
+    "the quick brown fox jumps over lazy dog routing model latency token context "
+    "window provider request response cache def return import async await {} () [] "
+    'données über café 東京 データ 123 4567 0.5 "quoted" back\\slash new\nline'
+).split(" ")
+
+
+def text(rng: random.Random, chars: int) -> str:
+    words, size = [], 0
+    while size < chars:
+        word = rng.choice(WORDS)
+        words.append(word)
+        size += len(word) + 1
+    return " ".join(words)
+
+
+def make_request(turns: int, chars: int) -> bytes:
+    rng = random.Random(turns * chars)
+    messages = [{"role": "system", "content": text(rng, chars // 4)}]
+    for i in range(turns):
+        role = "user" if i % 2 == 0 else "assistant"
+        messages.append({"role": role, "content": text(rng, chars)})
+    if messages[-1]["role"] != "user":
+        messages.append({"role": "user", "content": text(rng, chars)})
+    return json.dumps(
+        {
+            "model": "automatic",
+            "messages": messages,
+            "temperature": 0,
+            "max_completion_tokens": 1024,
+        }
+    ).encode()
+
+
+def make_response(chars: int) -> bytes:
+    rng = random.Random(chars)
+    return json.dumps(
+        {
+            "id": "chatcmpl-bench",
+            "object": "chat.completion",
+            "created": 1700000000,
+            "model": "gpt-4o-mini",
+            "choices": [
+                {
+                    "index": 0,
+                    "message": {
+                        "role": "assistant",
+                        "content": text(rng, chars),
+                        "refusal": None,
+                    },
+                    "logprobs": None,
+                    "finish_reason": "stop",
+                }
+            ],
+            "usage": {
+                "prompt_tokens": 12000,
+                "completion_tokens": 900,
+                "total_tokens": 12900,
+                "prompt_tokens_details": {"cached_tokens": 0},
+                "completion_tokens_details": {"reasoning_tokens": 0},
+            },
+            "system_fingerprint": "fp_bench",
+        }
+    ).encode()
+
+
+def before(body: bytes, upstream: bytes) -> dict:
+    def decode():
+        data = json.loads(body)
+        CreateChatCompletionRequest.model_validate(data)
+        return CreateChatCompletionRequest.model_validate(data)
+
+    def parse():
+        return construct_type(type_=SDKChatCompletion, value=json.loads(upstream))
+
+    completion = parse()
+
+    def encode():
+        return json.dumps(
+            jsonable_encoder(completion),
+            ensure_ascii=False,
+            allow_nan=False,
+            separators=(",", ":"),
+        ).encode()
+
+    def cache():
+        return SDKChatCompletion.model_validate_json(
+            completion.model_dump_json().encode()
+        )
+
+    return {"decode": decode, "upstream": parse, "encode": encode, "cache": cache}
+
+
+def after(body: bytes, upstream: bytes) -> dict:
+    def encode():
+        # A fresh object, so the memoized bytes are not what gets measured.
+        return Completion.from_json(upstream).to_json()
+
+    def cache():
+        return Completion.from_json(Completion.from_json(upstream).to_json())
+
+    return {
+        "decode": lambda: parse_json_body(CreateChatCompletionRequest, body),
+        "upstream": lambda: Completion.from_json(upstream),
+        "encode": encode,
+        "cache": cache,
+    }
+
+
+def cpu_us(fn, iterations: int) -> float:
+    """Median CPU microseconds per call over five rounds."""
+    fn()
+    rounds = []
+    for _ in range(5):
+        started = time.process_time()
+        for _ in range(iterations):
+            fn()
+        rounds.append((time.process_time() - started) / iterations * 1e6)
+    return sorted(rounds)[2]
+
+
+def run(turns: list, chars: int, response_chars: int, iterations: int) -> dict:
+    upstream = make_response(response_chars)
+    results = {}
+    for n in turns:
+        body = make_request(n, chars)
+        row = {"body_bytes": len(body)}
+        for path, stages in (
+            ("before", before(body, upstream)),
+            ("after", after(body, upstream)),
+        ):
+            row[path] = {
+                stage: round(cpu_us(fn, iterations), 1) for stage, fn in stages.items()
+            }
+            row[path]["total"] = round(sum(row[path].values()), 1)
+        results[str(n)] = row
+    return results
+
+
+def report(results: dict) -> None:
+    stages = ["decode", "upstream", "encode", "cache", "total"]
+    print(
+        f"{'turns':>6}{'body KB':>10}  {'stage':<10}{'before us':>12}{'after us':>12}{'speed-up':>10}"
+    )
+    for turns, row in results.items():
+        for i, stage in enumerate(stages):
+            old, new = row["before"][stage], row["after"][stage]
+            prefix = (
+                f"{turns:>6}{row['body_bytes'] / 1024:>10.0f}" if i == 0 else " " * 16
+            )
+            print(f"{prefix}  {stage:<10}{old:>12.1f}{new:>12.1f}{old / new:>9.1f}x")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--turns", type=int, nargs="+", default=[10, 50, 200])
+    parser.add_argument("--chars", type=int, default=2000, help="characters per turn")
+    parser.add_argument("--response-chars", type=int, default=4000)
+    parser.add_argument("--iterations", type=int, default=50)
+    parser.add_argument("--output", help="write the results as JSON")
+    parser.add_argument("--compare", help="JSON results of an earlier run")
+    parser.add_argument("--threshold", type=float, default=20.0)
+    args = parser.parse_args()
+
+    results = run(args.turns, args.chars, args.response_chars, args.iterations)
+    report(results)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        failed = False
+        print()
+        for turns, row in results.items():
+            if turns not in baseline:
+                continue
+            old, new = baseline[turns]["after"]["total"], row["after"]["total"]
+            change = (new - old) / old * 100
+            print(f"{turns} turns: {old:.1f} -> {new:.1f} us ({change:+.1f}%)")
+            failed = failed or change > args.threshold
+        if failed:
+            print(f"regressed by more than {args.threshold:.0f}%")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
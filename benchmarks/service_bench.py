@@ -0,0 +1,476 @@
+"""
+Reproducible end-to-end load and latency benchmark against mock upstreams.
+
+Starts the FastAPI app with its real lifespan, pointed at local mock servers
+for Azure OpenAI and Azure AI (Meta, Mistral), an emulated Gemini SDK and a
+Postgres stand-in (see benchmarks/mock_upstreams.py). It then replays a
+request corpus in the Batch API JSONL format, either at a fixed request rate
+(open loop, latency measured from each request's scheduled start) or at a
+fixed concurrency (closed loop). Requests are driven straight through the ASGI
+interface, so time to first byte of streamed responses is exact and no client
+library sits in the measurement.
+
+Reports p50/p95/p99 latency, streaming time to first byte, throughput and
+event-loop lag, and can save them as JSON. Runs with the same arguments on the
+same machine are comparable across commits: --compare flags metrics that got
+worse than a saved run by more than --threshold percent and exits non-zero.
+
+Usage:
+    python benchmarks/service_bench.py --rps 200 --duration 30 --output base.json
+    python benchmarks/service_bench.py --concurrency 100 --requests 5000
+    python benchmarks/service_bench.py --rps 200 --duration 30 --compare base.json
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from benchmarks.mock_upstreams import (
+    MockGemini,
+    MockOpenAIServer,
+    PostgresStandIn,
+    Upstream,
+)
+
+CORPUS = os.path.join(os.path.dirname(__file__), "data", "load_corpus.jsonl")
+
+# (metric path, whether higher is better) checked by --compare.
+COMPARED_METRICS = [
+    ("throughput_rps", True),
+    ("latency_ms.p50", False),
+    ("latency_ms.p95", False),
+    ("latency_ms.p99", False),
+    ("ttfb_ms.p50", False),
+    ("ttfb_ms.p99", False),
+    ("loop_lag_ms.p99", False),
+]
+
+
+def load_corpus(path: str) -> list:
+    with open(path) as f:
+        items = [json.loads(line) for line in f if line.strip()]
+    return [
+        (
+            item.get("url", "/v1/chat/completions"),
+            json.dumps(item["body"]).encode(),
+            bool(item["body"].get("stream")),
+        )
+        for item in items
+    ]
+
+
+def percentiles(samples: list) -> dict:
+    if not samples:
+        return {}
+    ordered = sorted(samples)
+
+    def at(pct: float) -> float:
+        return ordered[min(int(len(ordered) * pct / 100), len(ordered) - 1)]
+
+    return {
+        "p50": round(at(50) * 1000, 3),
+        "p95": round(at(95) * 1000, 3),
+        "p99": round(at(99) * 1000, 3),
+        "max": round(ordered[-1] * 1000, 3),
+        "mean": round(sum(ordered) / len(ordered) * 1000, 3),
+    }
+
+
+async def asgi_request(app, path: str, body: bytes, headers: dict) -> tuple:
+    """
+    Send one POST straight to an ASGI app.
+
+    :return: Tuple of (status, seconds to the first body byte, total seconds,
+        whether a streamed body reported an error).
+    """
+    started = time.perf_counter()
+    done = asyncio.Event()
+    state = {"status": 500, "ttfb": None, "stream_error": False, "received": False}
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0", "spec_version": "2.3"},
+        "http_version": "1.1",
+        "method": "POST",
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "query_string": b"",
+        "root_path": "",
+        "headers": [
+            (key.lower().encode(), value.encode()) for key, value in headers.items()
+        ]
+        + [(b"content-length", str(len(body)).encode())],
+        "client": ("127.0.0.1", 50000),
+        "server": ("llmhub", 80),
+    }
+
+    async def receive():
+        if not state["received"]:
+            state["received"] = True
+            return {"type": "http.request", "body": body, "more_body": False}
+        await done.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            state["status"] = message["status"]
+        elif message["type"] == "http.response.body":
+            chunk = message.get("body", b"")
+            if chunk and state["ttfb"] is None:
+                state["ttfb"] = time.perf_counter() - started
+            if chunk.startswith(b'data: {"error"'):
+                state["stream_error"] = True
+
+    try:
+        await app(scope, receive, send)
+    finally:
+        done.set()
+    return (
+        state["status"],
+        state["ttfb"],
+        time.perf_counter() - started,
+        state["stream_error"],
+    )
+
+
+class LoopLagMonitor:
+    """
+    Samples how late the event loop wakes a task that sleeps `interval` seconds.
+    """
+
+    def __init__(self, interval: float = 0.01):
+        self.interval = interval
+        self.samples = []
+        self.task = None
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            self.samples.append(max(loop.time() - expected, 0.0))
+
+    def start(self) -> None:
+        self.samples = []
+        self.task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        self.task.cancel()
+        await asyncio.gather(self.task, return_exceptions=True)
+
+
+def configure_environment(args, servers: dict, workdir: str) -> None:
+    """
+    Point the app at the mocks. Set before llmhub is imported, since modules
+    read their settings at import time; explicit empty values keep a local
+    .env from connecting the benchmark to real services.
+    """
+    os.environ.update(
+        {
+            "SECRET_KEY": "service-bench-secret",
+            "ALGORITHM": "HS256",
+            "DATABASE_URL": "postgresql://service-bench",
+            "MONGO_URI": "",
+            "REDIS_URL": "",
+            "OTEL_TRACING_ENABLED": "false",
+            "STUB_PROVIDER_ENABLED": "false",
+            "ROUTER_BACKEND": args.router,
+            "AZURE_OPENAI_ENDPOINT": servers["azure_openai"].url,
+            "AZURE_OPENAI_API_KEY": "service-bench",
+            "AZURE_OPENAI_api_version": "2024-06-01",
+            "AZURE_OPENAI_MODEL": "gpt-4o-mini",
+            "AZURE_META_ENDPOINT": servers["azure_meta"].url,
+            "AZURE_META_API_KEY": "service-bench",
+            "AZURE_META_MODEL": "meta-llama",
+            "AZURE_MISTRAL_ENDPOINT": servers["azure_mistral"].url,
+            "AZURE_MISTRAL_API_KEY": "service-bench",
+            "AZURE_MISTRAL_MODEL": "mistral-nemo",
+            "GEMINI_API_KEY": "service-bench",
+            "FILE_STORE_DIR": os.path.join(workdir, "files"),
+            "LOG_SINK_SPILL_PATH": os.path.join(workdir, "spill.jsonl"),
+        }
+    )
+    for assignment in args.env:
+        key, _, value = assignment.partition("=")
+        os.environ[key] = value
+
+
+def upstream(args, latency: str, seed: int) -> Upstream:
+    return Upstream(
+        latency,
+        tokens_per_second=args.tokens_per_second,
+        completion_tokens=args.completion_tokens,
+        chunk_tokens=args.chunk_tokens,
+        error_rate=args.error_rate,
+        seed=seed,
+    )
+
+
+async def replay(app, corpus: list, headers: dict, args, total: int, rng) -> list:
+    results = []
+
+    async def one(request: tuple, scheduled: float) -> None:
+        path, body, stream = request
+        status, ttfb, _, stream_error = await asgi_request(app, path, body, headers)
+        if not stream:
+            ttfb = None
+        # Measured from the scheduled start, so queueing delay is not hidden.
+        latency = time.perf_counter() - scheduled
+        results.append((path, status, ttfb, latency, stream_error))
+
+    if args.rps:
+        tasks = []
+        started = time.perf_counter()
+        offset = 0.0
+        for i in range(total):
+            scheduled = started + offset
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            tasks.append(asyncio.create_task(one(corpus[i % len(corpus)], scheduled)))
+            offset += (
+                rng.expovariate(args.rps) if args.arrival == "poisson" else 1 / args.rps
+            )
+        await asyncio.gather(*tasks)
+    else:
+        counter = iter(range(total))
+
+        async def worker() -> None:
+            for i in counter:
+                await one(corpus[i % len(corpus)], time.perf_counter())
+
+        await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+    return results
+
+
+def summarize(results: list, elapsed: float, lag: list) -> dict:
+    statuses = Counter(
+        "stream_error" if stream_error else str(status)
+        for _, status, _, _, stream_error in results
+    )
+    ok = [r for r in results if r[1] == 200 and not r[4]]
+    streamed = [r[2] for r in ok if r[2] is not None]
+    return {
+        "requests": len(results),
+        "ok": len(ok),
+        "statuses": dict(sorted(statuses.items())),
+        "elapsed_s": round(elapsed, 3),
+        "throughput_rps": round(len(ok) / elapsed, 2) if elapsed else 0.0,
+        "latency_ms": percentiles([r[3] for r in ok]),
+        "ttfb_ms": percentiles(streamed),
+        "loop_lag_ms": percentiles(lag),
+        "by_endpoint": {
+            path: percentiles([r[3] for r in ok if r[0] == path])
+            for path in sorted({r[0] for r in ok})
+        },
+    }
+
+
+def git_revision() -> dict:
+    root = os.path.join(os.path.dirname(__file__), "..")
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "HEAD"], cwd=root, capture_output=True, text=True
+        ).stdout.strip()
+        dirty = bool(
+            subprocess.run(
+                ["git", "status", "--porcelain", "--untracked-files=no"],
+                cwd=root,
+                capture_output=True,
+                text=True,
+            ).stdout.strip()
+        )
+    except OSError:
+        return {"commit": None, "dirty": None}
+    return {"commit": commit or None, "dirty": dirty}
+
+
+async def run(args) -> dict:
+    workdir = tempfile.mkdtemp(prefix="service-bench-")
+    servers = {
+        name: MockOpenAIServer(name, upstream(args, latency, args.seed + i)).start()
+        for i, (name, latency) in enumerate(
+            [
+                ("azure_openai", args.azure_openai_latency),
+                ("azure_meta", args.azure_ai_latency),
+                ("azure_mistral", args.azure_ai_latency),
+            ]
+        )
+    }
+    configure_environment(args, servers, workdir)
+
+    import asyncpg
+
+    import llmhub
+    from service.clients import provider_clients
+    from utils.auth import create_access_token
+
+    logging.getLogger().setLevel(logging.WARNING)
+    gemini = MockGemini(upstream(args, args.gemini_latency, args.seed + 3))
+    provider_clients._clients["gemini"] = gemini
+    database = PostgresStandIn(rtt=args.db_rtt)
+
+    async def create_pool(*_, **__):
+        return database
+
+    asyncpg.create_pool = create_pool
+
+    corpus = load_corpus(args.corpus)
+    token = create_access_token({"userId": "service-bench"})
+    headers = {"authorization": f"Bearer {token}", "content-type": "application/json"}
+    total = args.requests or int(args.rps * args.duration)
+    rng = random.Random(args.seed)
+    monitor = LoopLagMonitor()
+
+    try:
+        async with llmhub.app.router.lifespan_context(llmhub.app):
+            if args.warmup:
+                warmup = argparse.Namespace(**{**vars(args), "rps": 0})
+                warmup.concurrency = min(args.concurrency, args.warmup)
+                await replay(llmhub.app, corpus, headers, warmup, args.warmup, rng)
+            monitor.start()
+            started = time.perf_counter()
+            results = await replay(llmhub.app, corpus, headers, args, total, rng)
+            elapsed = time.perf_counter() - started
+            await monitor.stop()
+    finally:
+        for server in servers.values():
+            server.stop()
+
+    summary = summarize(results, elapsed, monitor.samples)
+    summary["upstream_requests"] = {
+        **{name: server.upstream.requests for name, server in servers.items()},
+        "gemini": gemini.upstream.requests,
+    }
+    summary["db_round_trips"] = database.round_trips
+    return {
+        "meta": {
+            **git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "timestamp": int(time.time()),
+            "args": {
+                k: v for k, v in vars(args).items() if k not in ("output", "compare")
+            },
+        },
+        "results": summary,
+    }
+
+
+def report(run_data: dict) -> None:
+    results = run_data["results"]
+    meta = run_data["meta"]
+    commit = (meta["commit"] or "unknown")[:12] + (" (dirty)" if meta["dirty"] else "")
+    print(f"commit:           {commit}")
+    print(
+        f"requests:         {results['requests']} ({results['ok']} ok) {results['statuses']}"
+    )
+    print(f"elapsed:          {results['elapsed_s']:.2f} s")
+    print(f"throughput:       {results['throughput_rps']:.1f} req/s")
+    for name, key in (
+        ("latency", "latency_ms"),
+        ("stream ttfb", "ttfb_ms"),
+        ("loop lag", "loop_lag_ms"),
+    ):
+        p = results[key]
+        if p:
+            print(
+                f"{name + ':':<18}p50 {p['p50']:.1f} ms  p95 {p['p95']:.1f} ms  "
+                f"p99 {p['p99']:.1f} ms  max {p['max']:.1f} ms"
+            )
+    for path, p in results["by_endpoint"].items():
+        print(f"  {path:<24}p50 {p['p50']:.1f} ms  p99 {p['p99']:.1f} ms")
+    print(f"upstream calls:   {results['upstream_requests']}")
+    print(f"db round trips:   {results['db_round_trips']}")
+
+
+def metric(results: dict, path: str):
+    value = results
+    for key in path.split("."):
+        value = value.get(key) if isinstance(value, dict) else None
+    return value
+
+
+def compare(run_data: dict, baseline: dict, threshold: float) -> bool:
+    """
+    Print the change of every compared metric against a saved run.
+
+    :return: True if any metric regressed by more than `threshold` percent.
+    """
+    if baseline["meta"]["args"] != run_data["meta"]["args"]:
+        print("warning: the baseline was run with different arguments")
+    print(f"\ncompared with {(baseline['meta']['commit'] or 'unknown')[:12]}:")
+    regressed = False
+    for path, higher_is_better in COMPARED_METRICS:
+        old = metric(baseline["results"], path)
+        new = metric(run_data["results"], path)
+        if not old or new is None:
+            continue
+        change = (new - old) / old * 100
+        worse = -change if higher_is_better else change
+        flag = ""
+        if worse > threshold:
+            flag = "  REGRESSION"
+            regressed = True
+        print(f"  {path:<18}{old:>10.2f} -> {new:>10.2f}  ({change:+.1f}%){flag}")
+    return regressed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--corpus", default=CORPUS)
+    load = parser.add_mutually_exclusive_group()
+    load.add_argument("--rps", type=float, default=0.0, help="open loop request rate")
+    load.add_argument("--concurrency", type=int, default=50, help="closed loop workers")
+    parser.add_argument("--arrival", choices=["uniform", "poisson"], default="uniform")
+    parser.add_argument(
+        "--duration", type=float, default=20.0, help="seconds, with --rps"
+    )
+    parser.add_argument("--requests", type=int, default=0, help="total requests")
+    parser.add_argument("--warmup", type=int, default=50)
+    parser.add_argument("--azure-openai-latency", default="lognormal:0.3:0.3")
+    parser.add_argument("--azure-ai-latency", default="lognormal:0.4:0.4")
+    parser.add_argument("--gemini-latency", default="lognormal:0.25:0.3")
+    parser.add_argument("--tokens-per-second", type=float, default=200.0)
+    parser.add_argument("--completion-tokens", type=int, default=64)
+    parser.add_argument("--chunk-tokens", type=int, default=4)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--db-rtt", type=float, default=0.002)
+    parser.add_argument("--router", choices=["local", "llm"], default="local")
+    parser.add_argument(
+        "--env", action="append", default=[], metavar="KEY=VALUE",
+        help="extra app setting, e.g. RESPONSE_CACHE_ENABLED=true",
+    )  # fmt: skip
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="write results as JSON")
+    parser.add_argument("--compare", help="JSON results of an earlier run")
+    parser.add_argument("--threshold", type=float, default=10.0)
+    args = parser.parse_args()
+    if not args.rps and not args.requests:
+        args.requests = 2000
+
+    run_data = asyncio.run(run(args))
+    report(run_data)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(run_data, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if compare(run_data, baseline, args.threshold):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
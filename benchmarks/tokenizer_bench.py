@@ -0,0 +1,118 @@
+"""
+Tokenization throughput on large prompts.
+
+Counts prompt tokens for synthetic conversations of increasing size with every
+model family's encoding, cold and with the per-message count cache warm, and
+measures how much a large count stalls the event loop inline vs offloaded to a
+worker thread. Without tiktoken (or its vocabulary files) the numbers are for
+the byte-length estimate that replaces it.
+
+Usage:
+    python benchmarks/tokenizer_bench.py --sizes 10000 100000 1000000
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from pydantic_types.chat import Message
+from utils import tokenizer
+
+WORDS = (
+    "the quick brown fox jumps over lazy dog routing model latency token context "
+    "window provider request response cache def return import async await {} () [] "
+    "données über café 東京 データ 123 4567 0.5 http://example.com/path?q=1"
+).split()
+
+
+def make_messages(chars: int, turns: int = 8) -> list:
+    rng = random.Random(chars)
+    per_turn = chars // turns
+    messages = []
+    for i in range(turns):
+        words, size = [], 0
+        while size < per_turn:
+            word = rng.choice(WORDS)
+            words.append(word)
+            size += len(word) + 1
+        role = "user" if i % 2 == 0 else "assistant"
+        messages.append(Message(role=role, content=" ".join(words)))
+    messages[-1] = Message(role="user", content=messages[-1].content)
+    return messages
+
+
+def timed(fn, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+async def loop_stall(messages, model: str, offload: bool) -> float:
+    """Longest gap seen by a 1ms ticker while one count runs."""
+    tokenizer.OFFLOAD_CHARS = 0 if offload else float("inf")
+    tokenizer._count_cache.clear()
+    worst, stop = 0.0, False
+
+    async def ticker():
+        nonlocal worst
+        last = time.perf_counter()
+        while not stop:
+            await asyncio.sleep(0.001)
+            now = time.perf_counter()
+            worst = max(worst, now - last)
+            last = now
+
+    task = asyncio.create_task(ticker())
+    await asyncio.sleep(0.005)
+    await tokenizer.count_prompt_tokens(messages, model)
+    stop = True
+    await task
+    return worst
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000, 1000000])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    tokenizer.warm_encodings()
+    backends = {
+        name: "tiktoken" if tokenizer.get_encoding(name) is not None else "estimate"
+        for name in set(tokenizer.MODEL_ENCODINGS.values())
+    }
+    print(f"encodings: {backends}")
+
+    models = {tokenizer.MODEL_ENCODINGS[m]: m for m in tokenizer.MODEL_ENCODINGS}
+    for chars in args.sizes:
+        messages = make_messages(chars)
+        size_mb = sum(len(m.content.encode()) for m in messages) / 1e6
+        for name, model in sorted(models.items()):
+
+            def cold():
+                tokenizer._count_cache.clear()
+                tokenizer.count_message_tokens(messages, model)
+
+            cold_s = timed(cold, args.repeat)
+            tokens = tokenizer.count_message_tokens(messages, model)
+            warm_s = timed(lambda: tokenizer.count_message_tokens(messages, model), args.repeat)
+            inline = asyncio.run(loop_stall(messages, model, offload=False))
+            offloaded = asyncio.run(loop_stall(messages, model, offload=True))
+            print(
+                f"{chars:>9} chars {name:>12}: {tokens:>8} tokens  "
+                f"cold={cold_s * 1000:8.2f}ms ({size_mb / cold_s:6.1f} MB/s, "
+                f"{tokens / cold_s / 1e6:5.2f} Mtok/s)  cached={warm_s * 1000:6.3f}ms  "
+                f"loop stall inline={inline * 1000:6.1f}ms offloaded={offloaded * 1000:5.1f}ms"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,83 +1,732 @@
 import os
+import time
+import asyncio
+import logging
 
 
-from fastapi import FastAPI, Depends, HTTPException, Request
-from fastapi.responses import JSONResponse
+from typing import Optional
+
+
+from fastapi import FastAPI, Depends, HTTPException, Request, Response
+from fastapi.responses import JSONResponse, StreamingResponse
 
 
 from contextlib import asynccontextmanager
 
 
 from starlette.status import (
+    HTTP_400_BAD_REQUEST,
+    HTTP_403_FORBIDDEN,
+    HTTP_404_NOT_FOUND,
+    HTTP_429_TOO_MANY_REQUESTS,
     HTTP_500_INTERNAL_SERVER_ERROR,
+    HTTP_503_SERVICE_UNAVAILABLE,
 )
 
 
-from llmhub.router import route
+from llmhub.batches import BatchRunner, BatchValidationError
+from llmhub.pipeline import (
+    ContextLengthExceeded,
+    coalesced_complete_chat,
+    completion_flights,
+)
+from llmhub.route_cache import route_cache
+from llmhub.route_config import route_configs
+from llmhub.tenant_routes import (
+    InvalidRoutingConfig,
+    RouteNotAllowed,
+    compile_config,
+    tenant_mode,
+    tenant_routes,
+)
 
 
-from service.chat.service_router import RouterChatCompletion
+from service.chat.service_router import dispatcher, rate_limiter
+from service.clients import provider_clients
+from service.chat.streaming import SSE_HEADERS, stream_sse
+from service.chat.response_cache import (
+    CACHE_HEADER,
+    cache_bypassed,
+    response_cache,
+)
+from service.chat.semantic_cache import semantic_cache
+from service.chat.prompt_cache import prompt_cache
+from service.embeddings.embedding_router import (
+    InvalidEmbeddingRequest,
+    create_embeddings,
+    embedding_batcher,
+    embedding_tokens,
+)
+from service.files.store import FileStore
+from service.files.streaming import MultipartError, RangeFileResponse
+from service.files.uploads import UploadError, UploadManager
+from service.threads.store import (
+    ThreadConflict,
+    ThreadStore,
+    message_object,
+    new_message,
+    reply_message,
+    thread_object,
+)
 
 
 import asyncpg
 
 
-from utils.auth import validate_request, verify_api_key
+from utils.auth import (
+    parse_chat_request,
+    token_cache,
+    token_hash,
+    validate_request,
+    verify_api_key,
+    warm_jwt,
+)
 
 
 from pydantic_types.chat import (
     CreateChatCompletionRequest,
 )
+from pydantic_types.batch import (
+    Batch,
+    CreateBatchRequest,
+    DeleteFileResponse,
+    ListBatchesResponse,
+    ListFilesResponse,
+    OpenAIFile,
+)
+from pydantic_types.thread import (
+    CreateMessageRequest,
+    CreateThreadRequest,
+    DeleteThreadResponse,
+    ListMessagesResponse,
+    MessageObject,
+    ModifyThreadRequest,
+    ThreadObject,
+)
+from pydantic_types.embeddings import CreateEmbeddingRequest, CreateEmbeddingResponse
+from pydantic_types.upload import (
+    CompleteUploadRequest,
+    CreateUploadRequest,
+    Upload,
+    UploadPart,
+)
+from pydantic_types.routing import TenantRoutingConfig
 
 
 from dotenv import load_dotenv
 
 
-from utils.postgres import insert_api_call_log
+from utils.database import (
+    close_mongo_clients,
+    delete_tenant_routing_config,
+    get_async_mongo_client,
+    write_tenant_routing_config,
+)
+from utils.json_body import request_body_schema
+from utils.postgres import (
+    ApiCallLogSink,
+    RevocationSync,
+    ensure_api_call_log_schema,
+    ensure_batch_schema,
+    ensure_revocation_schema,
+    ensure_thread_schema,
+)
+from utils.rate_limit import RateLimitExceeded, estimate_tokens
+from utils.telemetry import (
+    REQUEST_ID_HEADER,
+    TelemetryMiddleware,
+    metrics_payload,
+    record_cache_status,
+    setup_tracing,
+    shutdown_tracing,
+    stage,
+    stats_collector,
+)
+from utils.tokenizer import count_prompt_tokens, warm_encodings
 
 
 load_dotenv()
 
+# "eager" finishes warming up before serving the first request; "lazy" serves at
+# once and warms up in the background, which shortens consumption plan cold
+# starts when the first requests do not need every provider.
+STARTUP_MODE = os.getenv("STARTUP_MODE", "eager").lower()
+warmup_task: Optional[asyncio.Task] = None
+
+
+async def warm_up() -> None:
+    """
+    Check the JWT key, import the provider SDKs and create their clients, open a
+    connection to each provider and load the tokenizer vocabularies.
+    """
+    started = time.perf_counter()
+    try:
+        warm_jwt()
+        await provider_clients.start()
+        await asyncio.gather(provider_clients.warm(), asyncio.to_thread(warm_encodings))
+    except Exception as e:
+        logging.error(f"Warm-up failed: {e}")
+        raise
+    logging.info(f"Warm-up finished in {time.perf_counter() - started:.2f}s.")
+
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    global pool
+    global pool, log_sink, revocation_sync, file_store, upload_manager, batch_runner
+    global thread_store
+    global warmup_task
+    setup_tracing()
     DATABASE_URL = os.getenv("DATABASE_URL")
     pool = await asyncpg.create_pool(DATABASE_URL)
+    await ensure_api_call_log_schema(pool)
+    log_sink = ApiCallLogSink(
+        pool,
+        max_queue=int(os.getenv("LOG_SINK_MAX_QUEUE", "10000")),
+        batch_size=int(os.getenv("LOG_SINK_BATCH_SIZE", "500")),
+        flush_interval=float(os.getenv("LOG_SINK_FLUSH_INTERVAL", "0.5")),
+        spill_path=os.getenv("LOG_SINK_SPILL_PATH", "api_call_logs.spill.jsonl"),
+    )
+    await log_sink.start()
+    await ensure_revocation_schema(pool)
+    revocation_sync = RevocationSync(
+        pool,
+        token_cache,
+        poll_interval=float(os.getenv("REVOCATION_POLL_INTERVAL", "30")),
+    )
+    await revocation_sync.start()
+    if STARTUP_MODE == "lazy":
+        warmup_task = asyncio.create_task(warm_up())
+    else:
+        await warm_up()
+    if os.getenv("MONGO_URI"):
+        await route_configs.start(get_async_mongo_client())
+    await ensure_batch_schema(pool)
+    file_store = FileStore(pool, os.getenv("FILE_STORE_DIR", "llmhub_files"))
+    upload_manager = UploadManager(pool, file_store)
+    batch_runner = BatchRunner(
+        pool,
+        file_store,
+        log_sink,
+        workers=int(os.getenv("BATCH_WORKERS", "64")),
+        progress_interval=float(os.getenv("BATCH_PROGRESS_INTERVAL", "2.0")),
+    )
+    await ensure_thread_schema(pool)
+    thread_store = ThreadStore(
+        pool,
+        capacity_bytes=int(os.getenv("THREAD_CACHE_BYTES", str(256 * 1024 * 1024))),
+    )
+    # Queue depths and cache counters, read from each component when scraped.
+    for component, source in {
+        "log_sink": log_sink.stats,
+        "batches": batch_runner.stats,
+        "threads": thread_store.stats,
+        "token_cache": token_cache.stats,
+        "route_cache": route_cache.stats,
+        "response_cache": response_cache.stats,
+        "semantic_cache": semantic_cache.stats,
+        "prompt_cache": prompt_cache.stats,
+        "coalescing": completion_flights.stats,
+        "embedding_batcher": embedding_batcher.stats,
+        "rate_limiter": rate_limiter.stats,
+        "dispatcher": dispatcher.stats,
+        "route_configs": route_configs.stats,
+        "tenant_routes": tenant_routes.stats,
+    }.items():
+        stats_collector.register(component, source)
+    stats_collector.register(
+        "provider", lambda: dispatcher.stats()["providers"], label="provider"
+    )
+    stats_collector.register(
+        "upstream_connections", provider_clients.metrics, label="provider"
+    )
 
     yield
 
+    await batch_runner.close()
+    await log_sink.close()
+    await revocation_sync.close()
+    logging.info(f"Token cache stats: {token_cache.stats()}")
+    logging.info(f"Thread store stats: {thread_store.stats()}")
+    if warmup_task is not None:
+        warmup_task.cancel()
+        await asyncio.gather(warmup_task, return_exceptions=True)
+    if prompt_cache.enabled:
+        await prompt_cache.close()
+        logging.info(f"Prompt cache stats: {prompt_cache.stats()}")
+    await provider_clients.aclose()
+    logging.info(f"Provider health: {dispatcher.stats()}")
+    logging.info(f"Request coalescing stats: {completion_flights.stats()}")
+    logging.info(f"Embedding batching stats: {embedding_batcher.stats()}")
+    if rate_limiter.enabled:
+        logging.info(f"Rate limiter stats: {rate_limiter.stats()}")
+    await route_configs.close()
+    logging.info(f"Route config stats: {route_configs.stats()}")
+    logging.info(f"Tenant routing stats: {tenant_routes.stats()}")
+    close_mongo_clients()
+    logging.info(f"Route cache stats: {route_cache.stats()}")
+    if route_cache.shared is not None:
+        await route_cache.shared.close()
+    if response_cache.enabled:
+        logging.info(f"Response cache stats: {response_cache.stats()}")
+    if response_cache.shared is not None:
+        await response_cache.shared.close()
+    if semantic_cache.enabled:
+        logging.info(f"Semantic cache stats: {semantic_cache.stats()}")
     if pool:
         await pool.close()
+    await shutdown_tracing()
 
 
 app = FastAPI(lifespan=lifespan)
+app.add_middleware(TelemetryMiddleware)
 
 
-@app.api_route("/v1/chat/completions", methods=["POST"])
+@app.api_route(
+    "/v1/chat/completions",
+    methods=["POST"],
+    openapi_extra=request_body_schema(CreateChatCompletionRequest),
+)
 async def index(
-    request: CreateChatCompletionRequest,
-    validation: bool = Depends(validate_request),
+    http_request: Request,
     authorization: list = Depends(verify_api_key),
+    request: CreateChatCompletionRequest = Depends(parse_chat_request),
+    validation: bool = Depends(validate_request),
 ):
     if validation and authorization:
+        thread = None
+        if request.thread_id is not None:
+            with stage("thread"):
+                thread = await thread_store.get(authorization[0], request.thread_id)
+            if thread is None:
+                raise HTTPException(
+                    status_code=HTTP_404_NOT_FOUND, detail="Thread not found."
+                )
+            turn = [new_message(m.role, m.content) for m in request.messages]
+            # Earlier turns are the thread's own Message objects, never decoded
+            # or validated again.
+            request = request.model_copy(
+                update={"messages": thread.context + request.messages}
+            )
         try:
-            model = route(request.messages[-1].content, model="automatic").strip()
-            response = RouterChatCompletion(model=model, request=request)
-            await insert_api_call_log(
-                response_data=response,
-                user_id=authorization[0],
-                api_key_id=authorization[1],
-                db_pg=pool,
+            if rate_limiter.enabled:
+                with stage("rate_limit"):
+                    prompt_tokens = await count_prompt_tokens(request.messages)
+                    await rate_limiter.acquire_key(
+                        token_hash(authorization[1]),
+                        estimate_tokens(request, prompt_tokens),
+                    )
+
+            response, cache_status, shared = await coalesced_complete_chat(
+                request, authorization[0], cache_bypassed(http_request.headers)
+            )
+            record_cache_status(cache_status)
+            headers = {CACHE_HEADER: cache_status} if cache_status is not None else {}
+
+            if request.stream:
+
+                async def log_stream_usage(completion):
+                    log_sink.submit(
+                        response_data=completion,
+                        user_id=authorization[0],
+                        api_key_id=authorization[1],
+                    )
+                    # Only a reply that finished joins the thread.
+                    if thread is not None and completion.choices[0]["finish_reason"]:
+                        try:
+                            await thread_store.append(
+                                thread, turn + [reply_message(completion)]
+                            )
+                        except Exception as e:
+                            logging.error(
+                                f"Could not add the turn to thread {thread.id}: {e}"
+                            )
+
+                return StreamingResponse(
+                    stream_sse(
+                        response,
+                        request,
+                        on_complete=log_stream_usage,
+                        transcript=thread is not None,
+                    ),
+                    media_type="text/event-stream",
+                    headers={**SSE_HEADERS, **headers},
+                )
+
+            # Every caller is logged, including those served from the caches or
+            # from another caller's in-flight request.
+            with stage("log"):
+                log_sink.submit(
+                    response_data=response,
+                    user_id=authorization[0],
+                    api_key_id=authorization[1],
+                    cache_hit=shared or cache_status in ("hit", "semantic-hit"),
+                )
+
+            if thread is not None:
+                # The completion is already billed, so it is returned even if
+                # the thread cannot take it.
+                with stage("thread"):
+                    try:
+                        await thread_store.append(
+                            thread, turn + [reply_message(response)]
+                        )
+                    except Exception as e:
+                        logging.error(
+                            f"Could not add the turn to thread {thread.id}: {e}"
+                        )
+
+            # Completions carry their own JSON; FastAPI's encoder is skipped.
+            return Response(
+                content=response.to_json(),
+                media_type="application/json",
+                headers=headers,
+            )
+        except (ContextLengthExceeded, RouteNotAllowed) as e:
+            raise HTTPException(
+                status_code=HTTP_400_BAD_REQUEST,
+                detail=str(e),
+                headers={"Content-Type": "application/problem+json"},
+            )
+        except RateLimitExceeded as e:
+            raise HTTPException(
+                status_code=HTTP_429_TOO_MANY_REQUESTS,
+                detail=str(e),
+                headers={
+                    "Retry-After": e.retry_after_header,
+                    "Content-Type": "application/problem+json",
+                },
             )
-
-            return response
         except Exception as e:
             raise HTTPException(
                 status_code=HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e)
             )
 
 
+@app.post("/v1/embeddings", response_model=CreateEmbeddingResponse)
+async def embeddings(
+    request: CreateEmbeddingRequest, authorization: list = Depends(verify_api_key)
+):
+    try:
+        if rate_limiter.enabled:
+            await rate_limiter.acquire_key(
+                token_hash(authorization[1]), embedding_tokens(request)
+            )
+        response = await create_embeddings(request)
+    except InvalidEmbeddingRequest as e:
+        raise HTTPException(status_code=HTTP_400_BAD_REQUEST, detail=str(e))
+    except RateLimitExceeded as e:
+        raise HTTPException(
+            status_code=HTTP_429_TOO_MANY_REQUESTS,
+            detail=str(e),
+            headers={
+                "Retry-After": e.retry_after_header,
+                "Content-Type": "application/problem+json",
+            },
+        )
+    except Exception as e:
+        raise HTTPException(status_code=HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
+
+    log_sink.submit(
+        response_data=response,
+        user_id=authorization[0],
+        api_key_id=authorization[1],
+    )
+    # Already validated; skip re-validating thousands of floats per vector.
+    return Response(content=response.model_dump_json(), media_type="application/json")
+
+
+@app.post("/v1/files", response_model=OpenAIFile)
+async def upload_file(
+    http_request: Request, authorization: list = Depends(verify_api_key)
+):
+    try:
+        return await file_store.save_upload(authorization[0], http_request)
+    except MultipartError as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+
+
+@app.get("/v1/files", response_model=ListFilesResponse)
+async def list_files(
+    purpose: Optional[str] = None,
+    authorization: list = Depends(verify_api_key),
+):
+    return ListFilesResponse(data=await file_store.list(authorization[0], purpose))
+
+
+@app.get("/v1/files/{file_id}", response_model=OpenAIFile)
+async def retrieve_file(file_id: str, authorization: list = Depends(verify_api_key)):
+    file = await file_store.get(authorization[0], file_id)
+    if file is None:
+        raise HTTPException(status_code=HTTP_404_NOT_FOUND, detail="File not found.")
+    return file
+
+
+@app.delete("/v1/files/{file_id}", response_model=DeleteFileResponse)
+async def delete_file(file_id: str, authorization: list = Depends(verify_api_key)):
+    if not await file_store.delete(authorization[0], file_id):
+        raise HTTPException(status_code=HTTP_404_NOT_FOUND, detail="File not found.")
+    return DeleteFileResponse(id=file_id, deleted=True)
+
+
+@app.get("/v1/files/{file_id}/content")
+async def retrieve_file_content(
+    file_id: str, authorization: list = Depends(verify_api_key)
+):
+    file = await file_store.get(authorization[0], file_id)
+    if file is None:
+        raise HTTPException(status_code=HTTP_404_NOT_FOUND, detail="File not found.")
+    return RangeFileResponse(
+        file_store.path(file_id),
+        media_type="application/jsonl",
+        filename=file.filename,
+    )
+
+
+@app.post("/v1/uploads", response_model=Upload)
+async def create_upload(
+    body: CreateUploadRequest, authorization: list = Depends(verify_api_key)
+):
+    try:
+        return await upload_manager.create(authorization[0], body)
+    except UploadError as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+
+
+@app.post("/v1/uploads/{upload_id}/parts", response_model=UploadPart)
+async def add_upload_part(
+    upload_id: str,
+    http_request: Request,
+    authorization: list = Depends(verify_api_key),
+):
+    try:
+        part = await upload_manager.add_part(authorization[0], upload_id, http_request)
+    except (MultipartError, UploadError) as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+    if part is None:
+        raise HTTPException(status_code=HTTP_404_NOT_FOUND, detail="Upload not found.")
+    return part
+
+
+@app.post("/v1/uploads/{upload_id}/complete", response_model=Upload)
+async def complete_upload(
+    upload_id: str,
+    body: CompleteUploadRequest,
+    authorization: list = Depends(verify_api_key),
+):
+    try:
+        upload = await upload_manager.complete(authorization[0], upload_id, body)
+    except UploadError as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+    if upload is None:
+        raise HTTPException(status_code=HTTP_404_NOT_FOUND, detail="Upload not found.")
+    return upload
+
+
+@app.post("/v1/uploads/{upload_id}/cancel", response_model=Upload)
+async def cancel_upload(upload_id: str, authorization: list = Depends(verify_api_key)):
+    try:
+        upload = await upload_manager.cancel(authorization[0], upload_id)
+    except UploadError as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+    if upload is None:
+        raise HTTPException(status_code=HTTP_404_NOT_FOUND, detail="Upload not found.")
+    return upload
+
+
+@app.post("/v1/batches", response_model=Batch)
+async def create_batch(
+    body: CreateBatchRequest, authorization: list = Depends(verify_api_key)
+):
+    try:
+        return await batch_runner.create(authorization[0], authorization[1], body)
+    except BatchValidationError as e:
+        raise HTTPException(status_code=HTTP_400_BAD_REQUEST, detail=str(e))
+
+
+@app.get("/v1/batches", response_model=ListBatchesResponse)
+async def list_batches(
+    after: Optional[str] = None,
+    limit: int = 20,
+    authorization: list = Depends(verify_api_key),
+):
+    limit = max(1, min(limit, 100))
+    # Fetch one extra row to learn whether another page exists.
+    batches = await batch_runner.list(authorization[0], after, limit + 1)
+    data = batches[:limit]
+    return ListBatchesResponse(
+        data=data,
+        first_id=data[0].id if data else None,
+        last_id=data[-1].id if data else None,
+        has_more=len(batches) > limit,
+    )
+
+
+@app.get("/v1/batches/{batch_id}", response_model=Batch)
+async def retrieve_batch(batch_id: str, authorization: list = Depends(verify_api_key)):
+    batch = await batch_runner.get(authorization[0], batch_id)
+    if batch is None:
+        raise HTTPException(status_code=HTTP_404_NOT_FOUND, detail="Batch not found.")
+    return batch
+
+
+@app.post("/v1/batches/{batch_id}/cancel", response_model=Batch)
+async def cancel_batch(batch_id: str, authorization: list = Depends(verify_api_key)):
+    batch = await batch_runner.cancel(authorization[0], batch_id)
+    if batch is None:
+        raise HTTPException(status_code=HTTP_404_NOT_FOUND, detail="Batch not found.")
+    return batch
+
+
+@app.post("/v1/threads", response_model=ThreadObject)
+async def create_thread(
+    body: Optional[CreateThreadRequest] = None,
+    authorization: list = Depends(verify_api_key),
+):
+    body = body or CreateThreadRequest()
+    thread = await thread_store.create(
+        authorization[0],
+        [new_message(m.role, m.content, m.metadata) for m in body.messages],
+        body.metadata,
+    )
+    return thread_object(thread)
+
+
+@app.get("/v1/threads/{thread_id}", response_model=ThreadObject)
+async def retrieve_thread(thread_id: str, authorization: list = Depends(verify_api_key)):
+    thread = await thread_store.get(authorization[0], thread_id)
+    if thread is None:
+        raise HTTPException(status_code=HTTP_404_NOT_FOUND, detail="Thread not found.")
+    return thread_object(thread)
+
+
+@app.post("/v1/threads/{thread_id}", response_model=ThreadObject)
+async def modify_thread(
+    thread_id: str,
+    body: ModifyThreadRequest,
+    authorization: list = Depends(verify_api_key),
+):
+    thread = await thread_store.modify(authorization[0], thread_id, body.metadata)
+    if thread is None:
+        raise HTTPException(status_code=HTTP_404_NOT_FOUND, detail="Thread not found.")
+    return thread_object(thread)
+
+
+@app.delete("/v1/threads/{thread_id}", response_model=DeleteThreadResponse)
+async def delete_thread(thread_id: str, authorization: list = Depends(verify_api_key)):
+    if not await thread_store.delete(authorization[0], thread_id):
+        raise HTTPException(status_code=HTTP_404_NOT_FOUND, detail="Thread not found.")
+    return DeleteThreadResponse(id=thread_id, deleted=True)
+
+
+@app.post("/v1/threads/{thread_id}/messages", response_model=MessageObject)
+async def create_message(
+    thread_id: str,
+    body: CreateMessageRequest,
+    authorization: list = Depends(verify_api_key),
+):
+    thread = await thread_store.get(authorization[0], thread_id)
+    if thread is None:
+        raise HTTPException(status_code=HTTP_404_NOT_FOUND, detail="Thread not found.")
+    message = new_message(body.role, body.content, body.metadata)
+    try:
+        appended = await thread_store.append(thread, [message])
+    except ThreadConflict as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+    if not appended:
+        raise HTTPException(status_code=HTTP_404_NOT_FOUND, detail="Thread not found.")
+    return message_object(thread, message)
+
+
+@app.get("/v1/threads/{thread_id}/messages", response_model=ListMessagesResponse)
+async def list_messages(
+    thread_id: str,
+    limit: int = 20,
+    order: str = "desc",
+    after: Optional[str] = None,
+    before: Optional[str] = None,
+    authorization: list = Depends(verify_api_key),
+):
+    if order not in ("asc", "desc"):
+        raise HTTPException(
+            status_code=HTTP_400_BAD_REQUEST, detail="order must be one of: asc, desc."
+        )
+    thread = await thread_store.get(authorization[0], thread_id)
+    if thread is None:
+        raise HTTPException(status_code=HTTP_404_NOT_FOUND, detail="Thread not found.")
+    messages, has_more = thread.page(max(1, min(limit, 100)), order, after, before)
+    data = [message_object(thread, message) for message in messages]
+    return ListMessagesResponse(
+        data=data,
+        first_id=data[0].id if data else None,
+        last_id=data[-1].id if data else None,
+        has_more=has_more,
+    )
+
+
+@app.get("/v1/threads/{thread_id}/messages/{message_id}", response_model=MessageObject)
+async def retrieve_message(
+    thread_id: str, message_id: str, authorization: list = Depends(verify_api_key)
+):
+    thread = await thread_store.get(authorization[0], thread_id)
+    message = thread.find(message_id) if thread is not None else None
+    if message is None:
+        raise HTTPException(status_code=HTTP_404_NOT_FOUND, detail="Message not found.")
+    return message_object(thread, message)
+
+
+def _require_route_configs():
+    if route_configs.collection is None:
+        raise HTTPException(
+            status_code=HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Custom routing rules are unavailable: no route config store is configured.",
+        )
+
+
+@app.get("/v1/routing/rules", response_model=TenantRoutingConfig)
+async def retrieve_routing_rules(authorization: list = Depends(verify_api_key)):
+    stored = route_configs.get(tenant_mode(authorization[0]))
+    return TenantRoutingConfig(**stored) if stored else TenantRoutingConfig()
+
+
+@app.put("/v1/routing/rules", response_model=TenantRoutingConfig)
+async def update_routing_rules(
+    config: TenantRoutingConfig, authorization: list = Depends(verify_api_key)
+):
+    _require_route_configs()
+    try:
+        compile_config(config)
+    except InvalidRoutingConfig as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+    await write_tenant_routing_config(
+        get_async_mongo_client(), authorization[0], config.model_dump()
+    )
+    # Apply the new rules before answering, without waiting for the change stream.
+    await route_configs.reload()
+    return config
+
+
+@app.delete("/v1/routing/rules", response_model=TenantRoutingConfig)
+async def delete_routing_rules(authorization: list = Depends(verify_api_key)):
+    _require_route_configs()
+    if not await delete_tenant_routing_config(
+        get_async_mongo_client(), authorization[0]
+    ):
+        raise HTTPException(
+            status_code=HTTP_404_NOT_FOUND, detail="No routing rules found."
+        )
+    await route_configs.reload()
+    return TenantRoutingConfig()
+
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics(http_request: Request):
+    token = os.getenv("METRICS_TOKEN")
+    if token and http_request.headers.get("Authorization") != f"Bearer {token}":
+        raise HTTPException(status_code=HTTP_403_FORBIDDEN, detail="Forbidden.")
+    payload, content_type = await asyncio.to_thread(metrics_payload)
+    return Response(content=payload, media_type=content_type)
+
+
 @app.exception_handler(HTTPException)
 async def http_exception_handler(request: Request, exc: HTTPException):
     """
@@ -98,6 +747,7 @@ async def http_exception_handler(request: Request, exc: HTTPException):
             "instance": str(request.url),
             "method": request.method,
             "suggestion": "Ensure your request parameters are correct. If the issue persists, contact support: support@llmhub.dev",
+            "request_id": getattr(request.state, "request_id", None),
         },
         headers=exc.headers,
     )
@@ -108,7 +758,10 @@ async def global_exception_handler(request: Request, exc: Exception):
     Handles general exceptions.
     Returns a standardized JSON response for unhandled exceptions.
     """
-    error_id = request.headers.get("X-Request-ID", "N/A")  # If request tracking is used
+    # Set by TelemetryMiddleware; this handler runs outside it, so the header
+    # is added here.
+    error_id = getattr(request.state, "request_id", None) or "N/A"
+    logging.error(f"Unhandled error in request {error_id}: {exc!r}")
 
     return JSONResponse(
         status_code=HTTP_500_INTERNAL_SERVER_ERROR,
@@ -122,5 +775,11 @@ async def global_exception_handler(request: Request, exc: Exception):
             "error_id": error_id,
             "support": "If the error persists, contact support: support@llmhub.dev",
         },
-        headers={"Content-Type": "application/problem+json"},
+        headers={
+            "Content-Type": "application/problem+json",
+            REQUEST_ID_HEADER: error_id,
+        },
     )
+
+
+app.add_exception_handler(Exception, global_exception_handler)
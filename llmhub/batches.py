@@ -0,0 +1,489 @@
+import os
+import time
+import uuid
+import asyncio
+import logging
+
+
+import orjson
+from pydantic import ValidationError
+from typing import Dict, List, Optional
+
+
+from llmhub.pipeline import complete_chat, select_model
+from pydantic_types.batch import (
+    Batch,
+    BatchError,
+    BatchErrors,
+    BatchRequestInput,
+    CreateBatchRequest,
+)
+from service.chat.resilience import provider_slots
+from service.clients import PROVIDERS, provider_settings
+from service.files.store import (
+    FileStore,
+    JsonlLineTooLong,
+    JsonlWriter,
+    iter_jsonl_lines,
+)
+from utils.auth import validate_request
+from utils.postgres import (
+    ApiCallLogSink,
+    api_call_log_record,
+    fetch_batch,
+    fetch_batch_status,
+    list_batch_records,
+    upsert_batch,
+)
+from utils.rate_limit import RateLimitExceeded
+from utils.telemetry import record_usage
+
+
+BATCH_ENDPOINT = "/v1/chat/completions"
+COMPLETION_WINDOWS = {"24h": 24 * 3600}
+MAX_BATCH_REQUESTS = int(os.getenv("BATCH_MAX_REQUESTS", "50000"))
+# Validation errors reported on a failed batch; the rest are only counted.
+MAX_REPORTED_ERRORS = 100
+# How often a batch waits out a provider rate limit before failing a request.
+MAX_RATE_LIMIT_RETRIES = 5
+
+TERMINAL_STATUSES = {"failed", "completed", "expired", "cancelled"}
+
+
+class BatchValidationError(Exception):
+    """
+    Raised when a batch cannot be created from the given input.
+    """
+
+
+class BatchCancelled(Exception):
+    pass
+
+
+class BatchRun:
+    """
+    State of one batch while it executes on this instance.
+    """
+
+    def __init__(self, batch: Batch, user_id: str, api_key_id: str):
+        self.batch = batch
+        self.user_id = user_id
+        self.api_key_id = api_key_id
+        self.cancelled = asyncio.Event()
+        self.usage_records: List[tuple] = []
+
+
+class BatchRunner:
+    """
+    Executes batches of chat completions read from uploaded JSONL files.
+
+    The input is validated in one streaming pass, then replayed through the
+    normal routing pipeline by a fixed pool of workers. Each provider admits at
+    most `{PREFIX}_BATCH_CONCURRENCY` requests at a time (16 by default), so a
+    large batch cannot starve interactive traffic of connections. Progress,
+    cancellation and the final state are persisted to Postgres; results and
+    errors are written as JSONL files; usage rows are written in bulk.
+    """
+
+    def __init__(
+        self,
+        pool,
+        files: FileStore,
+        log_sink: ApiCallLogSink,
+        workers: int = 64,
+        progress_interval: float = 2.0,
+    ):
+        self.pool = pool
+        self.files = files
+        self.log_sink = log_sink
+        self.workers = workers
+        self.progress_interval = progress_interval
+        self.provider_slots = {
+            provider: asyncio.Semaphore(
+                provider_settings(provider)["batch_concurrency"]
+            )
+            for provider in PROVIDERS
+        }
+        self.runs: Dict[str, BatchRun] = {}
+        self.tasks: Dict[str, asyncio.Task] = {}
+
+    async def create(
+        self, user_id: str, api_key_id: str, body: CreateBatchRequest
+    ) -> Batch:
+        """
+        Create a batch and start executing it in the background.
+
+        :raises BatchValidationError: If the endpoint, window or input file is invalid.
+        """
+        if body.endpoint != BATCH_ENDPOINT:
+            raise BatchValidationError(f"Only {BATCH_ENDPOINT} batches are supported.")
+        if body.completion_window not in COMPLETION_WINDOWS:
+            raise BatchValidationError("completion_window must be one of: 24h.")
+        input_file = await self.files.get(user_id, body.input_file_id)
+        if input_file is None:
+            raise BatchValidationError(f"No such file: {body.input_file_id}.")
+        if input_file.purpose != "batch":
+            raise BatchValidationError(
+                "The input file must be uploaded with purpose 'batch'."
+            )
+
+        now = int(time.time())
+        batch = Batch(
+            id=f"batch_{uuid.uuid4().hex}",
+            endpoint=body.endpoint,
+            input_file_id=body.input_file_id,
+            completion_window=body.completion_window,
+            status="validating",
+            created_at=now,
+            expires_at=now + COMPLETION_WINDOWS[body.completion_window],
+            metadata=body.metadata,
+        )
+        await upsert_batch(self.pool, batch.model_dump(), user_id, api_key_id)
+
+        run = BatchRun(batch, user_id, api_key_id)
+        self.runs[batch.id] = run
+        task = asyncio.create_task(self._run(run))
+        self.tasks[batch.id] = task
+        task.add_done_callback(lambda _: self._forget(batch.id))
+        return batch
+
+    def _forget(self, batch_id: str) -> None:
+        self.runs.pop(batch_id, None)
+        self.tasks.pop(batch_id, None)
+
+    async def get(self, user_id: str, batch_id: str) -> Optional[Batch]:
+        run = self.runs.get(batch_id)
+        if run is not None and run.user_id == user_id:
+            return run.batch
+        data = await fetch_batch(self.pool, batch_id, user_id)
+        return Batch(**data) if data else None
+
+    async def list(
+        self, user_id: str, after: str = None, limit: int = 20
+    ) -> List[Batch]:
+        return [
+            Batch(**data)
+            for data in await list_batch_records(self.pool, user_id, after, limit)
+        ]
+
+    async def cancel(self, user_id: str, batch_id: str) -> Optional[Batch]:
+        """
+        Stop dispatching a batch's remaining requests. Requests already in
+        flight finish and their results are kept. A batch running on another
+        instance notices the "cancelling" status at its next progress update.
+        """
+        batch = await self.get(user_id, batch_id)
+        if batch is None or batch.status in TERMINAL_STATUSES | {"cancelling"}:
+            return batch
+
+        run = self.runs.get(batch_id)
+        batch.status = "cancelling"
+        batch.cancelling_at = int(time.time())
+        if run is not None:
+            run.cancelled.set()
+            await self._save(run)
+        else:
+            await upsert_batch(self.pool, batch.model_dump(), user_id, "")
+        return batch
+
+    async def _save(self, run: BatchRun) -> None:
+        await upsert_batch(
+            self.pool, run.batch.model_dump(), run.user_id, run.api_key_id
+        )
+
+    async def _validate(self, run: BatchRun) -> int:
+        """
+        Check every input line without keeping the requests in memory.
+
+        :return: Number of requests in the file.
+        """
+        errors: List[BatchError] = []
+        error_count = 0
+        custom_ids = set()
+        total = 0
+        lines = iter_jsonl_lines(self.files.path(run.batch.input_file_id))
+        try:
+            async for line_no, line in lines:
+                total += 1
+                error = None
+                try:
+                    item = BatchRequestInput.model_validate_json(line)
+                    if item.url != run.batch.endpoint:
+                        error = BatchError(
+                            code="invalid_url",
+                            message=f"url must be {run.batch.endpoint}.",
+                            param="url",
+                            line=line_no,
+                        )
+                    elif item.method != "POST":
+                        error = BatchError(
+                            code="invalid_method",
+                            message="method must be POST.",
+                            param="method",
+                            line=line_no,
+                        )
+                    elif item.body.thread_id is not None:
+                        error = BatchError(
+                            code="invalid_request",
+                            message="thread_id is not supported in batches.",
+                            param="body.thread_id",
+                            line=line_no,
+                        )
+                    elif item.custom_id in custom_ids:
+                        error = BatchError(
+                            code="duplicate_custom_id",
+                            message=f"Duplicate custom_id {item.custom_id}.",
+                            param="custom_id",
+                            line=line_no,
+                        )
+                    custom_ids.add(item.custom_id)
+                except ValidationError as e:
+                    error = BatchError(
+                        code="invalid_request",
+                        message=str(e.errors()[0]["msg"]),
+                        line=line_no,
+                    )
+                if error is not None:
+                    error_count += 1
+                    if len(errors) < MAX_REPORTED_ERRORS:
+                        errors.append(error)
+        except JsonlLineTooLong as e:
+            error_count += 1
+            errors.append(
+                BatchError(code="line_too_long", message=str(e), line=e.line_no)
+            )
+
+        if total == 0:
+            errors.append(
+                BatchError(code="empty_file", message="The input file has no requests.")
+            )
+        elif total > MAX_BATCH_REQUESTS:
+            errors.append(
+                BatchError(
+                    code="too_many_requests",
+                    message=f"A batch can hold at most {MAX_BATCH_REQUESTS} requests.",
+                )
+            )
+        if errors:
+            if error_count > len(errors):
+                logging.info(f"Batch {run.batch.id} has {error_count} invalid lines.")
+            raise BatchValidationError(BatchErrors(data=errors))
+        return total
+
+    async def _execute(self, run: BatchRun, item: BatchRequestInput) -> dict:
+        """
+        Run one batch request through the routing pipeline.
+
+        :return: The output line for the request.
+        """
+        request = item.body.model_copy(update={"stream": False})
+        request_id = f"batch_req_{uuid.uuid4().hex}"
+        try:
+            await validate_request(request)
+            request, selected = await select_model(request, run.user_id)
+            # Taken by the dispatcher for the provider it calls, which is not
+            # the routed model's after a failover.
+            provider_slots.set(self.provider_slots)
+            for attempt in range(MAX_RATE_LIMIT_RETRIES + 1):
+                try:
+                    response, cache_status = await complete_chat(
+                        request, run.user_id, selected=selected
+                    )
+                    break
+                except RateLimitExceeded as e:
+                    if attempt == MAX_RATE_LIMIT_RETRIES:
+                        raise
+                    await asyncio.sleep(e.retry_after)
+        except Exception as e:
+            status_code = getattr(e, "status_code", None) or 500
+            detail = getattr(e, "detail", None) or str(e)
+            return {
+                "id": request_id,
+                "custom_id": item.custom_id,
+                "response": {
+                    "status_code": status_code,
+                    "request_id": request_id,
+                    "body": None,
+                },
+                "error": {"code": type(e).__name__, "message": detail},
+            }
+
+        run.usage_records.append(
+            api_call_log_record(
+                response,
+                run.user_id,
+                run.api_key_id,
+                cache_hit=cache_status in ("hit", "semantic-hit"),
+            )
+        )
+        record_usage(response.model, response.usage)
+        return {
+            "id": request_id,
+            "custom_id": item.custom_id,
+            "response": {
+                "status_code": 200,
+                "request_id": request_id,
+                # Embedded as already-encoded JSON rather than re-serialized.
+                "body": orjson.Fragment(response.to_json()),
+            },
+            "error": None,
+        }
+
+    async def _produce(self, run: BatchRun, queue: asyncio.Queue) -> None:
+        async for _, line in iter_jsonl_lines(self.files.path(run.batch.input_file_id)):
+            if run.cancelled.is_set() or time.time() >= run.batch.expires_at:
+                break
+            await queue.put(BatchRequestInput.model_validate_json(line))
+        for _ in range(self.workers):
+            await queue.put(None)
+
+    async def _work(
+        self,
+        run: BatchRun,
+        queue: asyncio.Queue,
+        output: JsonlWriter,
+        errors: JsonlWriter,
+    ) -> None:
+        counts = run.batch.request_counts
+        while True:
+            item = await queue.get()
+            if item is None:
+                return
+            result = await self._execute(run, item)
+            line = orjson.dumps(result)
+            if result["error"] is None:
+                counts.completed += 1
+                await output.write(line)
+            else:
+                counts.failed += 1
+                await errors.write(line)
+
+    async def _report_progress(self, run: BatchRun) -> None:
+        while True:
+            await asyncio.sleep(self.progress_interval)
+            await self._flush_usage(run)
+            if await fetch_batch_status(self.pool, run.batch.id) == "cancelling":
+                run.cancelled.set()
+            if run.cancelled.is_set() and run.batch.status != "cancelling":
+                run.batch.status = "cancelling"
+                run.batch.cancelling_at = run.batch.cancelling_at or int(time.time())
+            await self._save(run)
+
+    async def _flush_usage(self, run: BatchRun) -> None:
+        records, run.usage_records = run.usage_records, []
+        if records:
+            await self.log_sink.write_records(records)
+
+    async def _run(self, run: BatchRun) -> None:
+        batch = run.batch
+        try:
+            try:
+                batch.request_counts.total = await self._validate(run)
+            except BatchValidationError as e:
+                errors = e.args[0]
+                batch.errors = (
+                    errors
+                    if isinstance(errors, BatchErrors)
+                    else BatchErrors(
+                        data=[BatchError(code="invalid_file", message=str(errors))]
+                    )
+                )
+                batch.status = "failed"
+                batch.failed_at = int(time.time())
+                await self._save(run)
+                return
+
+            if run.cancelled.is_set():
+                raise BatchCancelled()
+            batch.status = "in_progress"
+            batch.in_progress_at = int(time.time())
+            await self._save(run)
+
+            output_id, output_path = self.files.new_file()
+            error_id, error_path = self.files.new_file()
+            output, errors = JsonlWriter(output_path), JsonlWriter(error_path)
+            queue: asyncio.Queue = asyncio.Queue(maxsize=self.workers * 2)
+            progress = asyncio.create_task(self._report_progress(run))
+            tasks = [asyncio.create_task(self._produce(run, queue))] + [
+                asyncio.create_task(self._work(run, queue, output, errors))
+                for _ in range(self.workers)
+            ]
+            try:
+                # Awaited together, so a worker that dies fails the batch at
+                # once rather than leaving the producer blocked on a full queue.
+                await asyncio.gather(*tasks)
+            finally:
+                progress.cancel()
+                for task in tasks:
+                    task.cancel()
+
+            batch.status = "finalizing"
+            batch.finalizing_at = int(time.time())
+            await self._save(run)
+            await self._flush_usage(run)
+            await output.close()
+            await errors.close()
+            if output.lines:
+                await self.files.register(
+                    run.user_id, output_id, f"{batch.id}_output.jsonl", "batch_output"
+                )
+                batch.output_file_id = output_id
+            if errors.lines:
+                await self.files.register(
+                    run.user_id, error_id, f"{batch.id}_errors.jsonl", "batch_output"
+                )
+                batch.error_file_id = error_id
+
+            now = int(time.time())
+            if run.cancelled.is_set():
+                batch.status, batch.cancelled_at = "cancelled", now
+            elif (
+                now >= batch.expires_at
+                and output.lines + errors.lines < batch.request_counts.total
+            ):
+                batch.status, batch.expired_at = "expired", now
+            else:
+                batch.status, batch.completed_at = "completed", now
+            await self._save(run)
+        except BatchCancelled:
+            batch.status, batch.cancelled_at = "cancelled", int(time.time())
+            await self._save(run)
+        except asyncio.CancelledError:
+            batch.status, batch.failed_at = "failed", int(time.time())
+            batch.errors = BatchErrors(
+                data=[
+                    BatchError(
+                        code="batch_interrupted",
+                        message="The batch was interrupted by a shutdown.",
+                    )
+                ]
+            )
+            await self._save(run)
+            raise
+        except Exception as e:
+            logging.error(f"Batch {batch.id} failed: {e}")
+            batch.status, batch.failed_at = "failed", int(time.time())
+            batch.errors = BatchErrors(
+                data=[BatchError(code="internal_error", message=str(e))]
+            )
+            await self._save(run)
+        finally:
+            await self._flush_usage(run)
+
+    async def close(self) -> None:
+        """
+        Interrupt batches still running on this instance, recording them as failed.
+        """
+        tasks = list(self.tasks.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def stats(self) -> Dict:
+        return {
+            "running": len(self.tasks),
+            "requests_pending": sum(
+                max(counts.total - counts.completed - counts.failed, 0)
+                for counts in (run.batch.request_counts for run in self.runs.values())
+            ),
+        }
@@ -0,0 +1,327 @@
+import re
+import math
+
+
+from typing import Dict, List, Tuple
+
+
+MODELS = [
+    "claude-3.5-sonnet",
+    "gpt-4o-mini",
+    "gemini-1.5-flash",
+    "mistral-nemo",
+    "meta-llama",
+]
+
+HASH_BITS = 18
+HASH_MASK = (1 << HASH_BITS) - 1
+
+# Only the head and tail of very long prompts are scored; length alone decides
+# those anyway and this keeps classification well under a millisecond.
+MAX_SCAN_CHARS = 2000
+LONG_CONTEXT_CHARS = 20000
+
+TOKEN_RE = re.compile(r"[a-z0-9_]+|[^\sa-z0-9_]")
+
+# Keyword/regex triggers, each adding a fixed logit bonus to one model. Single
+# words are matched against the prompt's token set, phrases by substring.
+RULES = [
+    (
+        "claude-3.5-sonnet",
+        3.0,
+        {
+            "python",
+            "javascript",
+            "typescript",
+            "java",
+            "golang",
+            "rust",
+            "sql",
+            "regex",
+            "bash",
+            "kotlin",
+            "swift",
+            "html",
+            "css",
+            "react",
+            "django",
+            "fastapi",
+            "compile",
+            "debug",
+            "refactor",
+            "traceback",
+            "segfault",
+            "exception",
+            "code",
+            "function",
+            "pytest",
+            "docker",
+        },
+        (
+            "```",
+            "def ",
+            "#include",
+            "import ",
+            "c++",
+            "stack trace",
+            "unit test",
+            "api endpoint",
+        ),
+    ),
+    (
+        "mistral-nemo",
+        3.0,
+        {
+            "summarize",
+            "summarise",
+            "summary",
+            "summarization",
+            "tldr",
+            "condense",
+            "recap",
+            "shorten",
+        },
+        ("tl;dr", "key points", "main points", "abstract of", "in a nutshell"),
+    ),
+    (
+        "gpt-4o-mini",
+        2.0,
+        {
+            "prove",
+            "proof",
+            "calculate",
+            "probability",
+            "logic",
+            "puzzle",
+            "riddle",
+            "deduce",
+            "equation",
+            "solve",
+            "derive",
+            "optimize",
+            "optimise",
+            "reasoning",
+            "syllogism",
+            "estimate",
+        },
+        (
+            "step by step",
+            "how many",
+            "trade-off",
+            "tradeoff",
+            "compare and contrast",
+            "reason through",
+        ),
+    ),
+    (
+        "meta-llama",
+        2.0,
+        {"hi", "hello", "hey", "thanks", "joke", "compliment", "favourite", "favorite"},
+        (
+            "good morning",
+            "thank you",
+            "how are you",
+            "what's up",
+            "recommend a",
+            "chat with me",
+        ),
+    ),
+]
+ARITHMETIC_RE = re.compile(r"\d\s*[-+*/^=]\s*\d")
+
+
+SEED_EXAMPLES = [
+    ("Write a Python function that reverses a linked list.", "claude-3.5-sonnet"),
+    (
+        "Fix the bug in this JavaScript code that fails on empty arrays.",
+        "claude-3.5-sonnet",
+    ),
+    ("How do I write a SQL query that joins three tables?", "claude-3.5-sonnet"),
+    ("Refactor this class to use dependency injection.", "claude-3.5-sonnet"),
+    ("Explain this stack trace from my Django app.", "claude-3.5-sonnet"),
+    ("Generate unit tests for the following module.", "claude-3.5-sonnet"),
+    ("Write a bash script to back up a directory every night.", "claude-3.5-sonnet"),
+    ("Convert this Java code to idiomatic Kotlin.", "claude-3.5-sonnet"),
+    ("Implement binary search in Rust.", "claude-3.5-sonnet"),
+    ("Why does my React component re-render twice?", "claude-3.5-sonnet"),
+    (
+        "If a train leaves at 3pm going 60 mph, when does it arrive 150 miles away?",
+        "gpt-4o-mini",
+    ),
+    ("Solve this logic puzzle: three boxes are mislabeled.", "gpt-4o-mini"),
+    ("What is the probability of rolling two sixes in a row?", "gpt-4o-mini"),
+    ("Prove that the square root of two is irrational.", "gpt-4o-mini"),
+    (
+        "Walk me through the trade-offs of microservices versus a monolith.",
+        "gpt-4o-mini",
+    ),
+    (
+        "Think step by step: how many weighings to find the heavy coin among twelve?",
+        "gpt-4o-mini",
+    ),
+    ("Analyze the pros and cons of raising interest rates now.", "gpt-4o-mini"),
+    ("Plan an optimal schedule for these five tasks with dependencies.", "gpt-4o-mini"),
+    ("Derive the formula for compound interest.", "gpt-4o-mini"),
+    ("Which argument is stronger and why?", "gpt-4o-mini"),
+    (
+        "Here is the full transcript of the meeting, answer questions about it.",
+        "gemini-1.5-flash",
+    ),
+    (
+        "I am pasting the entire contract below, find every clause about termination.",
+        "gemini-1.5-flash",
+    ),
+    (
+        "Read this whole book chapter and list all characters mentioned.",
+        "gemini-1.5-flash",
+    ),
+    (
+        "Search through these attached logs for the first occurrence of the error.",
+        "gemini-1.5-flash",
+    ),
+    ("Given this long document, extract every date and amount.", "gemini-1.5-flash"),
+    (
+        "Here are all of our support tickets from last month, find recurring themes.",
+        "gemini-1.5-flash",
+    ),
+    (
+        "Cross-reference these two long reports and list the contradictions.",
+        "gemini-1.5-flash",
+    ),
+    ("Answer questions using the full dataset pasted below.", "gemini-1.5-flash"),
+    ("Summarize this article in three bullet points.", "mistral-nemo"),
+    ("Give me a short summary of the following email thread.", "mistral-nemo"),
+    ("TL;DR of this paper please.", "mistral-nemo"),
+    ("Condense these meeting notes into key points.", "mistral-nemo"),
+    ("Recap the main points of this chapter.", "mistral-nemo"),
+    ("Write an abstract of this research report.", "mistral-nemo"),
+    ("Shorten this paragraph to one sentence.", "mistral-nemo"),
+    ("Summarise the customer feedback below.", "mistral-nemo"),
+    ("Hi! How are you today?", "meta-llama"),
+    ("Tell me a joke about cats.", "meta-llama"),
+    ("What's a good name for my new puppy?", "meta-llama"),
+    ("Thanks for the help earlier!", "meta-llama"),
+    ("Recommend a movie for a cozy night in.", "meta-llama"),
+    ("Write a friendly birthday message for my friend.", "meta-llama"),
+    ("What should I cook for dinner tonight?", "meta-llama"),
+    ("Let's chat about your favourite travel destinations.", "meta-llama"),
+    ("Good morning, any fun plans for the weekend?", "meta-llama"),
+    ("Can you suggest some hobbies I could try?", "meta-llama"),
+]
+
+
+def _scan_text(text: str) -> str:
+    if len(text) > MAX_SCAN_CHARS:
+        half = MAX_SCAN_CHARS // 2
+        text = text[:half] + " " + text[-half:]
+    return text.lower()
+
+
+def hashed_features(tokens: List[str]) -> List[int]:
+    """
+    Hash word unigrams and bigrams into a fixed feature space.
+
+    Python's string hash is salted per process, which is fine here because the
+    model is fitted in the same process that scores with it.
+
+    :param tokens: Lower-cased tokens of the text.
+    :return: List of feature bucket ids.
+    """
+    grams = tokens + [a + " " + b for a, b in zip(tokens, tokens[1:])]
+    return [hash(gram) & HASH_MASK for gram in grams]
+
+
+class RoutingClassifier:
+    """
+    In-process router: keyword/regex rules plus a linear model over hashed n-grams.
+
+    The linear model is a multinomial naive Bayes fitted on labelled examples at
+    construction time, stored as sparse per-bucket weights so scoring is a single
+    pass over the prompt's features.
+    """
+
+    def __init__(
+        self, examples: List[Tuple[str, str]] = SEED_EXAMPLES, alpha: float = 0.5
+    ):
+        self.labels = list(MODELS)
+        self.weights: Dict[int, List[float]] = {}
+        self.unseen: List[float] = []
+        self.priors: List[float] = []
+        self.fit(examples, alpha)
+
+    def fit(self, examples: List[Tuple[str, str]], alpha: float = 0.5) -> None:
+        counts = {label: {} for label in self.labels}
+        totals = {label: 0 for label in self.labels}
+        docs = {label: 0 for label in self.labels}
+        vocabulary = set()
+
+        for text, label in examples:
+            docs[label] += 1
+            for bucket in hashed_features(TOKEN_RE.findall(text.lower())):
+                counts[label][bucket] = counts[label].get(bucket, 0) + 1
+                totals[label] += 1
+                vocabulary.add(bucket)
+
+        size = len(vocabulary) + 1
+        self.priors = [
+            math.log((docs[label] + 1) / (len(examples) + len(self.labels)))
+            for label in self.labels
+        ]
+        self.unseen = [
+            math.log(alpha / (totals[label] + alpha * size)) for label in self.labels
+        ]
+        self.weights = {}
+        for bucket in vocabulary:
+            self.weights[bucket] = [
+                math.log(
+                    (counts[label].get(bucket, 0) + alpha)
+                    / (totals[label] + alpha * size)
+                )
+                - self.unseen[i]
+                for i, label in enumerate(self.labels)
+            ]
+
+    def scores(self, text: str) -> List[float]:
+        scan = _scan_text(text)
+        tokens = TOKEN_RE.findall(scan)
+        features = hashed_features(tokens)
+        logits = [
+            prior + unseen * len(features)
+            for prior, unseen in zip(self.priors, self.unseen)
+        ]
+        for bucket in features:
+            weights = self.weights.get(bucket)
+            if weights is not None:
+                for i, weight in enumerate(weights):
+                    logits[i] += weight
+
+        # Length-normalise so long prompts don't become overconfident.
+        scale = 1.0 / math.sqrt(max(len(features), 1))
+        logits = [logit * scale for logit in logits]
+
+        token_set = set(tokens)
+        for label, bonus, keywords, phrases in RULES:
+            if not token_set.isdisjoint(keywords) or any(p in scan for p in phrases):
+                logits[self.labels.index(label)] += bonus
+        if ARITHMETIC_RE.search(scan):
+            logits[self.labels.index("gpt-4o-mini")] += 2.0
+        return logits
+
+    def predict(self, text: str) -> Tuple[str, float]:
+        """
+        Pick a model for the prompt.
+
+        :param text: The last user message.
+        :return: Tuple of (model name, confidence between 0 and 1).
+        """
+        if len(text) >= LONG_CONTEXT_CHARS:
+            return "gemini-1.5-flash", 1.0
+
+        logits = self.scores(text)
+        top = max(logits)
+        exps = [math.exp(logit - top) for logit in logits]
+        best = logits.index(top)
+        return self.labels[best], exps[best] / sum(exps)
+
+
+classifier = RoutingClassifier()
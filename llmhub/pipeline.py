@@ -0,0 +1,252 @@
+import os
+import asyncio
+
+
+from typing import Optional, Set, Tuple
+
+
+from llmhub.router import route
+from llmhub.tenant_routes import tenant_routes
+from service.chat.service_router import MODEL_PROVIDERS, RouterChatCompletion
+from service.chat.response_cache import (
+    canonical_request_key,
+    is_deterministic,
+    response_cache,
+)
+from service.chat.semantic_cache import semantic_cache
+from service.chat.prompt_cache import current_tenant
+from pydantic_types.chat import CreateChatCompletionRequest
+from utils.single_flight import SingleFlight
+from utils.telemetry import set_route, stage
+from utils.tokenizer import (
+    CONTEXT_WINDOWS,
+    count_prompt_tokens,
+    encoding_name,
+    truncate_messages,
+)
+
+
+COALESCE_ENABLED = os.getenv("COALESCE_ENABLED", "true").lower() == "true"
+
+# Prompts at least this long go straight to LONG_CONTEXT_MODEL without asking
+# the router.
+LONG_CONTEXT_TOKENS = int(os.getenv("LONG_CONTEXT_TOKENS", "5000"))
+LONG_CONTEXT_MODEL = os.getenv("LONG_CONTEXT_MODEL", "gemini-1.5-flash")
+# What to do with a prompt that fits no model: "reject" or "truncate".
+OVERSIZE_PROMPT_POLICY = os.getenv("OVERSIZE_PROMPT_POLICY", "reject")
+
+
+class ContextLengthExceeded(Exception):
+    """
+    Raised when a prompt does not fit the context window of any model it may be
+    sent to.
+    """
+
+    def __init__(self, prompt_tokens: int, limit: int):
+        super().__init__(
+            f"This request needs {prompt_tokens} tokens, more than the largest "
+            f"available context window of {limit} tokens. Shorten the messages "
+            f"or max_completion_tokens."
+        )
+        self.prompt_tokens = prompt_tokens
+        self.limit = limit
+
+
+class Route:
+    """
+    Where `select_model` sends a request: the model, the models the tenant
+    permits it to reach by failover (None for any), and its prompt tokens if
+    they are still known after fitting.
+    """
+
+    __slots__ = ("model", "allowed", "prompt_tokens")
+
+    def __init__(
+        self,
+        model: str,
+        allowed: Optional[Set[str]] = None,
+        prompt_tokens: Optional[int] = None,
+    ):
+        self.model = model
+        self.allowed = allowed
+        self.prompt_tokens = prompt_tokens
+
+
+completion_flights = SingleFlight()
+
+
+async def fit_context_window(
+    request: CreateChatCompletionRequest,
+    model: str,
+    prompt_tokens: int,
+    allowed: Optional[Set[str]] = None,
+) -> Tuple[CreateChatCompletionRequest, str]:
+    """
+    Make sure the request fits the chosen model's context window.
+
+    A request that is too long for the routed model moves to LONG_CONTEXT_MODEL,
+    or failing that to the largest window that fits. One that fits nowhere is
+    rejected or, with OVERSIZE_PROMPT_POLICY=truncate, shortened to fit the
+    largest window.
+
+    :param request: The chat completion request.
+    :param model: The routed model.
+    :param prompt_tokens: Prompt tokens counted with the default encoding.
+    :param allowed: The only models the request may move to, or None for any.
+    :return: Tuple of (request, model) to dispatch.
+    :raises ContextLengthExceeded: If the request fits no model and is not truncated.
+    """
+    budget = request.max_completion_tokens or 0
+    window = CONTEXT_WINDOWS.get(model)
+    if window is None:
+        return request, model
+    if encoding_name(model) != encoding_name(None) and prompt_tokens + budget > window * 0.8:
+        # Close to the limit the model's own encoding decides.
+        prompt_tokens = await count_prompt_tokens(request.messages, model)
+    if prompt_tokens + budget <= window:
+        return request, model
+
+    windows = {
+        m: w for m, w in CONTEXT_WINDOWS.items() if allowed is None or m in allowed
+    }
+    if prompt_tokens + budget <= windows.get(LONG_CONTEXT_MODEL, 0):
+        return request, LONG_CONTEXT_MODEL
+    fitting = [m for m, w in windows.items() if prompt_tokens + budget <= w]
+    if fitting:
+        return request, max(fitting, key=windows.get)
+    if not windows:
+        raise ContextLengthExceeded(prompt_tokens + budget, window)
+
+    largest = max(windows, key=windows.get)
+    if OVERSIZE_PROMPT_POLICY == "truncate":
+        messages = await asyncio.to_thread(
+            truncate_messages, request.messages, windows[largest] - budget, largest
+        )
+        if messages is not None:
+            return request.model_copy(update={"messages": messages}), largest
+    raise ContextLengthExceeded(prompt_tokens + budget, windows[largest])
+
+
+async def select_model(
+    request: CreateChatCompletionRequest,
+    tenant: Optional[str] = None,
+) -> Tuple[CreateChatCompletionRequest, Route]:
+    """
+    Pick the model for a request.
+
+    Prompts are measured first. The tenant's own routing rules are tried next,
+    and only requests they do not match go to the router (long ones skip it).
+    The tenant's allow-list and cost ceiling then apply, and every request is
+    fitted to a permitted model's context window before anything is sent
+    upstream.
+
+    :param request: The chat completion request.
+    :param tenant: The caller's userId, whose routing rules apply.
+    :return: Tuple of (request, possibly truncated, and its route).
+    """
+    with stage("tokenize"):
+        prompt_tokens = await count_prompt_tokens(request.messages)
+    with stage("route"):
+        model, table = tenant_routes.route(tenant, request.messages[-1].content)
+        if model is None:
+            if prompt_tokens >= LONG_CONTEXT_TOKENS:
+                model = LONG_CONTEXT_MODEL
+            else:
+                model = (
+                    await route(request.messages[-1].content, model="automatic")
+                ).strip()
+        model = tenant_routes.constrain(
+            table, model, prompt_tokens, request.max_completion_tokens
+        )
+        allowed = tenant_routes.permitted(
+            table, prompt_tokens, request.max_completion_tokens
+        )
+        fitted, model = await fit_context_window(
+            request, model, prompt_tokens, allowed
+        )
+    set_route(model, MODEL_PROVIDERS.get(model, ("azure_openai", None))[0])
+    # A truncated request is counted again where it is needed.
+    return fitted, Route(
+        model, allowed, prompt_tokens if fitted is request else None
+    )
+
+
+async def complete_chat(
+    request: CreateChatCompletionRequest,
+    tenant: str,
+    bypass: bool = False,
+    selected: Optional[Route] = None,
+) -> Tuple[object, Optional[str]]:
+    """
+    Route a chat request and answer it from the response caches or the provider.
+
+    Usage logging is left to the caller.
+
+    :param request: The chat completion request.
+    :param tenant: The caller's userId, which scopes the semantic cache.
+    :param bypass: Skip both response caches.
+    :param selected: Route already chosen with `select_model`; routed here if None.
+    :return: Tuple of (Completion or chunk iterator for streaming requests,
+        cache status for the X-LLMHub-Cache header or None).
+    """
+    if selected is None:
+        request, selected = await select_model(request, tenant)
+    model = selected.model
+    status = "bypass" if bypass else None
+
+    cache_key = None
+    if response_cache.enabled and is_deterministic(request) and not bypass:
+        cache_key = canonical_request_key(request, model)
+        with stage("cache_lookup"):
+            cached = await response_cache.get(cache_key)
+        if cached is not None:
+            return cached, "hit"
+        status = "miss"
+
+    semantic_lookup = None
+    if semantic_cache.enabled and not request.stream and not bypass:
+        with stage("semantic_cache_lookup"):
+            cached, semantic_lookup = await semantic_cache.lookup(
+                tenant, request, model
+            )
+        if cached is not None:
+            return cached, "semantic-hit"
+        status = "miss"
+
+    # Lets adapters keep provider prompt caches per tenant.
+    current_tenant.set(tenant)
+    response = await RouterChatCompletion(
+        model=model,
+        request=request,
+        allowed=selected.allowed,
+        prompt_tokens=selected.prompt_tokens,
+    )
+    if request.stream:
+        return response, status
+
+    if cache_key is not None:
+        await response_cache.set(cache_key, response)
+    if semantic_lookup is not None:
+        semantic_cache.store(tenant, semantic_lookup, response)
+    return response, status
+
+
+async def coalesced_complete_chat(
+    request: CreateChatCompletionRequest, tenant: str, bypass: bool = False
+) -> Tuple[object, Optional[str], bool]:
+    """
+    `complete_chat`, with identical in-flight deterministic requests from the
+    same tenant sharing one routing decision and one upstream call.
+
+    :return: Tuple of (response, cache status, whether the response was shared
+        from another caller's in-flight request).
+    """
+    if not COALESCE_ENABLED or bypass or not is_deterministic(request):
+        response, status = await complete_chat(request, tenant, bypass)
+        return response, status, False
+
+    key = f"{tenant}:{canonical_request_key(request, request.model)}"
+    (response, status), shared = await completion_flights.do(
+        key, lambda: complete_chat(request, tenant)
+    )
+    return response, ("coalesced" if shared else status), shared
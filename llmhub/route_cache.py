@@ -0,0 +1,178 @@
+import os
+import time
+import asyncio
+import hashlib
+import logging
+
+
+from cachetools import TTLCache
+from typing import Awaitable, Callable, Dict
+
+
+from utils.cache import shared_store_from_env
+from utils.database import TENANT_MODE_PREFIX, on_route_config_change
+
+
+GENERATION_KEY = "llmhub:route-cache:generation"
+# How often a worker re-reads the shared generation counter, which bounds how
+# long another instance's config change can go unnoticed.
+GENERATION_CHECK_INTERVAL = 1.0
+
+
+def normalize_prompt(msg: str) -> str:
+    """
+    Normalize a prompt so trivially different copies share one cache entry.
+    """
+    return " ".join(msg.lower().split()).rstrip(" .!?")
+
+
+class RouteCache:
+    """
+    LRU+TTL cache of routing decisions keyed on a fingerprint of the prompt.
+
+    A local TTLCache answers repeat prompts without leaving the process. An
+    optional shared store lets every Function instance reuse decisions made by
+    the others. Entries are namespaced by a generation counter that is bumped
+    whenever the route config changes, which invalidates everything at once.
+    """
+
+    def __init__(self, maxsize: int = 10000, ttl: float = 600.0, shared=None):
+        self.ttl = ttl
+        self.local = TTLCache(maxsize=maxsize, ttl=ttl)
+        self.shared = shared
+        self.generation = 0
+        self._generation_checked_at = 0.0
+        # Generation bumps in flight, referenced until they finish.
+        self.running = set()
+        self.hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+
+    def fingerprint(self, msg: str, mode: str) -> str:
+        digest = hashlib.sha256(normalize_prompt(msg).encode()).hexdigest()
+        return f"llmhub:route:{self.generation}:{mode}:{digest}"
+
+    async def _sync_generation(self) -> None:
+        now = time.monotonic()
+        if (
+            self.shared is None
+            or now - self._generation_checked_at < GENERATION_CHECK_INTERVAL
+        ):
+            return
+        self._generation_checked_at = now
+        try:
+            generation = int(await self.shared.get(GENERATION_KEY) or 0)
+        except Exception as e:
+            logging.error(f"Failed to read route cache generation: {e}")
+            return
+        if generation != self.generation:
+            self.local.clear()
+            self.generation = generation
+
+    async def get_or_route(
+        self,
+        msg: str,
+        mode: str,
+        router: Callable[..., Awaitable[str]],
+    ) -> str:
+        """
+        Return the cached routing decision for the prompt, or compute and cache it.
+
+        :param msg: The message being routed.
+        :param mode: Routing mode, part of the cache key.
+        :param router: Coroutine function called as router(msg, model=mode) on a miss.
+        :return: The routed model name.
+        """
+        await self._sync_generation()
+        key = self.fingerprint(msg, mode)
+
+        decision = self.local.get(key)
+        if decision is not None:
+            self.hits += 1
+            return decision
+
+        if self.shared is not None:
+            try:
+                value = await self.shared.get(key)
+            except Exception as e:
+                logging.error(f"Shared route cache read failed: {e}")
+                value = None
+            if value is not None:
+                decision = value.decode()
+                self.local[key] = decision
+                self.shared_hits += 1
+                return decision
+
+        self.misses += 1
+        decision = await router(msg, model=mode)
+        self.local[key] = decision
+        if self.shared is not None:
+            try:
+                await self.shared.set(key, decision.encode(), ttl=self.ttl)
+            except Exception as e:
+                logging.error(f"Shared route cache write failed: {e}")
+        return decision
+
+    @staticmethod
+    def affects_decisions(mode: str = None) -> bool:
+        """
+        Whether a change to the route config of `mode` can change cached
+        decisions. Tenant routing rules are applied before the router is asked,
+        so theirs cannot.
+        """
+        return mode is None or not mode.startswith(TENANT_MODE_PREFIX)
+
+    def clear_local(self, mode: str = None) -> None:
+        """
+        Drop this instance's cached decisions after another instance changed the
+        route config of `mode`.
+        """
+        if self.affects_decisions(mode):
+            self.local.clear()
+
+    def invalidate(self, mode: str = None) -> None:
+        """
+        Drop every cached decision, locally and (asynchronously) for all
+        instances, after the route config of `mode` was written here.
+        """
+        if not self.affects_decisions(mode):
+            return
+        self.local.clear()
+        if self.shared is None:
+            self.generation += 1
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            asyncio.run(self._bump_shared_generation())
+            return
+        task = loop.create_task(self._bump_shared_generation())
+        self.running.add(task)
+        task.add_done_callback(self.running.discard)
+
+    async def _bump_shared_generation(self) -> None:
+        try:
+            self.generation = await self.shared.incr(GENERATION_KEY)
+            self.local.clear()
+        except Exception as e:
+            logging.error(f"Failed to bump shared route cache generation: {e}")
+
+    def stats(self) -> Dict:
+        lookups = self.hits + self.shared_hits + self.misses
+        return {
+            "size": len(self.local),
+            "hits": self.hits,
+            "shared_hits": self.shared_hits,
+            "misses": self.misses,
+            "hit_ratio": (
+                round((self.hits + self.shared_hits) / lookups, 4) if lookups else 0.0
+            ),
+        }
+
+
+route_cache = RouteCache(
+    maxsize=int(os.getenv("ROUTE_CACHE_SIZE", "10000")),
+    ttl=float(os.getenv("ROUTE_CACHE_TTL", "600")),
+    shared=shared_store_from_env(),
+)
+on_route_config_change(route_cache.invalidate)
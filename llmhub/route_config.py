@@ -0,0 +1,176 @@
+import os
+import asyncio
+import logging
+
+
+from typing import Callable, Dict, List, Optional
+
+
+from utils.database import get_routing_info, on_route_config_change
+
+
+# Longest wait between attempts to re-open a failed change stream.
+MAX_WATCH_BACKOFF = 60.0
+# Server error for change streams on a standalone (non replica set) deployment.
+CHANGE_STREAMS_UNSUPPORTED = 40573
+
+
+class RouteConfigStore:
+    """
+    In-memory snapshot of the Routers/route-config documents, keyed by mode.
+
+    The collection is read once at startup; afterwards it is re-read when a
+    change stream reports a write, when this process writes a config itself,
+    and every `poll_interval` seconds as a fallback (change streams need a
+    replica set, and can miss events while reconnecting). Each reload builds a
+    new dictionary and replaces the old one in a single assignment, so readers
+    never see a half-applied update and never touch the database.
+    """
+
+    def __init__(
+        self,
+        db_name: str = "Routers",
+        collection_name: str = "route-config",
+        poll_interval: float = 30.0,
+    ):
+        self.db_name = db_name
+        self.collection_name = collection_name
+        self.poll_interval = poll_interval
+        self.configs: Dict[str, Dict] = {}
+        self.collection = None
+        self.listeners: List[Callable[[str], None]] = []
+        self.tasks: List[asyncio.Task] = []
+        self.pending = set()
+        self.reloads = 0
+        self.changes = 0
+        self.watching = False
+        self._reload_lock = asyncio.Lock()
+
+    def on_change(self, callback: Callable[[str], None]) -> None:
+        """
+        Register a callback run with the mode of every config that changes.
+        """
+        self.listeners.append(callback)
+
+    async def start(self, client) -> None:
+        """
+        Load the configs and start following changes.
+
+        :param client: A shared AsyncIOMotorClient.
+        """
+        self.collection = client[self.db_name][self.collection_name]
+        await self.reload()
+        on_route_config_change(self._on_local_write)
+        self.tasks = [
+            asyncio.create_task(self._watch()),
+            asyncio.create_task(self._poll()),
+        ]
+
+    async def reload(self) -> None:
+        """
+        Re-read every config document and swap the snapshot if anything changed.
+        """
+        async with self._reload_lock:
+            try:
+                documents = await self.collection.find({}, {"_id": 0}).to_list(None)
+            except Exception as e:
+                logging.error(f"Failed to load route configs: {e}")
+                return
+            self.reloads += 1
+            configs = {doc["mode"]: doc for doc in documents if "mode" in doc}
+            changed = {
+                mode
+                for mode in configs.keys() | self.configs.keys()
+                if configs.get(mode) != self.configs.get(mode)
+            }
+            if not changed:
+                return
+            self.configs = configs
+            self.changes += 1
+            logging.info(f"Route configs updated: {sorted(changed)}")
+        for mode in changed:
+            for callback in self.listeners:
+                try:
+                    callback(mode)
+                except Exception as e:
+                    logging.error(f"Route config listener failed: {e}")
+
+    def _on_local_write(self, mode: str) -> None:
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            # Written outside the event loop; the change stream or poll picks it up.
+            return
+        task = loop.create_task(self.reload())
+        self.pending.add(task)
+        task.add_done_callback(self.pending.discard)
+
+    async def _watch(self) -> None:
+        from pymongo.errors import OperationFailure
+
+        backoff = 1.0
+        while True:
+            try:
+                async with self.collection.watch() as stream:
+                    self.watching = True
+                    backoff = 1.0
+                    # Writes made while the stream was down are covered here.
+                    await self.reload()
+                    async for _ in stream:
+                        await self.reload()
+            except asyncio.CancelledError:
+                raise
+            except OperationFailure as e:
+                if e.code == CHANGE_STREAMS_UNSUPPORTED:
+                    logging.info(
+                        f"Route config change streams unsupported, polling every "
+                        f"{self.poll_interval}s."
+                    )
+                    self.watching = False
+                    return
+                logging.error(f"Route config change stream failed: {e}")
+            except Exception as e:
+                logging.error(
+                    f"Route config change stream unavailable, polling every "
+                    f"{self.poll_interval}s: {e}"
+                )
+            self.watching = False
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, MAX_WATCH_BACKOFF)
+
+    async def _poll(self) -> None:
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            await self.reload()
+
+    def get(self, mode: str) -> Optional[Dict]:
+        return self.configs.get(mode)
+
+    def system_prompt(self, mode: str = "automatic") -> Optional[str]:
+        """
+        The routing system prompt for a mode: the stored one if there is one,
+        otherwise the built-in default.
+        """
+        config = self.configs.get(mode)
+        if config and config.get("system_prompt"):
+            return config["system_prompt"]
+        return get_routing_info(model=mode)
+
+    async def close(self) -> None:
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        self.tasks = []
+
+    def stats(self) -> Dict:
+        return {
+            "modes": len(self.configs),
+            "reloads": self.reloads,
+            "changes": self.changes,
+            "watching": self.watching,
+        }
+
+
+route_configs = RouteConfigStore(
+    poll_interval=float(os.getenv("ROUTE_CONFIG_POLL_INTERVAL", "30")),
+)
@@ -1,39 +1,50 @@
 import os
 import json
 import logging
-import google.generativeai as genai
 from utils.database import (
     get_custom_config,
-    get_routing_info,
     write_custom_route_config,
 )
 from utils.prompt_format import create_custom_route_config
+from service.clients import provider_clients
+from llmhub.classifier import classifier
+from llmhub.route_cache import route_cache
+from llmhub.route_config import route_configs
 from dotenv import load_dotenv
 
 logging.basicConfig(
     level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s"
 )
 
+# "local" classifies in-process; "llm" asks Gemini on every request.
+ROUTER_BACKEND = os.getenv("ROUTER_BACKEND", "local")
+# Opt-in: hand low-confidence local decisions to the LLM router.
+ROUTER_LLM_FALLBACK = os.getenv("ROUTER_LLM_FALLBACK", "false").lower() == "true"
+ROUTER_CONFIDENCE_THRESHOLD = float(os.getenv("ROUTER_CONFIDENCE_THRESHOLD", "0.5"))
+ROUTE_CACHE_ENABLED = os.getenv("ROUTE_CACHE_ENABLED", "true").lower() == "true"
+
+# A config changed on another instance: decisions made with the old prompt are stale.
+route_configs.on_change(route_cache.clear_local)
+
 
 def configure_genai():
     try:
-        genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
-        logging.info("API configured successfully.")
+        return provider_clients.get("gemini")
 
     except Exception as e:
         logging.error(f"Failed to configure GenAI API: {e}")
         raise
 
 
-def infer_model_gemini(user_input):
+async def infer_model_gemini(user_input):
     """
     Call the Generative AI model with the system prompt and user input.
     """
 
     try:
-        configure_genai()
+        genai = configure_genai()
         model = genai.GenerativeModel("gemini-1.5-flash-8b")
-        response = model.generate_content(user_input)
+        response = await model.generate_content_async(user_input)
         logging.info("Model response received successfully.")
         return response.text
 
@@ -42,7 +53,46 @@ def infer_model_gemini(user_input):
         raise
 
 
-def route(msg, model="automatic"):
-    route_info = get_routing_info(model="automatic")
-    response_text = infer_model_gemini(route_info + " " + msg)
-    return response_text
+async def infer_route_llm(msg, model="automatic"):
+    """
+    Ask the Gemini routing model to pick a model for the message.
+    """
+    route_info = route_configs.system_prompt(model)
+    response_text = await infer_model_gemini(route_info + " " + msg)
+    return response_text.strip().strip("'\"")
+
+
+async def route_llm(msg, model="automatic"):
+    """
+    LLM routing with repeat prompts answered from the routing decision cache.
+    """
+    if not ROUTE_CACHE_ENABLED:
+        return await infer_route_llm(msg, model=model)
+    return await route_cache.get_or_route(msg, model, infer_route_llm)
+
+
+async def route_local(msg, model="automatic"):
+    """
+    Pick a model with the in-process classifier, optionally deferring to the
+    LLM router when the classifier is not confident.
+    """
+    choice, confidence = classifier.predict(msg)
+    if ROUTER_LLM_FALLBACK and confidence < ROUTER_CONFIDENCE_THRESHOLD:
+        logging.info(
+            f"Local router unsure ({choice}, {confidence:.2f}), falling back to LLM router."
+        )
+        return await route_llm(msg, model=model)
+    return choice
+
+
+ROUTER_BACKENDS = {
+    "local": route_local,
+    "llm": route_llm,
+}
+
+
+async def route(msg, model="automatic"):
+    backend = ROUTER_BACKENDS.get(ROUTER_BACKEND)
+    if backend is None:
+        raise ValueError(f"Unknown router backend: {ROUTER_BACKEND}")
+    return await backend(msg, model=model)
@@ -0,0 +1,443 @@
+import os
+import re
+import logging
+import importlib.util
+
+
+import regex
+
+
+from collections import deque
+from typing import Dict, List, Optional, Set, Tuple
+
+
+from llmhub.classifier import classifier
+from llmhub.route_config import route_configs
+from pydantic_types.routing import RoutingRule, TenantRoutingConfig
+from service.chat.service_router import MODEL_PROVIDERS
+from utils.database import TENANT_MODE_PREFIX
+
+
+try:
+    from re import _parser as sre_parse
+except ImportError:  # Python < 3.11
+    import sre_parse
+
+
+AHOCORASICK_AVAILABLE = importlib.util.find_spec("ahocorasick") is not None
+
+# Intent names accepted by rules, keyed by the label the local classifier predicts.
+CLASSIFIER_INTENTS = {
+    "claude-3.5-sonnet": "coding",
+    "gpt-4o-mini": "reasoning",
+    "gemini-1.5-flash": "long-context",
+    "mistral-nemo": "summarization",
+    "meta-llama": "conversation",
+}
+INTENTS = set(CLASSIFIER_INTENTS.values())
+# Below this classifier confidence, intent rules do not fire.
+INTENT_MIN_CONFIDENCE = 0.5
+
+# Tenant regexes run on the event loop for every request, so they are bounded:
+# in length and nesting when stored, and in the text and time per search.
+PATTERN_MAX_LENGTH = 512
+PATTERN_SCAN_CHARS = int(os.getenv("ROUTING_PATTERN_SCAN_CHARS", "4096"))
+PATTERN_TIMEOUT = float(os.getenv("ROUTING_PATTERN_TIMEOUT", "0.01"))
+_REPEATS = {
+    op
+    for op in (
+        sre_parse.MAX_REPEAT,
+        sre_parse.MIN_REPEAT,
+        getattr(sre_parse, "POSSESSIVE_REPEAT", None),
+    )
+    if op is not None
+}
+
+# USD per 1k (prompt, completion) tokens, for cost ceilings.
+MODEL_PRICES = {
+    "gpt-4o-mini": (0.00015, 0.0006),
+    "gemini-1.5-flash": (0.000075, 0.0003),
+    "mistral-nemo": (0.00015, 0.00015),
+    "meta-llama": (0.0003, 0.00061),
+    "claude-3.5-sonnet": (0.003, 0.015),
+}
+# Completion budget assumed for cost estimates when max_completion_tokens is unset.
+DEFAULT_COMPLETION_TOKENS = 512
+
+
+class InvalidRoutingConfig(ValueError):
+    status_code = 400
+
+
+class RouteNotAllowed(Exception):
+    """
+    Raised when no model the tenant allows can serve a request within its cost
+    ceiling.
+    """
+
+    status_code = 400
+
+
+def tenant_mode(tenant: str) -> str:
+    return f"{TENANT_MODE_PREFIX}{tenant}"
+
+
+def estimate_cost(model: str, prompt_tokens: int, completion_tokens: int) -> float:
+    prompt_price, completion_price = MODEL_PRICES.get(model, (0.0, 0.0))
+    return (prompt_tokens * prompt_price + completion_tokens * completion_price) / 1000
+
+
+class KeywordAutomaton:
+    """
+    Aho-Corasick automaton over lower-cased keywords: one pass over the text
+    finds every keyword it contains, however many keywords there are. Uses
+    pyahocorasick when it is installed, a pure-Python automaton otherwise.
+    """
+
+    def __init__(self, keywords: Dict[str, Set[int]]):
+        self.size = len(keywords)
+        if AHOCORASICK_AVAILABLE:
+            import ahocorasick
+
+            self.native = ahocorasick.Automaton()
+            for keyword, rules in keywords.items():
+                self.native.add_word(keyword, frozenset(rules))
+            if keywords:
+                self.native.make_automaton()
+            return
+        self.native = None
+        self.goto: List[Dict[str, int]] = [{}]
+        self.fail: List[int] = [0]
+        self.out: List[Set[int]] = [set()]
+        for keyword, rules in keywords.items():
+            state = 0
+            for char in keyword:
+                next_state = self.goto[state].get(char)
+                if next_state is None:
+                    next_state = len(self.goto)
+                    self.goto[state][char] = next_state
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.out.append(set())
+                state = next_state
+            self.out[state] |= rules
+
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self.goto[state].items():
+                queue.append(next_state)
+                fallback = self.fail[state]
+                while fallback and char not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                self.fail[next_state] = self.goto[fallback].get(char, 0)
+                if self.fail[next_state] == next_state:
+                    self.fail[next_state] = 0
+                self.out[next_state] |= self.out[self.fail[next_state]]
+
+    def search(self, text: str) -> Set[int]:
+        """
+        :param text: Lower-cased text to scan.
+        :return: Indices of the rules whose keywords occur in the text.
+        """
+        if not self.size:
+            return set()
+        if self.native is not None:
+            found = set()
+            for _, rules in self.native.iter(text):
+                found |= rules
+            return found
+        goto, fail, out = self.goto, self.fail, self.out
+        found = set()
+        state = 0
+        for char in text:
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            if out[state]:
+                found |= out[state]
+        return found
+
+
+def _subpatterns(value):
+    if isinstance(value, sre_parse.SubPattern):
+        yield value
+    elif isinstance(value, (list, tuple)):
+        for item in value:
+            yield from _subpatterns(item)
+
+
+def has_nested_quantifier(parsed, repeated: bool = False) -> bool:
+    """
+    Whether a parsed regex repeats something that itself repeats, like `(a+)+`,
+    the shape behind catastrophic backtracking.
+    """
+    for op, value in parsed:
+        if op in _REPEATS and value[1] > 1:
+            if repeated or has_nested_quantifier(value[2], True):
+                return True
+            continue
+        for child in _subpatterns(value):
+            if has_nested_quantifier(child, repeated):
+                return True
+    return False
+
+
+class TenantRoutingTable:
+    """
+    One tenant's rules compiled for dispatch: an automaton over every keyword,
+    one regex per rule, and the rules in the order they are tried.
+    """
+
+    def __init__(self, config: TenantRoutingConfig):
+        self.config = config
+        self.allowed = (
+            [model for model in config.allowed_models if model in MODEL_PROVIDERS]
+            if config.allowed_models
+            else None
+        )
+        self.rules: List[RoutingRule] = sorted(
+            config.rules, key=lambda rule: -rule.priority
+        )
+        keywords: Dict[str, Set[int]] = {}
+        self.patterns: List[Optional[regex.Pattern]] = []
+        for index, rule in enumerate(self.rules):
+            for keyword in rule.keywords:
+                if keyword.strip():
+                    keywords.setdefault(keyword.lower(), set()).add(index)
+            self.patterns.append(
+                regex.compile(
+                    "|".join(f"(?:{p})" for p in rule.patterns), regex.IGNORECASE
+                )
+                if rule.patterns
+                else None
+            )
+        self.automaton = KeywordAutomaton(keywords)
+        self.intent_rules: Dict[str, List[int]] = {}
+        for index, rule in enumerate(self.rules):
+            for intent in rule.intents:
+                self.intent_rules.setdefault(intent, []).append(index)
+        self.pattern_rules = [
+            index for index, pattern in enumerate(self.patterns) if pattern is not None
+        ]
+
+    def match(self, text: str) -> Optional[RoutingRule]:
+        """
+        The highest-priority rule that matches the text, if any.
+
+        Keywords and intents are found for all rules at once; regexes are only
+        tried for rules that would outrank the best match found that way.
+        """
+        best = min(self.automaton.search(text.lower()), default=len(self.rules))
+        if self.intent_rules:
+            label, confidence = classifier.predict(text)
+            if confidence >= INTENT_MIN_CONFIDENCE:
+                intent = CLASSIFIER_INTENTS.get(label)
+                best = min([best, *self.intent_rules.get(intent, ())])
+        scanned = text[:PATTERN_SCAN_CHARS]
+        for index in self.pattern_rules:
+            if index >= best:
+                break
+            try:
+                found = self.patterns[index].search(scanned, timeout=PATTERN_TIMEOUT)
+            except TimeoutError:
+                logging.warning(
+                    f"Routing rule {self.rules[index].name} timed out; skipped."
+                )
+                continue
+            if found:
+                best = index
+                break
+        return self.rules[best] if best < len(self.rules) else None
+
+    def constrain(self, model: str, prompt_tokens: int, completion_tokens: int) -> str:
+        """
+        Replace a model the tenant does not allow, or one over the cost ceiling,
+        with the closest permitted choice (the cheapest one when over budget).
+
+        :raises RouteNotAllowed: If no allowed model is available, or none is
+            within the cost ceiling.
+        """
+        candidates = self.allowed if self.allowed is not None else list(MODEL_PROVIDERS)
+        if not candidates:
+            raise RouteNotAllowed("None of the allowed models is available.")
+        ceiling = self.config.max_request_cost
+        if model in candidates and (
+            ceiling is None
+            or estimate_cost(model, prompt_tokens, completion_tokens) <= ceiling
+        ):
+            return model
+        if ceiling is None:
+            return candidates[0]
+        cheapest = min(
+            candidates,
+            key=lambda name: estimate_cost(name, prompt_tokens, completion_tokens),
+        )
+        cost = estimate_cost(cheapest, prompt_tokens, completion_tokens)
+        if cost > ceiling:
+            raise RouteNotAllowed(
+                f"This request is estimated to cost at least ${cost:.6f}, more than "
+                f"the max_request_cost of ${ceiling}. Shorten the messages or "
+                f"max_completion_tokens, or raise max_request_cost."
+            )
+        return cheapest
+
+    def permitted(self, prompt_tokens: int, completion_tokens: int) -> Optional[Set[str]]:
+        """
+        The models the request may be sent to, by context fitting or failover as
+        well as routing: the allowed ones within the cost ceiling.
+
+        :return: The set of models, or None if the tenant restricts neither.
+        """
+        ceiling = self.config.max_request_cost
+        if self.allowed is None and ceiling is None:
+            return None
+        candidates = self.allowed if self.allowed is not None else list(MODEL_PROVIDERS)
+        return {
+            model
+            for model in candidates
+            if ceiling is None
+            or estimate_cost(model, prompt_tokens, completion_tokens) <= ceiling
+        }
+
+
+def compile_config(config: TenantRoutingConfig) -> TenantRoutingTable:
+    """
+    Check a tenant's routing config and compile it.
+
+    :raises InvalidRoutingConfig: If a rule names an unknown model or intent,
+        has an invalid, overlong or nested-quantifier regex or can never match.
+    """
+    for rule in config.rules:
+        if rule.model not in MODEL_PROVIDERS:
+            raise InvalidRoutingConfig(
+                f"Rule {rule.name}: unknown model {rule.model}. "
+                f"Available: {', '.join(MODEL_PROVIDERS)}."
+            )
+        unknown = set(rule.intents) - INTENTS
+        if unknown:
+            raise InvalidRoutingConfig(
+                f"Rule {rule.name}: unknown intents {sorted(unknown)}. "
+                f"Available: {sorted(INTENTS)}."
+            )
+        for pattern in rule.patterns:
+            if len(pattern) > PATTERN_MAX_LENGTH:
+                raise InvalidRoutingConfig(
+                    f"Rule {rule.name}: patterns can be at most "
+                    f"{PATTERN_MAX_LENGTH} characters."
+                )
+            try:
+                parsed = sre_parse.parse(pattern)
+                regex.compile(pattern)
+            except (re.error, regex.error) as e:
+                raise InvalidRoutingConfig(f"Rule {rule.name}: invalid pattern: {e}")
+            if has_nested_quantifier(parsed):
+                raise InvalidRoutingConfig(
+                    f"Rule {rule.name}: pattern {pattern!r} nests quantifiers, "
+                    f"which can make matching take exponential time."
+                )
+        if not (rule.keywords or rule.patterns or rule.intents):
+            raise InvalidRoutingConfig(
+                f"Rule {rule.name} needs keywords, patterns or intents."
+            )
+    for model in config.allowed_models or []:
+        if model not in MODEL_PROVIDERS:
+            raise InvalidRoutingConfig(f"Unknown allowed model {model}.")
+    return TenantRoutingTable(config)
+
+
+class TenantRoutes:
+    """
+    Compiled routing tables for every tenant with custom rules, rebuilt from the
+    route config store when a tenant's document changes.
+    """
+
+    def __init__(self):
+        self.tables: Dict[str, TenantRoutingTable] = {}
+        self.matched = 0
+        self.unmatched = 0
+        self.constrained = 0
+
+    def update(self, tenant: str, document: Optional[Dict]) -> None:
+        """
+        Recompile one tenant's table from its stored document (None removes it).
+        """
+        if document is None:
+            self.tables.pop(tenant, None)
+            return
+        try:
+            self.tables[tenant] = compile_config(TenantRoutingConfig(**document))
+        except Exception as e:
+            logging.error(f"Ignoring invalid routing rules for tenant {tenant}: {e}")
+            self.tables.pop(tenant, None)
+
+    def table(self, tenant: Optional[str]) -> Optional[TenantRoutingTable]:
+        return self.tables.get(tenant) if tenant else None
+
+    def route(
+        self, tenant: Optional[str], text: str
+    ) -> Tuple[Optional[str], Optional[TenantRoutingTable]]:
+        """
+        Match a prompt against the tenant's rules.
+
+        :return: Tuple of (model from the matching rule, or None to use the
+            default router; the tenant's table, or None if it has no rules).
+        """
+        table = self.table(tenant)
+        if table is None:
+            return None, None
+        rule = table.match(text)
+        if rule is not None:
+            self.matched += 1
+            return rule.model, table
+        self.unmatched += 1
+        if not table.config.llm_fallback:
+            return (table.allowed or list(MODEL_PROVIDERS))[0], table
+        return None, table
+
+    def constrain(
+        self,
+        table: Optional[TenantRoutingTable],
+        model: str,
+        prompt_tokens: int,
+        completion_tokens: Optional[int],
+    ) -> str:
+        if table is None:
+            return model
+        constrained = table.constrain(
+            model, prompt_tokens, completion_tokens or DEFAULT_COMPLETION_TOKENS
+        )
+        if constrained != model:
+            self.constrained += 1
+        return constrained
+
+    def permitted(
+        self,
+        table: Optional[TenantRoutingTable],
+        prompt_tokens: int,
+        completion_tokens: Optional[int],
+    ) -> Optional[Set[str]]:
+        if table is None:
+            return None
+        return table.permitted(
+            prompt_tokens, completion_tokens or DEFAULT_COMPLETION_TOKENS
+        )
+
+    def stats(self) -> Dict:
+        return {
+            "tenants": len(self.tables),
+            "matched": self.matched,
+            "unmatched": self.unmatched,
+            "constrained": self.constrained,
+        }
+
+
+tenant_routes = TenantRoutes()
+
+
+def _on_route_config_change(mode: str) -> None:
+    if mode.startswith(TENANT_MODE_PREFIX):
+        tenant_routes.update(mode[len(TENANT_MODE_PREFIX) :], route_configs.get(mode))
+
+
+route_configs.on_change(_on_route_config_change)
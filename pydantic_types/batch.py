@@ -0,0 +1,156 @@
+from typing import Dict, List, Optional
+from pydantic import BaseModel, Field
+
+
+from pydantic_types.chat import CreateChatCompletionRequest
+
+
+class OpenAIFile(BaseModel):
+    id: str = Field(..., description="The file identifier.")
+    object: str = Field("file", description='The object type, which is always "file".')
+    bytes: int = Field(..., description="The size of the file, in bytes.")
+    created_at: int = Field(
+        ..., description="The Unix timestamp of when the file was created."
+    )
+    filename: str = Field(..., description="The name of the file.")
+    purpose: str = Field(
+        ...,
+        description='The intended purpose of the file, e.g. "batch" or "batch_output".',
+    )
+
+
+class ListFilesResponse(BaseModel):
+    data: List[OpenAIFile] = Field(..., description="The files.")
+    object: str = Field("list", description='The object type, which is always "list".')
+
+
+class DeleteFileResponse(BaseModel):
+    id: str = Field(..., description="The deleted file's identifier.")
+    object: str = Field("file", description='The object type, which is always "file".')
+    deleted: bool = Field(..., description="Whether the file was deleted.")
+
+
+class CreateBatchRequest(BaseModel):
+    input_file_id: str = Field(
+        ...,
+        description="The ID of an uploaded JSONL file that contains requests for the new batch.",
+    )
+    endpoint: str = Field(
+        ...,
+        description="The endpoint to be used for all requests in the batch. Only `/v1/chat/completions` is supported.",
+    )
+    completion_window: str = Field(
+        ...,
+        description="The time frame within which the batch should be processed. Only `24h` is supported.",
+    )
+    metadata: Optional[Dict[str, str]] = Field(
+        None, description="Optional custom metadata for the batch."
+    )
+
+
+class BatchRequestInput(BaseModel):
+    custom_id: str = Field(
+        ...,
+        description="A developer-provided per-request id used to match outputs to inputs.",
+    )
+    method: str = Field("POST", description="The HTTP method for the request.")
+    url: str = Field(
+        ..., description="The relative URL of the request, e.g. `/v1/chat/completions`."
+    )
+    body: CreateChatCompletionRequest = Field(
+        ..., description="The chat completion request."
+    )
+
+
+class BatchError(BaseModel):
+    code: str = Field(..., description="An error code identifying the error type.")
+    message: str = Field(
+        ..., description="A human-readable message describing the error."
+    )
+    param: Optional[str] = Field(
+        None, description="The name of the parameter that caused the error."
+    )
+    line: Optional[int] = Field(
+        None, description="The line number of the input file where the error occurred."
+    )
+
+
+class BatchErrors(BaseModel):
+    object: str = Field("list", description='The object type, which is always "list".')
+    data: List[BatchError] = Field(
+        default_factory=list, description="The validation errors."
+    )
+
+
+class BatchRequestCounts(BaseModel):
+    total: int = Field(0, description="Total number of requests in the batch.")
+    completed: int = Field(
+        0, description="Number of requests that have been completed successfully."
+    )
+    failed: int = Field(0, description="Number of requests that have failed.")
+
+
+class Batch(BaseModel):
+    id: str = Field(..., description="The batch identifier.")
+    object: str = Field(
+        "batch", description='The object type, which is always "batch".'
+    )
+    endpoint: str = Field(..., description="The API endpoint used by the batch.")
+    errors: Optional[BatchErrors] = Field(None, description="Input validation errors.")
+    input_file_id: str = Field(
+        ..., description="The ID of the input file for the batch."
+    )
+    completion_window: str = Field(
+        ..., description="The time frame within which the batch should be processed."
+    )
+    status: str = Field(..., description="The current status of the batch.")
+    output_file_id: Optional[str] = Field(
+        None,
+        description="The ID of the file containing the outputs of successfully executed requests.",
+    )
+    error_file_id: Optional[str] = Field(
+        None,
+        description="The ID of the file containing the outputs of requests with errors.",
+    )
+    created_at: int = Field(
+        ..., description="The Unix timestamp of when the batch was created."
+    )
+    in_progress_at: Optional[int] = Field(
+        None, description="When the batch started processing."
+    )
+    expires_at: Optional[int] = Field(None, description="When the batch will expire.")
+    finalizing_at: Optional[int] = Field(
+        None, description="When the batch started finalizing."
+    )
+    completed_at: Optional[int] = Field(
+        None, description="When the batch was completed."
+    )
+    failed_at: Optional[int] = Field(None, description="When the batch failed.")
+    expired_at: Optional[int] = Field(None, description="When the batch expired.")
+    cancelling_at: Optional[int] = Field(
+        None, description="When the batch started cancelling."
+    )
+    cancelled_at: Optional[int] = Field(
+        None, description="When the batch was cancelled."
+    )
+    request_counts: BatchRequestCounts = Field(
+        default_factory=BatchRequestCounts,
+        description="The request counts for different statuses within the batch.",
+    )
+    metadata: Optional[Dict[str, str]] = Field(
+        None, description="Custom metadata for the batch."
+    )
+
+
+class ListBatchesResponse(BaseModel):
+    data: List[Batch] = Field(..., description="The batches, newest first.")
+    first_id: Optional[str] = Field(
+        None, description="The ID of the first batch in the list."
+    )
+    last_id: Optional[str] = Field(
+        None, description="The ID of the last batch in the list."
+    )
+    has_more: bool = Field(
+        False, description="Whether more batches are available after `last_id`."
+    )
+    object: str = Field("list", description='The object type, which is always "list".')
@@ -50,6 +50,10 @@ class Usage(BaseModel):
         ..., description="The number of tokens in the completion."
     )
     total_tokens: int = Field(..., description="The total number of tokens used.")
+    prompt_tokens_details: Optional[dict] = Field(
+        None,
+        description="Details about the prompt tokens used, such as `cached_tokens` read from the provider's prompt cache.",
+    )
     completion_tokens_details: Optional[dict] = Field(
         None, description="Details about the completion tokens used."
     )
@@ -125,6 +129,10 @@ class CreateChatCompletionRequest(BaseModel):
         None,
         description="How to use the provided tools. If `auto`, the model will choose which tools to use. If `manual`, the model will only use tools specified by the `tool_code` field in the `message` object.",
     )
+    thread_id: Optional[str] = Field(
+        None,
+        description="The ID of a thread to continue. `messages` then holds only the new turn: the thread's messages are sent before it, and the turn and the reply are added to the thread.",
+    )
 
 
 class CreateChatCompletionResponse(BaseModel):
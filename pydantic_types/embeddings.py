@@ -0,0 +1,57 @@
+from typing import List, Literal, Optional, Union
+from pydantic import BaseModel, Field
+
+
+class CreateEmbeddingRequest(BaseModel):
+    input: Union[str, List[str], List[int], List[List[int]]] = Field(
+        ...,
+        description="Input text to embed, encoded as a string or array of tokens, or an array of either to embed several inputs.",
+    )
+    model: str = Field(..., description="ID of the embedding model to use.")
+    encoding_format: Literal["float", "base64"] = Field(
+        "float",
+        description="The format to return the embeddings in: a list of floats, or base64-encoded little-endian float32.",
+    )
+    dimensions: Optional[int] = Field(
+        None,
+        ge=1,
+        description="The number of dimensions the resulting output embeddings should have.",
+    )
+    user: Optional[str] = Field(
+        None, description="A unique identifier representing your end-user."
+    )
+
+
+class Embedding(BaseModel):
+    index: int = Field(
+        ..., description="The index of the embedding in the list of embeddings."
+    )
+    embedding: Union[List[float], str] = Field(
+        ...,
+        description="The embedding vector, as a list of floats or a base64 string.",
+    )
+    object: str = Field(
+        "embedding", description='The object type, which is always "embedding".'
+    )
+
+
+class EmbeddingUsage(BaseModel):
+    prompt_tokens: int = Field(
+        ..., description="The number of tokens used by the prompt."
+    )
+    total_tokens: int = Field(
+        ..., description="The total number of tokens used by the request."
+    )
+
+
+class CreateEmbeddingResponse(BaseModel):
+    data: List[Embedding] = Field(
+        ..., description="The list of embeddings generated by the model."
+    )
+    model: str = Field(
+        ..., description="The name of the model used to generate the embedding."
+    )
+    object: str = Field("list", description='The object type, which is always "list".')
+    usage: EmbeddingUsage = Field(
+        ..., description="The usage information for the request."
+    )
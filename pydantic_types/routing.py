@@ -0,0 +1,42 @@
+from typing import List, Optional
+from pydantic import BaseModel, Field
+
+
+class RoutingRule(BaseModel):
+    name: str = Field(..., description="A name for the rule, reported when it matches.")
+    model: str = Field(..., description="The model to route matching requests to.")
+    keywords: List[str] = Field(
+        default_factory=list,
+        description="Case-insensitive phrases; the rule matches if the last message contains any of them.",
+    )
+    patterns: List[str] = Field(
+        default_factory=list,
+        description="Case-insensitive regular expressions searched for in the last message.",
+    )
+    intents: List[str] = Field(
+        default_factory=list,
+        description="Intents detected by the local classifier: coding, reasoning, long-context, summarization or conversation.",
+    )
+    priority: int = Field(
+        0,
+        description="Rules with a higher priority are tried first; ties keep list order.",
+    )
+
+
+class TenantRoutingConfig(BaseModel):
+    rules: List[RoutingRule] = Field(
+        default_factory=list, description="The tenant's routing rules."
+    )
+    allowed_models: Optional[List[str]] = Field(
+        None,
+        description="Models the tenant's requests may be routed to; any model if unset.",
+    )
+    max_request_cost: Optional[float] = Field(
+        None,
+        gt=0,
+        description="Most a single request may be estimated to cost, in USD; cheaper allowed models are used above it.",
+    )
+    llm_fallback: bool = Field(
+        True,
+        description="Route requests that match no rule with the default router; if false they go to the first allowed model.",
+    )
@@ -111,6 +111,3 @@ all_tags = TagList(
         AuditLogs(),
     ]
 )
-
-# Example usage:
-print(all_tags)
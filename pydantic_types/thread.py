@@ -0,0 +1,100 @@
+from typing import Dict, List, Literal, Optional
+from pydantic import BaseModel, Field
+
+
+class CreateMessageRequest(BaseModel):
+    role: Literal["user", "assistant"] = Field(
+        ...,
+        description='The role of the entity creating the message. Can be "user" or "assistant".',
+    )
+    content: str = Field(..., description="The text content of the message.")
+    metadata: Optional[Dict[str, str]] = Field(
+        None, description="Optional custom metadata for the message."
+    )
+
+
+class CreateThreadRequest(BaseModel):
+    messages: List[CreateMessageRequest] = Field(
+        default_factory=list, description="Messages to start the thread with."
+    )
+    metadata: Optional[Dict[str, str]] = Field(
+        None, description="Optional custom metadata for the thread."
+    )
+
+
+class ModifyThreadRequest(BaseModel):
+    metadata: Optional[Dict[str, str]] = Field(
+        None, description="Custom metadata replacing the thread's current metadata."
+    )
+
+
+class ThreadObject(BaseModel):
+    id: str = Field(..., description="The thread identifier.")
+    object: str = Field(
+        "thread", description='The object type, which is always "thread".'
+    )
+    created_at: int = Field(
+        ..., description="The Unix timestamp of when the thread was created."
+    )
+    tool_resources: Optional[dict] = Field(
+        None, description="Tool resources of the thread. Not supported; always null."
+    )
+    metadata: Optional[Dict[str, str]] = Field(
+        None, description="Custom metadata of the thread."
+    )
+
+
+class DeleteThreadResponse(BaseModel):
+    id: str = Field(..., description="The deleted thread's identifier.")
+    object: str = Field(
+        "thread.deleted",
+        description='The object type, which is always "thread.deleted".',
+    )
+    deleted: bool = Field(..., description="Whether the thread was deleted.")
+
+
+class MessageText(BaseModel):
+    value: str = Field(..., description="The text.")
+    annotations: List[dict] = Field(
+        default_factory=list, description="Annotations of the text."
+    )
+
+
+class MessageContent(BaseModel):
+    type: str = Field("text", description='The content type, which is always "text".')
+    text: MessageText = Field(..., description="The text content.")
+
+
+class MessageObject(BaseModel):
+    id: str = Field(..., description="The message identifier.")
+    object: str = Field(
+        "thread.message",
+        description='The object type, which is always "thread.message".',
+    )
+    created_at: int = Field(
+        ..., description="The Unix timestamp of when the message was created."
+    )
+    thread_id: str = Field(..., description="The thread the message belongs to.")
+    status: str = Field(
+        "completed", description='The status of the message, always "completed".'
+    )
+    role: str = Field(..., description="The entity that produced the message.")
+    content: List[MessageContent] = Field(
+        ..., description="The content of the message."
+    )
+    assistant_id: Optional[str] = Field(None, description="Not supported; always null.")
+    run_id: Optional[str] = Field(None, description="Not supported; always null.")
+    attachments: List[dict] = Field(
+        default_factory=list, description="Not supported; always empty."
+    )
+    metadata: Optional[Dict[str, str]] = Field(
+        None, description="Custom metadata of the message."
+    )
+
+
+class ListMessagesResponse(BaseModel):
+    object: str = Field("list", description='The object type, which is always "list".')
+    data: List[MessageObject] = Field(..., description="The messages.")
+    first_id: Optional[str] = Field(None, description="The ID of the first message.")
+    last_id: Optional[str] = Field(None, description="The ID of the last message.")
+    has_more: bool = Field(..., description="Whether more messages are available.")
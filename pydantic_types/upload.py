@@ -0,0 +1,61 @@
+from typing import List, Optional
+from pydantic import BaseModel, Field
+
+
+from pydantic_types.batch import OpenAIFile
+
+
+class CreateUploadRequest(BaseModel):
+    filename: str = Field(..., description="The name of the file to upload.")
+    purpose: str = Field(
+        ..., description="The intended purpose of the uploaded file, e.g. `batch`."
+    )
+    bytes: int = Field(
+        ..., gt=0, description="The number of bytes in the file you are uploading."
+    )
+    mime_type: str = Field(..., description="The MIME type of the file.")
+
+
+class CompleteUploadRequest(BaseModel):
+    part_ids: List[str] = Field(..., description="The ordered list of Part IDs.")
+    md5: Optional[str] = Field(
+        None,
+        description="The optional md5 checksum of the file contents, checked against the uploaded bytes.",
+    )
+
+
+class Upload(BaseModel):
+    id: str = Field(..., description="The Upload unique identifier.")
+    object: str = Field(
+        "upload", description='The object type, which is always "upload".'
+    )
+    created_at: int = Field(
+        ..., description="The Unix timestamp of when the Upload was created."
+    )
+    filename: str = Field(..., description="The name of the file to be uploaded.")
+    bytes: int = Field(..., description="The intended number of bytes to be uploaded.")
+    purpose: str = Field(..., description="The intended purpose of the file.")
+    mime_type: Optional[str] = Field(None, description="The MIME type of the file.")
+    status: str = Field(
+        ...,
+        description='The status of the Upload: "pending", "completed", "cancelled" or "expired".',
+    )
+    expires_at: int = Field(
+        ..., description="The Unix timestamp of when the Upload expires."
+    )
+    file: Optional[OpenAIFile] = Field(
+        None, description="The ready File object after the Upload is completed."
+    )
+
+
+class UploadPart(BaseModel):
+    id: str = Field(..., description="The upload Part unique identifier.")
+    object: str = Field(
+        "upload.part", description='The object type, which is always "upload.part".'
+    )
+    created_at: int = Field(
+        ..., description="The Unix timestamp of when the Part was created."
+    )
+    upload_id: str = Field(
+        ..., description="The ID of the Upload object that this Part was added to."
+    )
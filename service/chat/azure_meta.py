@@ -1,12 +1,12 @@
 import os
-from openai import OpenAI
+from service.clients import provider_clients
+from service.chat.completion import create_openai_completion
+from service.chat.streaming import openai_chunk_stream
 
-AZURE_META_API_KEY = os.getenv("AZURE_META_API_KEY")
-AZURE_META_ENDPOINT = os.getenv("AZURE_META_ENDPOINT")
 AZURE_META_MODEL = os.getenv("AZURE_META_MODEL")
 
 
-def Azure_Meta_Chat_Completions(request):
+async def Azure_Meta_Chat_Completions(request):
     """Generate chat completions using the Azure Meta model.
 
     Args:
@@ -21,12 +21,10 @@ def Azure_Meta_Chat_Completions(request):
             - tools: Tools to be used with the model (optional).
             - tool_choice: Specific tool choice for the model (optional).
     Returns:
-        response: The response from the Azure OpenAI chat completion API or error message.
+        response: A Completion decoded from the endpoint's response, or an async
+            iterator of chunk dictionaries when `request.stream` is set.
     """
-    client = OpenAI(
-        base_url=AZURE_META_ENDPOINT,
-        api_key=AZURE_META_API_KEY,
-    )
+    client = provider_clients.get("azure_meta")
 
     # Prepare the parameters
     params = {
@@ -39,13 +37,13 @@ def Azure_Meta_Chat_Completions(request):
         "user": request.user,
         "tools": request.tools,
         "tool_choice": request.tool_choice,
-        "stream": False,  # Set to False by default
+        "stream": request.stream,
     }
 
     # Remove keys with None values (optional parameters)
     params = {k: v for k, v in params.items() if v is not None}
 
-    # API call to generate the response
-    response = client.chat.completions.create(**params)
-
-    return response
+    if request.stream:
+        # Usage arrives in the final chunk when the endpoint reports it.
+        return openai_chunk_stream(await client.chat.completions.create(**params))
+    return await create_openai_completion(client.chat.completions, **params)
@@ -1,25 +1,22 @@
 import os
-from openai import OpenAI
-import json
+from service.clients import provider_clients
+from service.chat.completion import create_openai_completion
+from service.chat.streaming import openai_chunk_stream
 
-AZURE_MISTRAL_API_KEY = os.getenv("AZURE_MISTRAL_API_KEY")
-AZURE_MISTRAL_ENDPOINT = os.getenv("AZURE_MISTRAL_ENDPOINT")
 AZURE_MISTRAL_MODEL = os.getenv("AZURE_MISTRAL_MODEL")
 
 
-def Azure_Mistral_Chat_Completions(request):
+async def Azure_Mistral_Chat_Completions(request):
     """Generate chat completions using the Azure Mistral model.
 
     Args:
         request: An object containing the parameters required for the chat completion.
 
     Returns:
-        response: The response from the Azure OpenAI chat completion API.
+        response: A Completion decoded from the endpoint's response, or an async
+            iterator of chunk dictionaries when `request.stream` is set.
     """
-    client = OpenAI(
-        base_url=AZURE_MISTRAL_ENDPOINT,
-        api_key=AZURE_MISTRAL_API_KEY,
-    )
+    client = provider_clients.get("azure_mistral")
 
     params = {
         "model": AZURE_MISTRAL_MODEL,
@@ -30,13 +27,13 @@ def Azure_Mistral_Chat_Completions(request):
         "user": request.user,
         "tools": request.tools,
         "tool_choice": request.tool_choice,
-        "stream": False,  # Set to False by default
+        "stream": request.stream,
     }
 
     # Remove keys with None values (optional parameters)
     params = {k: v for k, v in params.items() if v is not None}
 
-    # API call to generate the response
-    response = client.chat.completions.create(**params)
-
-    return response
+    if request.stream:
+        # Usage arrives in the final chunk when the endpoint reports it.
+        return openai_chunk_stream(await client.chat.completions.create(**params))
+    return await create_openai_completion(client.chat.completions, **params)
@@ -1,35 +1,34 @@
 import os
-from openai import AzureOpenAI
-import json
+from service.clients import provider_clients
+from service.chat.completion import create_openai_completion
+from service.chat.streaming import openai_chunk_stream
 
-AZURE_OPENAI_API_KEY = os.getenv("AZURE_OPENAI_API_KEY")
-AZURE_OPENAI_ENDPOINT = os.getenv("AZURE_OPENAI_ENDPOINT")
 AZURE_OPENAI_MODEL = os.getenv("AZURE_OPENAI_MODEL")
-AZURE_OPENAI_api_version = os.getenv("AZURE_OPENAI_api_version")
 
 
-def Azure_OpenAI_Chat_Completions(request):
+async def Azure_OpenAI_Chat_Completions(request):
     """Generate chat completions using the Azure OpenAI model.
 
     Args:
         request: An object containing the parameters required for the chat completion.
 
     Returns:
-        response: The response from the Azure OpenAI chat completion API.
+        response: A Completion decoded from the Azure OpenAI response, or an
+            async iterator of chunk dictionaries when `request.stream` is set.
     """
-    client = AzureOpenAI(
-        azure_endpoint=AZURE_OPENAI_ENDPOINT,
-        api_key=AZURE_OPENAI_API_KEY,
-        api_version=AZURE_OPENAI_api_version,
+    client = provider_clients.get("azure_openai")
+    # Built here rather than with openai.NOT_GIVEN, so importing this module
+    # does not import the SDK.
+    stream_options = (
+        {"stream_options": {"include_usage": True}} if request.stream else {}
     )
-
-    response = client.chat.completions.create(
+    params = dict(
         model=AZURE_OPENAI_MODEL,
         messages=request.messages,
         temperature=request.temperature,
         top_p=request.top_p,
         n=request.n,
-        stream=False,
+        stream=request.stream,
         frequency_penalty=request.frequency_penalty,
         logprobs=request.logprobs,
         max_tokens=request.max_completion_tokens,
@@ -38,6 +37,9 @@ def Azure_OpenAI_Chat_Completions(request):
         user=request.user,
         tools=request.tools,
         tool_choice=request.tool_choice,
+        **stream_options,
     )
 
-    return response
+    if request.stream:
+        return openai_chunk_stream(await client.chat.completions.create(**params))
+    return await create_openai_completion(client.chat.completions, **params)
@@ -0,0 +1,168 @@
+import orjson
+
+
+from typing import Dict, List, Optional
+
+
+class CompletionUsage:
+    """
+    Token counts of a completion. Fields other than the three totals (such as
+    `prompt_tokens_details`) are kept as sent in `details`.
+    """
+
+    __slots__ = ("prompt_tokens", "completion_tokens", "total_tokens", "details")
+
+    def __init__(
+        self,
+        prompt_tokens: int,
+        completion_tokens: int,
+        total_tokens: int,
+        details: Optional[Dict] = None,
+    ):
+        self.prompt_tokens = prompt_tokens
+        self.completion_tokens = completion_tokens
+        self.total_tokens = total_tokens
+        self.details = details
+
+    @classmethod
+    def from_dict(cls, usage: Dict) -> "CompletionUsage":
+        details = {
+            key: value
+            for key, value in usage.items()
+            if key not in ("prompt_tokens", "completion_tokens", "total_tokens")
+        }
+        return cls(
+            usage.get("prompt_tokens") or 0,
+            usage.get("completion_tokens") or 0,
+            usage.get("total_tokens") or 0,
+            details or None,
+        )
+
+    @property
+    def cached_tokens(self) -> int:
+        """
+        Prompt tokens the provider read from its prompt cache.
+        """
+        details = (self.details or {}).get("prompt_tokens_details") or {}
+        return details.get("cached_tokens") or 0
+
+    def to_dict(self) -> Dict:
+        usage = {
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "total_tokens": self.total_tokens,
+        }
+        if self.details:
+            usage.update(self.details)
+        return usage
+
+
+class Completion:
+    """
+    A chat completion as it travels through the gateway, from the adapter to the
+    caches, the usage log and the response body.
+
+    Choices stay the plain dictionaries they were decoded into. A completion
+    decoded from JSON keeps those bytes and serializes back to them unchanged,
+    so an upstream response is parsed once and never re-encoded; one built from
+    fields is encoded with orjson on first use. Treat instances as immutable.
+    """
+
+    __slots__ = (
+        "id",
+        "created",
+        "model",
+        "choices",
+        "usage",
+        "system_fingerprint",
+        "_json",
+    )
+
+    def __init__(
+        self,
+        id: str,
+        created: int,
+        model: str,
+        choices: List[Dict],
+        usage: CompletionUsage,
+        system_fingerprint: Optional[str] = None,
+        json: Optional[bytes] = None,
+    ):
+        self.id = id
+        self.created = created
+        self.model = model
+        self.choices = choices
+        self.usage = usage
+        self.system_fingerprint = system_fingerprint
+        self._json = json
+
+    @classmethod
+    def from_dict(cls, data: Dict, json: Optional[bytes] = None) -> "Completion":
+        """
+        :param data: A `chat.completion` object.
+        :param json: `data` serialized, if the caller already has it.
+        """
+        usage = data.get("usage")
+        return cls(
+            data.get("id") or "",
+            data.get("created") or 0,
+            data.get("model") or "",
+            data.get("choices") or [],
+            CompletionUsage.from_dict(usage) if usage else CompletionUsage(0, 0, 0),
+            data.get("system_fingerprint"),
+            json,
+        )
+
+    @classmethod
+    def from_json(cls, data: bytes) -> "Completion":
+        """
+        Decode a serialized `chat.completion`, keeping `data` as its JSON.
+        """
+        return cls.from_dict(orjson.loads(data), data)
+
+    @classmethod
+    def from_text(
+        cls,
+        id: str,
+        model: str,
+        created: int,
+        content: str,
+        usage: CompletionUsage,
+        finish_reason: Optional[str] = "stop",
+        system_fingerprint: Optional[str] = None,
+    ) -> "Completion":
+        """
+        Build a single-choice completion for an assistant reply.
+        """
+        choice = {
+            "index": 0,
+            "message": {"role": "assistant", "content": content},
+            "logprobs": None,
+            "finish_reason": finish_reason,
+        }
+        return cls(id, created, model, [choice], usage, system_fingerprint)
+
+    def to_dict(self) -> Dict:
+        return {
+            "id": self.id,
+            "object": "chat.completion",
+            "created": self.created,
+            "model": self.model,
+            "choices": self.choices,
+            "usage": self.usage.to_dict(),
+            "system_fingerprint": self.system_fingerprint,
+        }
+
+    def to_json(self) -> bytes:
+        if self._json is None:
+            self._json = orjson.dumps(self.to_dict())
+        return self._json
+
+
+async def create_openai_completion(completions, **params) -> Completion:
+    """
+    Request a non-streaming completion through an OpenAI SDK `chat.completions`
+    resource and decode the raw response body, skipping the SDK's models.
+    """
+    response = await completions.with_raw_response.create(**params)
+    return Completion.from_json(response.content)
@@ -1,53 +1,155 @@
-import google.generativeai as genai
 import os
 import time
-from pydantic_types.chat import (
-    ChatCompletion,
-    ChatCompletionChoice,
-    Usage,
-)
+from service.clients import provider_clients
+from service.chat.completion import Completion, CompletionUsage
+from service.chat.prompt_cache import current_tenant, prompt_cache
+from service.chat.streaming import completion_chunk
 
-GEMINI_API_KEY = os.environ["GEMINI_API_KEY"]
+# Context caches need a pinned model version.
+GEMINI_CACHE_MODEL = os.getenv("GEMINI_CACHE_MODEL", "models/gemini-1.5-flash-002")
 
 
-def Google_Gemini_Chat_Completions(request):
-    """Generate chat completions using the Google Gemini model.
+def gemini_usage(usage_metadata) -> CompletionUsage:
+    """Convert Gemini usage metadata, reporting tokens read from a context
+    cache as `prompt_tokens_details.cached_tokens` like OpenAI does."""
+    cached_tokens = getattr(usage_metadata, "cached_content_token_count", 0)
+    return CompletionUsage(
+        usage_metadata.prompt_token_count,
+        usage_metadata.candidates_token_count,
+        usage_metadata.total_token_count,
+        {"prompt_tokens_details": {"cached_tokens": cached_tokens}}
+        if cached_tokens
+        else None,
+    )
+
+
+async def Google_Gemini_Send(request, stream: bool = False):
+    """Send the final message of a request on top of its earlier turns.
+
+    The earlier turns are sent as chat history. When a context cache holds the
+    leading ones (see `prompt_cache`), the model is bound to it and only the
+    rest go as history. A cache the provider no longer has is forgotten and the
+    request resent in full.
 
     Args:
-        request: An object containing the parameters required for the chat completion.
+        request: The chat completion request.
+        stream: Whether to stream the response.
 
     Returns:
-        response: The response from the Gemini chat completion API.
+        The response of `send_message_async`.
     """
-    genai.configure(api_key=GEMINI_API_KEY)
-    model = genai.GenerativeModel("gemini-1.5-flash")
-
-    chat_history = [
+    genai = provider_clients.get("gemini")
+    history = [
         {"role": "model" if msg.role == "assistant" else "user", "parts": msg.content}
-        for msg in request.messages
+        for msg in request.messages[:-1]
     ]
-    chat = model.start_chat(
-        history=chat_history,
+    cached = prompt_cache.lookup(
+        current_tenant.get(), GEMINI_CACHE_MODEL, request.messages[:-1], history
     )
+    if cached is not None:
+        model = genai.GenerativeModel.from_cached_content(cached_content=cached.content)
+        chat = model.start_chat(history=history[cached.messages :])
+        try:
+            return await chat.send_message_async(
+                request.messages[-1].content, stream=stream
+            )
+        except Exception as e:
+            if getattr(e, "code", None) != 404:
+                raise
+            prompt_cache.invalidate(cached)
 
-    response = chat.send_message(request.messages[-1].content)
+    model = genai.GenerativeModel("gemini-1.5-flash")
+    chat = model.start_chat(history=history)
+    return await chat.send_message_async(request.messages[-1].content, stream=stream)
+
+
+async def Google_Gemini_Chat_Completions(request):
+    """Generate chat completions using the Google Gemini model.
+
+    Args:
+        request: An object containing the parameters required for the chat completion.
+
+    Returns:
+        response: A Completion built from the Gemini response, or an async
+            iterator of OpenAI-shaped chunk dictionaries when `request.stream` is set.
+    """
+    if request.stream:
+        response = await Google_Gemini_Send(request, stream=True)
+        return Google_Gemini_Chunk_Stream(response)
+
+    response = await Google_Gemini_Send(request)
     current_unix_timestamp = int(time.time())
-    return ChatCompletion(
-        id="llmhub-gemini-1.5-flash",
-        object="chat.completion",
-        created=current_unix_timestamp,
-        model="gemini-1.5-flash",
-        choices=[
-            ChatCompletionChoice(
-                index=0,
-                message={"role": "assistant", "content": response.text},
-                finish_reason="stop",
-            )
-        ],
-        usage=Usage(
-            prompt_tokens=response.usage_metadata.prompt_token_count,
-            completion_tokens=response.usage_metadata.candidates_token_count,
-            total_tokens=response.usage_metadata.total_token_count,
-        ),
+    return Completion.from_text(
+        "llmhub-gemini-1.5-flash",
+        "gemini-1.5-flash",
+        current_unix_timestamp,
+        response.text,
+        gemini_usage(response.usage_metadata),
         system_fingerprint="llmhub-v1-gemini",
     )
+
+
+def gemini_chunk_text(chunk) -> str:
+    """Text of a streamed Gemini chunk, read without `chunk.text`.
+
+    `chunk.text` raises on chunks with no text part, such as usage-only or
+    safety-blocked final chunks; those give an empty string here.
+    """
+    candidates = chunk.candidates
+    if not candidates or not candidates[0].content:
+        return ""
+    return "".join(
+        getattr(part, "text", "") or "" for part in candidates[0].content.parts
+    )
+
+
+async def Google_Gemini_Chunk_Stream(response):
+    """Normalize a streaming Gemini response into OpenAI-shaped chunks.
+
+    Args:
+        response: The async streaming response returned by `send_message_async`.
+
+    Yields:
+        dict: `chat.completion.chunk` objects, a final chunk carrying the finish
+            reason and, when Gemini reports it, a usage-only chunk.
+    """
+    current_unix_timestamp = int(time.time())
+    usage_metadata = None
+    role_sent = False
+
+    async for part in response:
+        if part.usage_metadata:
+            usage_metadata = part.usage_metadata
+        delta = {}
+        text = gemini_chunk_text(part)
+        if text:
+            delta["content"] = text
+        if not role_sent:
+            delta["role"] = "assistant"
+            role_sent = True
+        if not delta:
+            continue
+        yield completion_chunk(
+            "llmhub-gemini-1.5-flash",
+            "gemini-1.5-flash",
+            current_unix_timestamp,
+            delta,
+        )
+
+    yield completion_chunk(
+        "llmhub-gemini-1.5-flash",
+        "gemini-1.5-flash",
+        current_unix_timestamp,
+        {},
+        finish_reason="stop",
+    )
+
+    if usage_metadata:
+        yield {
+            "id": "llmhub-gemini-1.5-flash",
+            "object": "chat.completion.chunk",
+            "created": current_unix_timestamp,
+            "model": "gemini-1.5-flash",
+            "choices": [],
+            "usage": gemini_usage(usage_metadata).to_dict(),
+        }
@@ -0,0 +1,132 @@
+import os
+
+
+import orjson
+
+
+from typing import Dict, Tuple
+
+
+from service.clients import PROVIDERS, provider_clients
+from service.chat.completion import Completion
+from service.chat.streaming import SSEPassthrough
+
+
+# Providers whose endpoints speak the OpenAI wire format.
+PASSTHROUGH_PROVIDERS = ("azure_openai", "azure_meta", "azure_mistral")
+
+# Request fields forwarded to each provider: the ones its SDK adapter sends.
+REQUEST_FIELDS = {
+    "azure_openai": {
+        "messages",
+        "temperature",
+        "top_p",
+        "n",
+        "stream",
+        "frequency_penalty",
+        "logprobs",
+        "max_completion_tokens",
+        "presence_penalty",
+        "stop",
+        "user",
+        "tools",
+        "tool_choice",
+    },
+    "azure_meta": {
+        "messages",
+        "temperature",
+        "frequency_penalty",
+        "max_completion_tokens",
+        "stop",
+        "user",
+        "tools",
+        "tool_choice",
+        "stream",
+    },
+}
+REQUEST_FIELDS["azure_mistral"] = REQUEST_FIELDS["azure_meta"]
+
+
+class UpstreamError(Exception):
+    """
+    A non-2xx response from a passthrough upstream. Carries `status_code` like
+    the SDK's errors, so failover treats both alike.
+    """
+
+    def __init__(self, status_code: int, body: bytes):
+        super().__init__(
+            f"Error code: {status_code} - {body.decode(errors='replace')[:1000]}"
+        )
+        self.status_code = status_code
+
+
+def upstream_endpoint(provider: str) -> Tuple[str, Dict[str, str]]:
+    """
+    The chat completions URL of a provider and the headers that authenticate
+    with it, as its SDK client would use them.
+    """
+    prefix = PROVIDERS[provider]
+    endpoint = os.getenv(f"{prefix}_ENDPOINT", "").rstrip("/")
+    api_key = os.getenv(f"{prefix}_API_KEY", "")
+    if provider == "azure_openai":
+        deployment = os.getenv("AZURE_OPENAI_MODEL")
+        api_version = os.getenv("AZURE_OPENAI_api_version")
+        return (
+            f"{endpoint}/openai/deployments/{deployment}/chat/completions"
+            f"?api-version={api_version}",
+            {"api-key": api_key, "content-type": "application/json"},
+        )
+    return (
+        f"{endpoint}/chat/completions",
+        {"authorization": f"Bearer {api_key}", "content-type": "application/json"},
+    )
+
+
+def upstream_body(provider: str, request) -> bytes:
+    """
+    The request body to forward: the client's request with the model replaced
+    by the provider's deployment, `max_completion_tokens` sent as `max_tokens`,
+    and unset optional fields left out.
+    """
+    body = request.model_dump(include=REQUEST_FIELDS[provider], exclude_none=True)
+    body["model"] = os.getenv(f"{PROVIDERS[provider]}_MODEL")
+    if "max_completion_tokens" in body:
+        body["max_tokens"] = body.pop("max_completion_tokens")
+    if request.stream and provider == "azure_openai":
+        body["stream_options"] = {"include_usage": True}
+    return orjson.dumps(body)
+
+
+def passthrough_adapter(provider: str):
+    """
+    Build a chat completions adapter that calls an OpenAI-compatible provider
+    directly over its pooled httpx client instead of through the SDK.
+
+    The response is not decoded into SDK objects: a completion keeps the
+    upstream bytes as its JSON, and a stream is relayed to the client as
+    received, with only its first and usage chunks decoded for logging.
+
+    :param provider: One of PASSTHROUGH_PROVIDERS.
+    :return: Adapter coroutine taking a CreateChatCompletionRequest and returning
+        a Completion, or an SSEPassthrough when `request.stream` is set.
+    """
+    url, headers = upstream_endpoint(provider)
+
+    async def adapter(request):
+        client = provider_clients.http(provider)
+        response = await client.send(
+            client.build_request(
+                "POST", url, content=upstream_body(provider, request), headers=headers
+            ),
+            stream=request.stream,
+        )
+        if response.status_code >= 400:
+            body = await response.aread()
+            await response.aclose()
+            raise UpstreamError(response.status_code, body)
+        if request.stream:
+            return SSEPassthrough(response)
+        return Completion.from_json(response.content)
+
+    adapter.__name__ = f"{provider}_passthrough"
+    return adapter
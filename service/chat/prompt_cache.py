@@ -0,0 +1,305 @@
+import os
+import time
+import asyncio
+import hashlib
+import logging
+import datetime
+
+
+from collections import OrderedDict
+from contextvars import ContextVar
+from typing import Dict, List, Optional, Tuple
+
+
+from service.clients import provider_clients
+from utils.tokenizer import TOKENS_PER_MESSAGE
+
+
+# The tenant whose request is being dispatched. Set by the pipeline, so
+# provider adapters can scope prompt caches without a tenant argument.
+current_tenant: ContextVar[Optional[str]] = ContextVar(
+    "llmhub_current_tenant", default=None
+)
+
+# A cache this close to expiring is not handed out: the provider may drop it
+# before the request that uses it arrives.
+EXPIRY_MARGIN = 60.0
+
+
+def prefix_digests(messages: List) -> List[Tuple[int, int, bytes]]:
+    """
+    Hash every leading run of a conversation in one pass.
+
+    :param messages: Message list.
+    :return: One (message count, estimated tokens, digest) per prefix, shortest
+        first.
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    tokens = 0
+    prefixes = []
+    for count, message in enumerate(messages, 1):
+        content = message.content.encode()
+        digest.update(message.role.encode() + b"\0")
+        digest.update(len(content).to_bytes(8, "little") + content)
+        # About four UTF-8 bytes per token, as in estimate_text_tokens.
+        tokens += -(-len(content) // 4) + TOKENS_PER_MESSAGE
+        prefixes.append((count, tokens, digest.copy().digest()))
+    return prefixes
+
+
+class CachedPrefix:
+    """
+    A provider-side cache holding the first `messages` turns of a conversation.
+    """
+
+    __slots__ = ("content", "messages", "tokens", "expires_at", "refreshing")
+
+    def __init__(self, content, messages: int, tokens: int, expires_at: float):
+        self.content = content
+        self.messages = messages
+        self.tokens = tokens
+        self.expires_at = expires_at
+        self.refreshing = False
+
+
+async def create_gemini_cache(model: str, contents: List[Dict], ttl: float):
+    genai = provider_clients.get("gemini")
+    return await asyncio.to_thread(
+        genai.caching.CachedContent.create,
+        model=model,
+        contents=contents,
+        ttl=datetime.timedelta(seconds=ttl),
+    )
+
+
+async def refresh_gemini_cache(content, ttl: float) -> None:
+    await asyncio.to_thread(content.update, ttl=datetime.timedelta(seconds=ttl))
+
+
+async def delete_gemini_cache(content) -> None:
+    await asyncio.to_thread(content.delete)
+
+
+class PromptCache:
+    """
+    Provider context caches for long conversation prefixes that tenants resend.
+
+    Every request notes the digests of its leading turns, per tenant (the
+    `userId` from `verify_api_key`). Once a prefix of at least `min_tokens`
+    has been seen `min_repeats` times, a provider cache is created for it in
+    the background, and later requests starting with that prefix send only the
+    turns after it. A longer prefix gets its own cache only when it would cache
+    at least `min_tokens` more, so a growing conversation does not create a
+    cache per turn.
+
+    Caches are created with a `ttl`, extended in the background when used in
+    the second half of it, and deleted when evicted or at shutdown.
+    """
+
+    def __init__(
+        self,
+        enabled: bool = False,
+        min_tokens: int = 32768,
+        min_repeats: int = 2,
+        ttl: float = 3600.0,
+        max_entries: int = 1000,
+        max_tenants: int = 1000,
+        tenant_prefixes: int = 256,
+        create=create_gemini_cache,
+        refresh=refresh_gemini_cache,
+        delete=delete_gemini_cache,
+    ):
+        self.enabled = enabled
+        self.min_tokens = min_tokens
+        self.min_repeats = min_repeats
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_tenants = max_tenants
+        self.tenant_prefixes = tenant_prefixes
+        self.create = create
+        self.refresh = refresh
+        self.delete = delete
+        self.entries: "OrderedDict[Tuple, CachedPrefix]" = OrderedDict()
+        self.seen: "OrderedDict[str, OrderedDict[bytes, int]]" = OrderedDict()
+        self.pending = set()
+        self.failed: "OrderedDict[Tuple, bool]" = OrderedDict()
+        self._tasks = set()
+        self.hits = 0
+        self.misses = 0
+        self.created = 0
+        self.failures = 0
+        self.refreshed = 0
+        self.expired = 0
+        self.evicted = 0
+        self.cached_tokens = 0
+
+    def _spawn(self, coroutine) -> None:
+        task = asyncio.get_running_loop().create_task(coroutine)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    def _tenant_seen(self, tenant: str) -> "OrderedDict[bytes, int]":
+        seen = self.seen.get(tenant)
+        if seen is None:
+            seen = OrderedDict()
+            self.seen[tenant] = seen
+            if len(self.seen) > self.max_tenants:
+                self.seen.popitem(last=False)
+        self.seen.move_to_end(tenant)
+        return seen
+
+    def lookup(
+        self, tenant: Optional[str], model: str, messages: List, contents: List
+    ) -> Optional[CachedPrefix]:
+        """
+        Find the cache covering the longest prefix of a conversation, and start
+        creating one if a long enough prefix keeps repeating.
+
+        :param tenant: The caller's userId; nothing is cached without one.
+        :param model: The provider model the cache is created for.
+        :param messages: The turns before the final message.
+        :param contents: `messages` in the provider's format, cached from.
+        :return: The cache to send the request against, or None.
+        """
+        if not self.enabled or tenant is None:
+            return None
+        prefixes = [p for p in prefix_digests(messages) if p[1] >= self.min_tokens]
+        if not prefixes:
+            return None
+
+        now = time.monotonic()
+        cached = None
+        for count, tokens, digest in reversed(prefixes):
+            key = (tenant, model, digest)
+            entry = self.entries.get(key)
+            if entry is None:
+                continue
+            if entry.expires_at - now < EXPIRY_MARGIN:
+                del self.entries[key]
+                self.expired += 1
+                continue
+            self.entries.move_to_end(key)
+            cached = entry
+            break
+
+        seen = self._tenant_seen(tenant)
+        candidate = None
+        for count, tokens, digest in prefixes:
+            seen[digest] = seen.get(digest, 0) + 1
+            seen.move_to_end(digest)
+            if seen[digest] >= self.min_repeats:
+                candidate = (count, tokens, digest)
+        while len(seen) > self.tenant_prefixes:
+            seen.popitem(last=False)
+
+        if candidate is not None:
+            count, tokens, digest = candidate
+            key = (tenant, model, digest)
+            if (
+                key not in self.entries
+                and key not in self.pending
+                and key not in self.failed
+                and (cached is None or tokens - cached.tokens >= self.min_tokens)
+            ):
+                self.pending.add(key)
+                self._spawn(self._create(key, contents[:count], tokens))
+
+        if cached is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.cached_tokens += cached.tokens
+        if cached.expires_at - now < self.ttl / 2 and not cached.refreshing:
+            cached.refreshing = True
+            self._spawn(self._refresh(cached))
+        return cached
+
+    def invalidate(self, entry: CachedPrefix) -> None:
+        """
+        Forget a cache the provider no longer has.
+        """
+        for key, value in list(self.entries.items()):
+            if value is entry:
+                del self.entries[key]
+                self.expired += 1
+
+    async def _create(self, key: Tuple, contents: List, tokens: int) -> None:
+        try:
+            content = await self.create(key[1], contents, self.ttl)
+        except Exception as e:
+            # Usually a prefix under the provider's minimum; not retried.
+            self.failures += 1
+            self.failed[key] = True
+            while len(self.failed) > self.max_entries:
+                self.failed.popitem(last=False)
+            logging.error(f"Could not create prompt cache for {key[1]}: {e}")
+            return
+        finally:
+            self.pending.discard(key)
+        self.created += 1
+        self.entries[key] = CachedPrefix(
+            content, len(contents), tokens, time.monotonic() + self.ttl
+        )
+        while len(self.entries) > self.max_entries:
+            _, evicted = self.entries.popitem(last=False)
+            self.evicted += 1
+            self._spawn(self._delete(evicted))
+
+    async def _refresh(self, entry: CachedPrefix) -> None:
+        try:
+            await self.refresh(entry.content, self.ttl)
+            entry.expires_at = time.monotonic() + self.ttl
+            self.refreshed += 1
+        except Exception as e:
+            logging.error(f"Could not extend prompt cache: {e}")
+        finally:
+            entry.refreshing = False
+
+    async def _delete(self, entry: CachedPrefix) -> None:
+        try:
+            await self.delete(entry.content)
+        except Exception as e:
+            logging.warning(f"Could not delete prompt cache: {e}")
+
+    async def close(self, timeout: float = 10.0) -> None:
+        """
+        Delete every live cache, so none is billed until its TTL runs out.
+        Caches still being created are waited for first.
+        """
+        if self._tasks:
+            await asyncio.wait(list(self._tasks), timeout=timeout)
+        entries = list(self.entries.values())
+        self.entries.clear()
+        if not entries:
+            return
+        try:
+            await asyncio.wait_for(
+                asyncio.gather(*(self._delete(entry) for entry in entries)), timeout
+            )
+        except asyncio.TimeoutError:
+            logging.warning("Timed out deleting prompt caches.")
+
+    def stats(self) -> Dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self.entries),
+            "pending": len(self.pending),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "created": self.created,
+            "failures": self.failures,
+            "refreshed": self.refreshed,
+            "expired": self.expired,
+            "evicted": self.evicted,
+            "cached_tokens": self.cached_tokens,
+        }
+
+
+prompt_cache = PromptCache(
+    enabled=os.getenv("PROMPT_CACHE_ENABLED", "false").lower() == "true",
+    min_tokens=int(os.getenv("PROMPT_CACHE_MIN_TOKENS", "32768")),
+    min_repeats=int(os.getenv("PROMPT_CACHE_MIN_REPEATS", "2")),
+    ttl=float(os.getenv("PROMPT_CACHE_TTL", "3600")),
+    max_entries=int(os.getenv("PROMPT_CACHE_MAX_ENTRIES", "1000")),
+)
@@ -0,0 +1,413 @@
+import os
+import time
+import asyncio
+import logging
+
+
+from collections import deque
+from contextvars import ContextVar
+from typing import Dict, List, Optional, Set
+
+
+from utils.rate_limit import RateLimitExceeded, estimate_tokens
+from utils.telemetry import upstream_call
+from utils.tokenizer import CONTEXT_WINDOWS
+
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+# Equivalent models to fall back to, in order of preference, when the routed
+# model's provider is unhealthy or fails.
+FAILOVER_MODELS = {
+    "gpt-4o-mini": ["gemini-1.5-flash", "meta-llama"],
+    "claude-3.5-sonnet": ["gemini-1.5-flash", "mistral-nemo"],
+    "gemini-1.5-flash": ["gpt-4o-mini", "mistral-nemo"],
+    "mistral-nemo": ["meta-llama", "gpt-4o-mini"],
+    "meta-llama": ["mistral-nemo", "gpt-4o-mini"],
+}
+
+
+# Concurrency limits per provider for the upstream calls made in the current
+# context. Set by callers that bound their own load, like the batch runner, so
+# the limit applies to the provider actually called, failover included.
+provider_slots: ContextVar[Optional[Dict[str, asyncio.Semaphore]]] = ContextVar(
+    "llmhub_provider_slots", default=None
+)
+
+
+def is_client_error(error: Exception) -> bool:
+    """
+    Whether an upstream error was caused by the request itself (4xx other than
+    timeouts and rate limits). Those are not retried elsewhere and do not count
+    against the provider's health.
+    """
+    status = getattr(error, "status_code", None)
+    if status is None:
+        status = getattr(error, "code", None)
+    return isinstance(status, int) and 400 <= status < 500 and status not in (408, 429)
+
+
+class HedgeFailed(Exception):
+    """
+    Raised by a hedged call that failed, with the number of candidates it tried:
+    1 if the secondary was never launched, 2 if both failed.
+    """
+
+    def __init__(self, error: Exception, tried: int):
+        super().__init__(str(error))
+        self.error = error
+        self.tried = tried
+
+
+class ProviderUnavailable(Exception):
+    """
+    Raised instead of dispatching to a provider whose circuit breaker does not
+    admit the request, so failover moves on to the next candidate.
+    """
+
+    status_code = 503
+
+
+class ProviderHealth:
+    """
+    Rolling latency/error statistics and a circuit breaker for one provider.
+
+    The breaker opens when the error rate over the window exceeds
+    `error_rate_threshold` (once at least `min_requests` were seen) or after
+    `consecutive_failures` failures in a row. After `open_seconds` it lets a
+    single probe through (half-open); a success closes it again.
+    """
+
+    def __init__(
+        self,
+        window_seconds: float = 60.0,
+        max_samples: int = 1000,
+        error_rate_threshold: float = 0.5,
+        min_requests: int = 10,
+        consecutive_failures: int = 5,
+        open_seconds: float = 30.0,
+    ):
+        self.window_seconds = window_seconds
+        self.samples = deque(maxlen=max_samples)
+        self.error_rate_threshold = error_rate_threshold
+        self.min_requests = min_requests
+        self.consecutive_failures_threshold = consecutive_failures
+        self.open_seconds = open_seconds
+        self.state = CLOSED
+        self.opened_at = 0.0
+        self.consecutive_failures = 0
+        self.probe_started_at = None
+
+    def _trim(self, now: float) -> None:
+        while self.samples and now - self.samples[0][0] > self.window_seconds:
+            self.samples.popleft()
+
+    def record(self, latency: float, ok: bool) -> None:
+        now = time.monotonic()
+        self.samples.append((now, latency, ok))
+        self._trim(now)
+        self.probe_started_at = None
+
+        if ok:
+            self.consecutive_failures = 0
+            if self.state != CLOSED:
+                logging.info("Circuit closed after successful probe.")
+            self.state = CLOSED
+            return
+
+        self.consecutive_failures += 1
+        if self.state == HALF_OPEN or self._should_open():
+            self.state = OPEN
+            self.opened_at = now
+
+    def _should_open(self) -> bool:
+        if self.consecutive_failures >= self.consecutive_failures_threshold:
+            return True
+        if len(self.samples) < self.min_requests:
+            return False
+        return self.error_rate() > self.error_rate_threshold
+
+    def available(self) -> bool:
+        """
+        Whether `allow_request` would admit a request now, without changing the
+        breaker's state or taking the half-open probe.
+        """
+        if self.state == CLOSED:
+            return True
+        now = time.monotonic()
+        if self.state == OPEN:
+            return now - self.opened_at >= self.open_seconds
+        return (
+            self.probe_started_at is None
+            or now - self.probe_started_at >= self.open_seconds
+        )
+
+    def release_probe(self) -> None:
+        """
+        Give back a half-open probe taken by `allow_request` that was never sent.
+        """
+        self.probe_started_at = None
+
+    def allow_request(self) -> bool:
+        if self.state == CLOSED:
+            return True
+        now = time.monotonic()
+        if self.state == OPEN and now - self.opened_at >= self.open_seconds:
+            self.state = HALF_OPEN
+        if self.state != HALF_OPEN:
+            return False
+        # One probe at a time; a probe that never reported back is retried
+        # after another `open_seconds`.
+        if (
+            self.probe_started_at is not None
+            and now - self.probe_started_at < self.open_seconds
+        ):
+            return False
+        self.probe_started_at = now
+        return True
+
+    def error_rate(self) -> float:
+        if not self.samples:
+            return 0.0
+        return sum(1 for _, _, ok in self.samples if not ok) / len(self.samples)
+
+    def latency_percentile(self, pct: float) -> Optional[float]:
+        latencies = sorted(latency for _, latency, ok in self.samples if ok)
+        if not latencies:
+            return None
+        return latencies[min(int(len(latencies) * pct / 100), len(latencies) - 1)]
+
+    def snapshot(self) -> Dict:
+        p50 = self.latency_percentile(50)
+        p95 = self.latency_percentile(95)
+        return {
+            "state": self.state,
+            "requests": len(self.samples),
+            "error_rate": round(self.error_rate(), 4),
+            "p50_ms": round(p50 * 1000, 1) if p50 is not None else None,
+            "p95_ms": round(p95 * 1000, 1) if p95 is not None else None,
+        }
+
+
+class ResilientDispatcher:
+    """
+    Calls provider adapters with health tracking, failover and optional hedging.
+
+    `providers` maps a model name to `(provider name, adapter coroutine)`. With a
+    `limiter`, each upstream call is admitted against its provider's rate limits
+    first; a provider that is out of budget is failed over like an unhealthy one.
+    """
+
+    def __init__(
+        self,
+        providers: Dict,
+        limiter=None,
+        failover: bool = True,
+        hedge: bool = False,
+        hedge_min_delay: float = 0.5,
+        hedge_max_delay: float = 10.0,
+        hedge_min_samples: int = 20,
+    ):
+        self.providers = providers
+        self.limiter = limiter
+        self.failover = failover
+        self.hedge = hedge
+        self.hedge_min_delay = hedge_min_delay
+        self.hedge_max_delay = hedge_max_delay
+        self.hedge_min_samples = hedge_min_samples
+        self.health: Dict[str, ProviderHealth] = {}
+        self.failovers = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+
+    def provider_health(self, provider: str) -> ProviderHealth:
+        health = self.health.get(provider)
+        if health is None:
+            health = ProviderHealth(
+                window_seconds=float(os.getenv("HEALTH_WINDOW_SECONDS", "60")),
+                error_rate_threshold=float(os.getenv("BREAKER_ERROR_RATE", "0.5")),
+                min_requests=int(os.getenv("BREAKER_MIN_REQUESTS", "10")),
+                consecutive_failures=int(os.getenv("BREAKER_CONSECUTIVE_FAILURES", "5")),
+                open_seconds=float(os.getenv("BREAKER_OPEN_SECONDS", "30")),
+            )
+            self.health[provider] = health
+        return health
+
+    def candidates(
+        self, model: str, tokens: int = 0, allowed: Optional[Set[str]] = None
+    ) -> List[str]:
+        """
+        The routed model followed by healthy failover models on other providers
+        whose context window can hold `tokens`, limited to `allowed` if given.
+        """
+        primary_provider = self.providers[model][0]
+        models = [model]
+        if self.failover:
+            seen = {primary_provider}
+            for alternative in FAILOVER_MODELS.get(model, []):
+                provider = self.providers[alternative][0]
+                if allowed is not None and alternative not in allowed:
+                    continue
+                if CONTEXT_WINDOWS.get(alternative, tokens) < tokens:
+                    continue
+                if provider not in seen:
+                    seen.add(provider)
+                    models.append(alternative)
+
+        # Only checked here: the half-open probe is taken by `_call` for the
+        # candidate actually dispatched to.
+        healthy = [m for m in models if self.provider_health(self.providers[m][0]).available()]
+        # With every provider tripped, still try the routed one rather than fail fast.
+        return healthy or [model]
+
+    async def _call(self, model: str, request, tokens: int, force: bool = False):
+        """
+        :param force: Dispatch even if the provider's breaker does not admit it.
+        :raises ProviderUnavailable: If the breaker does not admit the request.
+        """
+        slots = provider_slots.get()
+        slot = slots.get(self.providers[model][0]) if slots else None
+        if slot is None:
+            return await self._dispatch(model, request, tokens, force)
+        async with slot:
+            return await self._dispatch(model, request, tokens, force)
+
+    async def _dispatch(self, model: str, request, tokens: int, force: bool):
+        provider, adapter = self.providers[model]
+        health = self.provider_health(provider)
+        # Checked before the rate limit, so an open breaker does not spend the
+        # provider's budget or wait for it.
+        admitted = health.allow_request()
+        if not admitted and not force:
+            raise ProviderUnavailable(f"Provider {provider} is unavailable.")
+        if self.limiter is not None:
+            try:
+                await self.limiter.acquire_provider(provider, tokens)
+            except BaseException:
+                if admitted and health.state == HALF_OPEN:
+                    health.release_probe()
+                raise
+        started = time.perf_counter()
+        try:
+            with upstream_call(model, provider):
+                response = await adapter(request)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            if not is_client_error(e):
+                health.record(time.perf_counter() - started, ok=False)
+            raise
+        health.record(time.perf_counter() - started, ok=True)
+        return response
+
+    def _hedge_delay(self, model: str) -> Optional[float]:
+        health = self.provider_health(self.providers[model][0])
+        if len([s for s in health.samples if s[2]]) < self.hedge_min_samples:
+            return None
+        p95 = health.latency_percentile(95)
+        return min(max(p95, self.hedge_min_delay), self.hedge_max_delay)
+
+    async def _hedged(
+        self, primary: str, secondary: str, request, tokens: int, force: bool = False
+    ):
+        """
+        :param force: Dispatch to the primary even if its breaker does not admit it.
+        :raises HedgeFailed: If every launched call failed.
+        """
+        delay = self._hedge_delay(primary)
+        first = asyncio.create_task(self._call(primary, request, tokens, force))
+        done = None
+        if delay is not None:
+            done, _ = await asyncio.wait({first}, timeout=delay)
+        if delay is None or done:
+            try:
+                return await first
+            except Exception as e:
+                raise HedgeFailed(e, tried=1)
+
+        self.hedges += 1
+        logging.info(f"Hedging {primary} with {secondary} after {delay:.2f}s.")
+        second = asyncio.create_task(self._call(secondary, request, tokens))
+        pending = {first, second}
+        error = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in done:
+                    if task.exception() is None:
+                        if task is second:
+                            self.hedge_wins += 1
+                        return task.result()
+                    error = task.exception()
+            raise HedgeFailed(error, tried=2)
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def complete(
+        self,
+        model: str,
+        request,
+        allowed: Optional[Set[str]] = None,
+        prompt_tokens: Optional[int] = None,
+    ):
+        """
+        Run the completion on the routed model, failing over on provider errors.
+
+        :param model: The routed model name.
+        :param request: The chat completion request.
+        :param allowed: The only models to fail over or hedge to; any if None.
+        :param prompt_tokens: Prompt tokens if already counted; counted otherwise.
+        :return: The adapter's response.
+        """
+        if model not in self.providers:
+            model = "gpt-4o-mini"
+        tokens = estimate_tokens(request, prompt_tokens)
+        candidates = self.candidates(model, tokens, allowed)
+        # With every provider tripped, candidates() falls back to the routed
+        # model, which is then tried regardless of its breaker.
+        force = not self.provider_health(self.providers[candidates[0]][0]).available()
+
+        start = 0
+        error = None
+        if self.hedge and not request.stream and len(candidates) > 1:
+            try:
+                return await self._hedged(
+                    candidates[0], candidates[1], request, tokens, force
+                )
+            except HedgeFailed as e:
+                if is_client_error(e.error) or len(candidates) <= e.tried:
+                    raise e.error
+                # Carry on with the first candidate the hedge did not try.
+                start = e.tried
+                error = e.error
+
+        for index, candidate in enumerate(candidates[start:], start):
+            try:
+                if index > 0:
+                    self.failovers += 1
+                    logging.warning(f"Failing over from {model} to {candidate}.")
+                return await self._call(
+                    candidate, request, tokens, force and index == 0
+                )
+            except RateLimitExceeded as e:
+                logging.warning(f"Provider for {candidate} is rate limited.")
+                error = e
+            except Exception as e:
+                if is_client_error(e):
+                    raise
+                logging.error(f"Provider for {candidate} failed: {e}")
+                error = e
+        raise error
+
+    def stats(self) -> Dict:
+        return {
+            "providers": {name: h.snapshot() for name, h in self.health.items()},
+            "failovers": self.failovers,
+            "hedges": self.hedges,
+            "hedge_wins": self.hedge_wins,
+        }
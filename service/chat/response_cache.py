@@ -0,0 +1,147 @@
+import os
+import json
+import hashlib
+import logging
+
+
+from cachetools import TTLCache
+from typing import Dict, Optional
+
+
+from pydantic_types.chat import CreateChatCompletionRequest
+from service.chat.completion import Completion
+from utils.cache import shared_store_from_env
+
+
+# Request fields that change what the model generates; everything else (user,
+# stream) is left out of the key.
+OUTPUT_FIELDS = {
+    "messages",
+    "temperature",
+    "top_p",
+    "n",
+    "logprobs",
+    "top_logprobs",
+    "max_completion_tokens",
+    "presence_penalty",
+    "frequency_penalty",
+    "stop",
+    "tools",
+    "tool_choice",
+}
+
+CACHE_HEADER = "X-LLMHub-Cache"
+
+RESPONSE_CACHE_ENABLED = os.getenv("RESPONSE_CACHE_ENABLED", "false").lower() == "true"
+
+
+def canonical_request_key(request: CreateChatCompletionRequest, model: str) -> str:
+    """
+    Hash the output-affecting fields of a request together with the routed model.
+
+    :param request: The chat completion request.
+    :param model: The model the request was routed to.
+    :return: Hex digest usable as a cache key.
+    """
+    payload = request.model_dump(include=OUTPUT_FIELDS)
+    payload["model"] = model
+    canonical = json.dumps(payload, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+
+def is_deterministic(request: CreateChatCompletionRequest) -> bool:
+    """
+    Only greedy, single-choice, non-streaming requests are safe to replay.
+    """
+    return request.temperature == 0 and request.n == 1 and not request.stream
+
+
+def cache_bypassed(headers) -> bool:
+    """
+    Whether the caller opted this request out of the response cache, either with
+    `X-LLMHub-Cache: bypass` or `Cache-Control: no-store`/`no-cache`.
+    """
+    if headers.get(CACHE_HEADER, "").lower() == "bypass":
+        return True
+    cache_control = headers.get("Cache-Control", "").lower()
+    return "no-store" in cache_control or "no-cache" in cache_control
+
+
+class ResponseCache:
+    """
+    Exact-match cache of serialized chat completions.
+
+    The local tier is a TTLCache bounded by the total size of the stored JSON in
+    bytes (least recently used entries are evicted first). An optional shared
+    store makes hits visible to every Function instance.
+    """
+
+    def __init__(
+        self,
+        enabled: bool = False,
+        max_bytes: int = 64 * 1024 * 1024,
+        ttl: float = 3600.0,
+        shared=None,
+    ):
+        self.enabled = enabled
+        self.ttl = ttl
+        self.local = TTLCache(maxsize=max_bytes, ttl=ttl, getsizeof=len)
+        self.shared = shared
+        self.hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+
+    async def get(self, key: str) -> Optional[Completion]:
+        data = self.local.get(key)
+        if data is None and self.shared is not None:
+            try:
+                data = await self.shared.get(f"llmhub:response:{key}")
+            except Exception as e:
+                logging.error(f"Shared response cache read failed: {e}")
+            if data is not None:
+                self.shared_hits += 1
+                self._store_local(key, data)
+        elif data is not None:
+            self.hits += 1
+
+        if data is None:
+            self.misses += 1
+            return None
+        return Completion.from_json(data)
+
+    async def set(self, key: str, response) -> None:
+        data = response.to_json()
+        self._store_local(key, data)
+        if self.shared is not None:
+            try:
+                await self.shared.set(f"llmhub:response:{key}", data, ttl=self.ttl)
+            except Exception as e:
+                logging.error(f"Shared response cache write failed: {e}")
+
+    def _store_local(self, key: str, data: bytes) -> None:
+        try:
+            self.local[key] = data
+        except ValueError:
+            # Larger than the whole cache; not worth keeping locally.
+            pass
+
+    def stats(self) -> Dict:
+        lookups = self.hits + self.shared_hits + self.misses
+        return {
+            "entries": len(self.local),
+            "bytes": self.local.currsize,
+            "hits": self.hits,
+            "shared_hits": self.shared_hits,
+            "misses": self.misses,
+            "hit_ratio": (
+                round((self.hits + self.shared_hits) / lookups, 4) if lookups else 0.0
+            ),
+        }
+
+
+response_cache = ResponseCache(
+    enabled=RESPONSE_CACHE_ENABLED,
+    max_bytes=int(os.getenv("RESPONSE_CACHE_MAX_BYTES", str(64 * 1024 * 1024))),
+    ttl=float(os.getenv("RESPONSE_CACHE_TTL", "3600")),
+    shared=shared_store_from_env() if RESPONSE_CACHE_ENABLED else None,
+)
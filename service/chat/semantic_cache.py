@@ -0,0 +1,297 @@
+import os
+import json
+import time
+import hashlib
+import logging
+import importlib.util
+
+
+import numpy as np
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+
+from pydantic_types.chat import CreateChatCompletionRequest
+from service.chat.completion import Completion
+from service.embeddings.embedding_router import embed_texts
+
+
+HNSWLIB_AVAILABLE = importlib.util.find_spec("hnswlib") is not None
+
+# Fields that must match exactly for a cached answer to be reused; the last
+# user message is compared by embedding similarity instead.
+CONTEXT_FIELDS = {
+    "n",
+    "logprobs",
+    "top_logprobs",
+    "max_completion_tokens",
+    "stop",
+    "tools",
+    "tool_choice",
+}
+
+
+def context_key(request: CreateChatCompletionRequest, model: str) -> str:
+    """
+    Hash everything except the last message that shapes the answer: the routed
+    model, the earlier turns and the output-affecting parameters.
+    """
+    payload = request.model_dump(include=CONTEXT_FIELDS)
+    payload["history"] = [message.model_dump() for message in request.messages[:-1]]
+    payload["model"] = model
+    canonical = json.dumps(payload, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+
+class BruteForceIndex:
+    """
+    Exact nearest-neighbour search with one matrix-vector product per lookup.
+
+    Vectors are unit-normalised float32 rows, so the dot product is the cosine
+    similarity. Storage grows by doubling up to `capacity`, after which the least
+    recently used entry is overwritten.
+    """
+
+    def __init__(self, dim: int, capacity: int):
+        self.capacity = capacity
+        self.vectors = np.zeros((min(64, capacity), dim), dtype=np.float32)
+        self.context_ids = np.full(len(self.vectors), -1, dtype=np.int64)
+        self.payloads = {}
+        self.lru = OrderedDict()
+        self.size = 0
+
+    def __len__(self) -> int:
+        return len(self.payloads)
+
+    def search(
+        self, vector: np.ndarray, context_id: int
+    ) -> Tuple[Optional[int], float]:
+        if self.size == 0:
+            return None, 0.0
+        scores = self.vectors[: self.size] @ vector
+        scores[self.context_ids[: self.size] != context_id] = -np.inf
+        slot = int(np.argmax(scores))
+        return slot, float(scores[slot])
+
+    def add(self, vector: np.ndarray, context_id: int, payload: bytes) -> None:
+        if self.size < len(self.vectors):
+            slot = self.size
+            self.size += 1
+        elif len(self.vectors) < self.capacity:
+            grow = min(len(self.vectors) * 2, self.capacity)
+            self.vectors = np.resize(self.vectors, (grow, self.vectors.shape[1]))
+            self.context_ids = np.resize(self.context_ids, grow)
+            slot = self.size
+            self.size += 1
+        else:
+            slot, _ = self.lru.popitem(last=False)
+        self.vectors[slot] = vector
+        self.context_ids[slot] = context_id
+        self.payloads[slot] = payload
+        self.touch(slot)
+
+    def get(self, slot: int) -> bytes:
+        return self.payloads[slot]
+
+    def touch(self, slot: int) -> None:
+        self.lru[slot] = None
+        self.lru.move_to_end(slot)
+
+
+class HnswIndex:
+    """
+    Approximate nearest-neighbour search backed by hnswlib, for large tenants.
+
+    Evicted entries are marked deleted and their slots reused by later inserts.
+    """
+
+    def __init__(self, dim: int, capacity: int, candidates: int = 8):
+        import hnswlib
+
+        self.capacity = capacity
+        self.candidates = candidates
+        self.index = hnswlib.Index(space="ip", dim=dim)
+        self.index.init_index(
+            max_elements=capacity, ef_construction=200, M=16, allow_replace_deleted=True
+        )
+        self.index.set_ef(64)
+        self.context_ids = {}
+        self.payloads = {}
+        self.lru = OrderedDict()
+        self.next_label = 0
+
+    def __len__(self) -> int:
+        return len(self.payloads)
+
+    def search(
+        self, vector: np.ndarray, context_id: int
+    ) -> Tuple[Optional[int], float]:
+        if not self.payloads:
+            return None, 0.0
+        k = min(self.candidates, len(self.payloads))
+        labels, distances = self.index.knn_query(vector, k=k)
+        for label, distance in zip(labels[0], distances[0]):
+            if self.context_ids.get(int(label)) == context_id:
+                return int(label), 1.0 - float(distance)
+        return None, 0.0
+
+    def add(self, vector: np.ndarray, context_id: int, payload: bytes) -> None:
+        if len(self.payloads) >= self.capacity:
+            evicted, _ = self.lru.popitem(last=False)
+            self.index.mark_deleted(evicted)
+            del self.payloads[evicted]
+            del self.context_ids[evicted]
+        label = self.next_label
+        self.next_label += 1
+        self.index.add_items(vector[np.newaxis, :], [label], replace_deleted=True)
+        self.context_ids[label] = context_id
+        self.payloads[label] = payload
+        self.touch(label)
+
+    def get(self, label: int) -> bytes:
+        return self.payloads[label]
+
+    def touch(self, label: int) -> None:
+        self.lru[label] = None
+        self.lru.move_to_end(label)
+
+
+class TenantIndex:
+    """
+    One tenant's cached completions. Tenants never see each other's entries.
+    """
+
+    def __init__(self, dim: int, capacity: int, backend: str):
+        if backend == "hnsw" or (
+            backend == "auto" and HNSWLIB_AVAILABLE and capacity > 20000
+        ):
+            self.index = HnswIndex(dim, capacity)
+        else:
+            self.index = BruteForceIndex(dim, capacity)
+
+    def context_id(self, context: str) -> int:
+        # The leading 60 bits of the context digest fit an int64 id column.
+        return int(context[:15], 16)
+
+
+class SemanticLookup:
+    """
+    Carries the embedding from a missed lookup through to `store()` so the
+    prompt is embedded only once.
+    """
+
+    __slots__ = ("vector", "context")
+
+    def __init__(self, vector: np.ndarray, context: str):
+        self.vector = vector
+        self.context = context
+
+
+class SemanticCache:
+    """
+    Serves cached completions for paraphrases of earlier prompts.
+
+    The last user message is embedded and compared against earlier prompts from
+    the same tenant (the `userId` from `verify_api_key`) that share the same
+    routed model and conversation context. A match above `threshold` cosine
+    similarity is returned instead of calling the provider.
+    """
+
+    def __init__(
+        self,
+        enabled: bool = False,
+        threshold: float = 0.95,
+        tenant_capacity: int = 5000,
+        max_tenants: int = 1000,
+        backend: str = "auto",
+        embed=embed_texts,
+    ):
+        self.enabled = enabled
+        self.threshold = threshold
+        self.tenant_capacity = tenant_capacity
+        self.max_tenants = max_tenants
+        self.backend = backend
+        self.embed = embed
+        self.tenants: "OrderedDict[str, TenantIndex]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+        self.lookup_seconds = 0.0
+
+    def _tenant(self, tenant: str, dim: int) -> TenantIndex:
+        index = self.tenants.get(tenant)
+        if index is None:
+            index = TenantIndex(dim, self.tenant_capacity, self.backend)
+            self.tenants[tenant] = index
+            if len(self.tenants) > self.max_tenants:
+                self.tenants.popitem(last=False)
+        self.tenants.move_to_end(tenant)
+        return index
+
+    async def lookup(
+        self, tenant: str, request: CreateChatCompletionRequest, model: str
+    ) -> Tuple[Optional[Completion], Optional[SemanticLookup]]:
+        """
+        Look for a cached completion of a semantically equivalent prompt.
+
+        :param tenant: The caller's userId.
+        :param request: The chat completion request.
+        :param model: The routed model.
+        :return: Tuple of (cached completion or None, lookup state for `store`).
+        """
+        started = time.perf_counter()
+        try:
+            vector = np.asarray(
+                (await self.embed([request.messages[-1].content]))[0], dtype=np.float32
+            )
+        except Exception as e:
+            self.errors += 1
+            logging.error(f"Semantic cache embedding failed: {e}")
+            return None, None
+        vector /= np.linalg.norm(vector) or 1.0
+        lookup = SemanticLookup(vector, context_key(request, model))
+
+        index = self._tenant(tenant, len(vector))
+        slot, score = index.index.search(vector, index.context_id(lookup.context))
+        self.lookup_seconds += time.perf_counter() - started
+        if slot is None or score < self.threshold:
+            self.misses += 1
+            return None, lookup
+
+        self.hits += 1
+        index.index.touch(slot)
+        return Completion.from_json(index.index.get(slot)), lookup
+
+    def store(self, tenant: str, lookup: SemanticLookup, response) -> None:
+        """
+        Remember a fresh completion under the embedding computed by `lookup`.
+        """
+        index = self._tenant(tenant, len(lookup.vector))
+        index.index.add(
+            lookup.vector,
+            index.context_id(lookup.context),
+            response.to_json(),
+        )
+
+    def stats(self) -> Dict:
+        lookups = self.hits + self.misses
+        return {
+            "tenants": len(self.tenants),
+            "entries": sum(len(index.index) for index in self.tenants.values()),
+            "hits": self.hits,
+            "misses": self.misses,
+            "errors": self.errors,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "avg_lookup_ms": (
+                round(self.lookup_seconds / lookups * 1000, 3) if lookups else 0.0
+            ),
+        }
+
+
+semantic_cache = SemanticCache(
+    enabled=os.getenv("SEMANTIC_CACHE_ENABLED", "false").lower() == "true",
+    threshold=float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.95")),
+    tenant_capacity=int(os.getenv("SEMANTIC_CACHE_TENANT_CAPACITY", "5000")),
+    max_tenants=int(os.getenv("SEMANTIC_CACHE_MAX_TENANTS", "1000")),
+    backend=os.getenv("SEMANTIC_CACHE_INDEX", "auto"),
+)
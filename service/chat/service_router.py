@@ -1,34 +1,89 @@
+import os
+
+
+from typing import Optional, Set
+
+
 from service.chat.azure_openai import Azure_OpenAI_Chat_Completions
 from service.chat.google_gemini import Google_Gemini_Chat_Completions
 from service.chat.azure_meta import Azure_Meta_Chat_Completions
 from service.chat.azure_mistral import Azure_Mistral_Chat_Completions
-from pydantic_types.chat import (
-    ChatCompletion,
-    ChatCompletionChoice,
-    Usage,
+from service.chat.stub import Stub_Chat_Completions
+from service.chat.passthrough import PASSTHROUGH_PROVIDERS, passthrough_adapter
+from service.chat.resilience import ResilientDispatcher
+from service.clients import PROVIDERS, provider_settings
+from utils.rate_limit import rate_limiter_from_env
+from service.chat.completion import Completion
+
+
+# Model name -> (provider whose health it shares, adapter).
+MODEL_PROVIDERS = {
+    "gpt-4o-mini": ("azure_openai", Azure_OpenAI_Chat_Completions),
+    "gemini-1.5-flash": ("gemini", Google_Gemini_Chat_Completions),
+    "meta-llama": ("azure_meta", Azure_Meta_Chat_Completions),
+    "mistral-nemo": ("azure_mistral", Azure_Mistral_Chat_Completions),
+    "claude-3.5-sonnet": ("azure_openai", Azure_OpenAI_Chat_Completions),
+}
+
+if os.getenv("PASSTHROUGH_ENABLED", "false").lower() == "true":
+    # Forward requests to the OpenAI-compatible providers and relay their
+    # responses as received, skipping the SDK in both directions.
+    _passthrough = {
+        provider: passthrough_adapter(provider) for provider in PASSTHROUGH_PROVIDERS
+    }
+    MODEL_PROVIDERS = {
+        model: (provider, _passthrough.get(provider, adapter))
+        for model, (provider, adapter) in MODEL_PROVIDERS.items()
+    }
+
+if os.getenv("STUB_PROVIDER_ENABLED", "false").lower() == "true":
+    # Local testing: keep routing and per-provider accounting but answer every
+    # call with the in-process stub.
+    MODEL_PROVIDERS = {
+        model: (provider, Stub_Chat_Completions)
+        for model, (provider, _) in MODEL_PROVIDERS.items()
+    }
+
+rate_limiter = rate_limiter_from_env(
+    {
+        provider: (settings["rate_limit_rps"], settings["rate_limit_tpm"])
+        for provider, settings in (
+            (provider, provider_settings(provider)) for provider in PROVIDERS
+        )
+    }
+)
+
+dispatcher = ResilientDispatcher(
+    MODEL_PROVIDERS,
+    limiter=rate_limiter,
+    failover=os.getenv("FAILOVER_ENABLED", "true").lower() == "true",
+    hedge=os.getenv("HEDGE_ENABLED", "false").lower() == "true",
+    hedge_min_delay=float(os.getenv("HEDGE_MIN_DELAY", "0.5")),
+    hedge_max_delay=float(os.getenv("HEDGE_MAX_DELAY", "10")),
 )
 
 
-def RouterChatCompletion(model: str, request: dict) -> ChatCompletion:
+async def RouterChatCompletion(
+    model: str,
+    request: dict,
+    allowed: Optional[Set[str]] = None,
+    prompt_tokens: Optional[int] = None,
+) -> Completion:
     """
     Routes the request to the appropriate chat completion service based on the model.
 
+    Unknown models go to Azure OpenAI. When the model's provider is unhealthy or
+    fails, the request is retried on an equivalent model from another provider.
+
     Args:
         model (str): The model to use for chat completion.
         request (dict): The request data for the model's completion service.
+        allowed (set, optional): The only models to fail over to; any if None.
+        prompt_tokens (int, optional): Prompt tokens if already counted.
 
     Returns:
-        ChatCompletion: The response from the chosen model's service.
+        Completion: The response from the chosen model's service. For streaming
+            requests, an async iterator of `chat.completion.chunk` dictionaries,
+            or an SSEPassthrough of the upstream's event stream in passthrough mode.
     """
-    if model == "gpt-4o-mini":
-        return Azure_OpenAI_Chat_Completions(request)
-    elif model == "gemini-1.5-flash":
-        return Google_Gemini_Chat_Completions(request)
-    elif model == "meta-llama":
-        return Azure_Meta_Chat_Completions(request)
-    elif model == "mistral-nemo":
-        return Azure_Mistral_Chat_Completions(request)
-    elif model == "claude-3.5-sonnet":
-        return Azure_OpenAI_Chat_Completions(request)
-    else:
-        return Azure_OpenAI_Chat_Completions(request)
+    return await dispatcher.complete(model, request, allowed, prompt_tokens)
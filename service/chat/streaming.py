@@ -0,0 +1,250 @@
+import re
+import time
+import asyncio
+import logging
+
+
+import httpx
+import orjson
+
+
+from typing import AsyncIterator, Awaitable, Callable, Dict, Optional
+
+
+from service.chat.completion import Completion, CompletionUsage
+from utils.tokenizer import count_message_tokens, count_text_tokens
+
+
+SSE_DONE = b"data: [DONE]\n\n"
+# A chunk carrying usage, as opposed to the `"usage": null` of every other
+# chunk when the provider is asked to include usage.
+USAGE_FIELD = re.compile(rb'"usage"\s*:\s*\{')
+SSE_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
+# Keeps fire-and-forget completion callbacks alive until they finish.
+_background_tasks = set()
+
+
+def sse_event(payload: Dict) -> bytes:
+    """
+    Encode one server-sent event carrying a JSON payload.
+    """
+    return b"data: " + orjson.dumps(payload) + b"\n\n"
+
+
+def completion_chunk(
+    id: str,
+    model: str,
+    created: int,
+    delta: Dict,
+    finish_reason: Optional[str] = None,
+) -> Dict:
+    """
+    Build an OpenAI-shaped `chat.completion.chunk` object for a single choice.
+    """
+    return {
+        "id": id,
+        "object": "chat.completion.chunk",
+        "created": created,
+        "model": model,
+        "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+    }
+
+
+async def openai_chunk_stream(stream) -> AsyncIterator[Dict]:
+    """
+    Adapt an OpenAI SDK chunk stream to plain chunk dictionaries.
+    """
+    async for chunk in stream:
+        yield chunk.model_dump(exclude_unset=True)
+
+
+class StreamAccumulator:
+    """
+    Folds streamed chunks back into a Completion for usage logging.
+
+    Usage comes from the final usage chunk when the provider sends one;
+    otherwise it is counted locally from the prompt and the streamed content.
+    """
+
+    def __init__(self, request):
+        self.request = request
+        self.id = None
+        self.model = None
+        self.created = int(time.time())
+        self.content = []
+        self.content_chunks = 0
+        self.finish_reason = None
+        self.usage = None
+
+    def add(self, chunk: Dict) -> None:
+        self.id = self.id or chunk.get("id")
+        self.model = self.model or chunk.get("model")
+        self.created = chunk.get("created") or self.created
+        for choice in chunk.get("choices") or []:
+            if choice.get("index", 0) != 0:
+                continue
+            content = (choice.get("delta") or {}).get("content")
+            if content:
+                self.content.append(content)
+                self.content_chunks += 1
+            if choice.get("finish_reason"):
+                self.finish_reason = choice["finish_reason"]
+        if chunk.get("usage"):
+            self.usage = chunk["usage"]
+
+    def _estimated_usage(self) -> Dict:
+        model = self.model or self.request.model
+        prompt_tokens = count_message_tokens(self.request.messages, model)
+        completion_tokens = max(
+            count_text_tokens("".join(self.content), model), self.content_chunks
+        )
+        return {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+        }
+
+    def to_completion(self) -> Completion:
+        return Completion.from_text(
+            self.id or "llmhub-stream",
+            self.model or self.request.model,
+            self.created,
+            "".join(self.content),
+            CompletionUsage.from_dict(self.usage or self._estimated_usage()),
+            finish_reason=self.finish_reason,
+        )
+
+
+class SSEPassthrough:
+    """
+    An upstream `text/event-stream` response relayed to the client as is.
+
+    Returned instead of a chunk iterator by adapters that forward requests to
+    OpenAI-compatible endpoints without going through an SDK.
+    """
+
+    def __init__(self, response: httpx.Response):
+        self.response = response
+
+    def __aiter__(self) -> AsyncIterator[bytes]:
+        return self.response.aiter_bytes()
+
+    async def aclose(self) -> None:
+        await self.response.aclose()
+
+
+async def _finish(
+    accumulator: StreamAccumulator,
+    on_complete: Callable[[Completion], Awaitable[None]],
+    wait: bool = False,
+) -> None:
+    task = asyncio.get_running_loop().create_task(
+        on_complete(accumulator.to_completion())
+    )
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+    if wait:
+        # Shielded: a client that disconnects does not cancel the callback.
+        await asyncio.shield(task)
+
+
+async def _encode_sse(
+    chunks: AsyncIterator[Dict],
+    request,
+    on_complete: Callable[[Completion], Awaitable[None]],
+    transcript: bool = False,
+) -> AsyncIterator[bytes]:
+    accumulator = StreamAccumulator(request)
+    try:
+        async for chunk in chunks:
+            accumulator.add(chunk)
+            yield sse_event(chunk)
+        yield SSE_DONE
+    except Exception as e:
+        logging.error(f"Error while streaming completion: {e}")
+        yield sse_event({"error": {"message": str(e), "type": "upstream_error"}})
+    finally:
+        # Releases the upstream connection when the client disconnects early.
+        if hasattr(chunks, "aclose"):
+            await chunks.aclose()
+        await _finish(accumulator, on_complete, transcript)
+
+
+async def _relay_sse(
+    stream: SSEPassthrough,
+    request,
+    on_complete: Callable[[Completion], Awaitable[None]],
+    transcript: bool = False,
+) -> AsyncIterator[bytes]:
+    accumulator = StreamAccumulator(request)
+    # Unless the content is needed, only the first chunk (id and model) and the
+    # usage chunk are decoded. The others are kept undecoded in case no usage
+    # chunk arrives and it has to be estimated from the content.
+    skipped = []
+    buffer = b""
+
+    def tap(event: bytes) -> None:
+        for line in event.split(b"\n"):
+            if not line.startswith(b"data:"):
+                continue
+            data = line[5:].strip()
+            if data == b"[DONE]":
+                continue
+            if transcript or accumulator.id is None or USAGE_FIELD.search(data):
+                try:
+                    accumulator.add(orjson.loads(data))
+                except orjson.JSONDecodeError:
+                    pass
+            else:
+                skipped.append(data)
+
+    try:
+        async for data in stream:
+            yield data
+            buffer = (buffer + data).replace(b"\r\n", b"\n")
+            *events, buffer = buffer.split(b"\n\n")
+            for event in events:
+                tap(event)
+    except Exception as e:
+        logging.error(f"Error while streaming completion: {e}")
+        yield sse_event({"error": {"message": str(e), "type": "upstream_error"}})
+    finally:
+        await stream.aclose()
+        if accumulator.usage is None:
+            for data in skipped:
+                try:
+                    accumulator.add(orjson.loads(data))
+                except orjson.JSONDecodeError:
+                    pass
+        await _finish(accumulator, on_complete, transcript)
+
+
+def stream_sse(
+    chunks,
+    request,
+    on_complete: Callable[[Completion], Awaitable[None]],
+    transcript: bool = False,
+) -> AsyncIterator[bytes]:
+    """
+    Relay a streamed completion as server-sent events, ending with `[DONE]`.
+
+    Chunk dictionaries are encoded one event each. An `SSEPassthrough` is
+    relayed byte for byte, with only the chunks needed for usage decoded.
+
+    Once the stream finishes (or fails, or the client disconnects) the
+    accumulated completion is handed to `on_complete` in the background so usage
+    is still logged without holding up the response.
+
+    :param chunks: Async iterator of `chat.completion.chunk` dictionaries, or an
+        `SSEPassthrough`.
+    :param request: The originating CreateChatCompletionRequest.
+    :param on_complete: Coroutine function receiving the accumulated Completion.
+    :param transcript: The completion is stored as the next turn of a thread:
+        relayed chunks are all decoded, so it carries the full reply, and
+        `on_complete` is awaited before the response ends, so the turn is stored
+        before the client can send the next one.
+    """
+    if isinstance(chunks, SSEPassthrough):
+        return _relay_sse(chunks, request, on_complete, transcript)
+    return _encode_sse(chunks, request, on_complete, transcript)
@@ -0,0 +1,59 @@
+import os
+import time
+import uuid
+import asyncio
+from service.chat.completion import Completion, CompletionUsage
+from service.chat.streaming import completion_chunk
+from utils.tokenizer import count_message_tokens, count_text_tokens
+
+STUB_LATENCY = float(os.getenv("STUB_PROVIDER_LATENCY", "0.05"))
+STUB_FAILURE_MARKER = "[stub-fail]"
+
+
+class StubProviderError(Exception):
+    status_code = 503
+
+
+async def Stub_Chat_Completions(request):
+    """Answer chat completions locally without calling any provider.
+
+    Echoes the last message after STUB_PROVIDER_LATENCY seconds, with usage
+    counted by the local tokenizer. A message containing "[stub-fail]" fails
+    with a 503-style error. Used to exercise routing, batching and limits end to
+    end with no credentials.
+
+    Args:
+        request: The CreateChatCompletionRequest to answer.
+    Returns:
+        response: A Completion, or an async iterator of chunk dictionaries
+            when `request.stream` is set.
+    """
+    await asyncio.sleep(STUB_LATENCY)
+    prompt = request.messages[-1].content
+    if STUB_FAILURE_MARKER in prompt:
+        raise StubProviderError("Stub provider failure requested.")
+
+    content = f"Echo: {prompt}"
+    id = f"chatcmpl-stub-{uuid.uuid4().hex[:12]}"
+    created = int(time.time())
+    prompt_tokens = count_message_tokens(request.messages)
+    completion_tokens = count_text_tokens(content)
+
+    if request.stream:
+
+        async def chunks():
+            for word in content.split(" "):
+                yield completion_chunk(id, "stub", created, {"content": word + " "})
+            yield completion_chunk(id, "stub", created, {}, finish_reason="stop")
+
+        return chunks()
+
+    return Completion.from_text(
+        id,
+        "stub",
+        created,
+        content,
+        CompletionUsage(
+            prompt_tokens, completion_tokens, prompt_tokens + completion_tokens
+        ),
+    )
@@ -0,0 +1,271 @@
+import os
+import asyncio
+import logging
+import importlib.util
+
+
+import httpx
+
+
+from typing import Dict, List
+
+
+from utils.telemetry import on_upstream_request, on_upstream_response
+
+
+HTTP2_AVAILABLE = importlib.util.find_spec("h2") is not None
+
+PROVIDERS = {
+    "azure_openai": "AZURE_OPENAI",
+    "azure_meta": "AZURE_META",
+    "azure_mistral": "AZURE_MISTRAL",
+    "gemini": "GEMINI",
+}
+
+
+# Most inputs one upstream embeddings call accepts, where it is not 2048.
+EMBEDDING_MAX_BATCH = {"gemini": 100}
+
+# The SDK module each provider's client comes from.
+SDK_MODULES = {
+    "azure_openai": "openai",
+    "azure_meta": "openai",
+    "azure_mistral": "openai",
+    "gemini": "google.generativeai",
+}
+
+
+def _env_int(name: str, default: int) -> int:
+    value = os.getenv(name)
+    return int(value) if value else default
+
+
+def _env_float(name: str, default: float) -> float:
+    value = os.getenv(name)
+    return float(value) if value else default
+
+
+def provider_settings(provider: str) -> Dict:
+    """
+    Read the connection settings for a provider from the environment.
+
+    Every setting can be overridden per provider with an env var prefixed by the
+    provider's env prefix, e.g. AZURE_OPENAI_MAX_CONNECTIONS=200.
+
+    :param provider: Provider name, one of PROVIDERS.
+    :return: Dictionary of pool limits, timeouts and upstream rate limits.
+    """
+    prefix = PROVIDERS[provider]
+    return {
+        "max_connections": _env_int(f"{prefix}_MAX_CONNECTIONS", 100),
+        "max_keepalive_connections": _env_int(f"{prefix}_MAX_KEEPALIVE", 20),
+        "keepalive_expiry": _env_float(f"{prefix}_KEEPALIVE_EXPIRY", 60.0),
+        "connect_timeout": _env_float(f"{prefix}_CONNECT_TIMEOUT", 5.0),
+        "timeout": _env_float(f"{prefix}_TIMEOUT", 120.0),
+        "http2": os.getenv(f"{prefix}_HTTP2", "true").lower() == "true",
+        "rate_limit_rps": _env_float(f"{prefix}_RATE_LIMIT_RPS", 0.0),
+        "rate_limit_tpm": _env_float(f"{prefix}_RATE_LIMIT_TPM", 0.0),
+        "batch_concurrency": _env_int(f"{prefix}_BATCH_CONCURRENCY", 16),
+        "embedding_max_batch": _env_int(
+            f"{prefix}_EMBEDDING_MAX_BATCH", EMBEDDING_MAX_BATCH.get(provider, 2048)
+        ),
+    }
+
+
+class ConnectionStats:
+    """
+    Counts upstream requests and newly opened connections for one provider.
+
+    A request that does not open a TCP connection was served from the keep-alive
+    pool (or multiplexed onto an existing HTTP/2 connection).
+    """
+
+    def __init__(self):
+        self.requests = 0
+        self.connections_opened = 0
+
+    def trace(self, event_name: str, info: dict) -> None:
+        if event_name == "connection.connect_tcp.started":
+            self.connections_opened += 1
+
+    async def on_request(self, request: httpx.Request) -> None:
+        self.requests += 1
+        request.extensions["trace"] = self._async_trace
+
+    async def _async_trace(self, event_name: str, info: dict) -> None:
+        self.trace(event_name, info)
+
+    def snapshot(self) -> Dict:
+        reused = max(self.requests - self.connections_opened, 0)
+        return {
+            "requests": self.requests,
+            "connections_opened": self.connections_opened,
+            "connections_reused": reused,
+            "reuse_ratio": round(reused / self.requests, 4) if self.requests else 0.0,
+        }
+
+
+class ProviderClients:
+    """
+    Registry of long-lived upstream clients, one per provider.
+
+    Clients are created once (normally from the FastAPI lifespan) and share a
+    keep-alive connection pool for the lifetime of the worker. Call `aclose()` at
+    shutdown to release the pools.
+    """
+
+    def __init__(self):
+        self._clients = {}
+        self._http_clients = {}
+        self.stats = {
+            name: ConnectionStats() for name in PROVIDERS if name != "gemini"
+        }
+
+    def _http_client(self, provider: str) -> httpx.AsyncClient:
+        settings = provider_settings(provider)
+        stats = self.stats[provider]
+        client = httpx.AsyncClient(
+            http2=settings["http2"] and HTTP2_AVAILABLE,
+            limits=httpx.Limits(
+                max_connections=settings["max_connections"],
+                max_keepalive_connections=settings["max_keepalive_connections"],
+                keepalive_expiry=settings["keepalive_expiry"],
+            ),
+            timeout=httpx.Timeout(
+                settings["timeout"], connect=settings["connect_timeout"]
+            ),
+            event_hooks={
+                "request": [stats.on_request, on_upstream_request],
+                "response": [on_upstream_response],
+            },
+        )
+        self._http_clients[provider] = client
+        return client
+
+    def http(self, provider: str) -> httpx.AsyncClient:
+        """
+        Return the pooled httpx client for an HTTP provider, creating it on
+        first use. Its SDK client, if any, sends through the same pool.
+
+        :param provider: Provider name, one of PROVIDERS other than gemini.
+        """
+        client = self._http_clients.get(provider)
+        if client is None:
+            client = self._http_client(provider)
+        return client
+
+    def _create(self, provider: str):
+        # The SDKs are imported on first use: together they are most of the
+        # app's import time, and a worker may never call some providers.
+        if provider == "azure_openai":
+            from openai import AsyncAzureOpenAI
+
+            return AsyncAzureOpenAI(
+                azure_endpoint=os.getenv("AZURE_OPENAI_ENDPOINT"),
+                api_key=os.getenv("AZURE_OPENAI_API_KEY"),
+                api_version=os.getenv("AZURE_OPENAI_api_version"),
+                http_client=self.http(provider),
+            )
+        if provider == "azure_meta":
+            from openai import AsyncOpenAI
+
+            return AsyncOpenAI(
+                base_url=os.getenv("AZURE_META_ENDPOINT"),
+                api_key=os.getenv("AZURE_META_API_KEY"),
+                http_client=self.http(provider),
+            )
+        if provider == "azure_mistral":
+            from openai import AsyncOpenAI
+
+            return AsyncOpenAI(
+                base_url=os.getenv("AZURE_MISTRAL_ENDPOINT"),
+                api_key=os.getenv("AZURE_MISTRAL_API_KEY"),
+                http_client=self.http(provider),
+            )
+        if provider == "gemini":
+            # The Gemini SDK keeps its own gRPC channel once configured, so the
+            # registry only has to make sure configure() runs exactly once.
+            import google.generativeai as genai
+
+            genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
+            return genai
+        raise ValueError(f"Unknown provider: {provider}")
+
+    def get(self, provider: str):
+        """
+        Return the shared client for a provider, creating it on first use.
+
+        :param provider: Provider name, one of PROVIDERS.
+        :return: The provider's SDK client.
+        """
+        client = self._clients.get(provider)
+        if client is None:
+            client = self._create(provider)
+            self._clients[provider] = client
+            logging.info(f"Created upstream client for {provider}.")
+        return client
+
+    def configured(self) -> List[str]:
+        """
+        Providers whose credentials are set in the environment.
+        """
+        configured = []
+        for provider, prefix in PROVIDERS.items():
+            if provider == "gemini":
+                if os.getenv("GEMINI_API_KEY"):
+                    configured.append(provider)
+            elif os.getenv(f"{prefix}_ENDPOINT") and os.getenv(f"{prefix}_API_KEY"):
+                configured.append(provider)
+        return configured
+
+    async def start(self) -> None:
+        """
+        Create every configured provider client up front.
+
+        The SDKs are imported in a worker thread, so the event loop keeps
+        serving while they load; the clients are then created on the loop.
+        """
+        for provider in self.configured():
+            if provider not in self._clients:
+                await asyncio.to_thread(importlib.import_module, SDK_MODULES[provider])
+            self.get(provider)
+
+    async def warm(self, timeout: float = 5.0) -> None:
+        """
+        Open a connection to every HTTP provider's endpoint, so the first request
+        finds DNS resolved and a TCP/TLS connection waiting in the keep-alive
+        pool. Gemini is skipped: its SDK opens its gRPC channel on first call.
+
+        :param timeout: Seconds to wait for each endpoint.
+        """
+
+        async def connect(provider: str, client: httpx.AsyncClient) -> None:
+            endpoint = os.getenv(f"{PROVIDERS[provider]}_ENDPOINT")
+            try:
+                # Any response will do; only the pooled connection is kept.
+                await client.head(endpoint, timeout=timeout)
+            except httpx.HTTPError as e:
+                logging.warning(f"Could not pre-connect to {provider}: {e!r}")
+
+        await asyncio.gather(
+            *(
+                connect(provider, client)
+                for provider, client in list(self._http_clients.items())
+            )
+        )
+
+    async def aclose(self) -> None:
+        """
+        Close every connection pool and log the final reuse metrics.
+        """
+        logging.info(f"Upstream connection metrics: {self.metrics()}")
+        for client in self._http_clients.values():
+            await client.aclose()
+        self._http_clients.clear()
+        self._clients.clear()
+
+    def metrics(self) -> Dict:
+        return {name: stats.snapshot() for name, stats in self.stats.items()}
+
+
+provider_clients = ProviderClients()
@@ -0,0 +1,36 @@
+import os
+import base64
+import numpy as np
+from service.clients import provider_clients
+
+AZURE_OPENAI_EMBEDDING_MODEL = os.getenv(
+    "AZURE_OPENAI_EMBEDDING_MODEL", "text-embedding-3-small"
+)
+
+
+async def Azure_OpenAI_Embeddings(inputs, model=None, dimensions=None):
+    """Generate embeddings using an Azure OpenAI embedding deployment.
+
+    Args:
+        inputs: A list of strings, or a list of token arrays, to embed.
+        model: The deployment to use; defaults to AZURE_OPENAI_EMBEDDING_MODEL.
+        dimensions: Optional number of output dimensions (text-embedding-3 models).
+
+    Returns:
+        numpy.ndarray: A float32 matrix with one embedding row per input, in input order.
+    """
+    client = provider_clients.get("azure_openai")
+    kwargs = {"dimensions": dimensions} if dimensions else {}
+    # base64 halves the upstream payload and decodes straight into float32.
+    response = await client.embeddings.create(
+        model=model or AZURE_OPENAI_EMBEDDING_MODEL,
+        input=inputs,
+        encoding_format="base64",
+        **kwargs,
+    )
+    return np.stack(
+        [
+            np.frombuffer(base64.b64decode(item.embedding), dtype="<f4")
+            for item in sorted(response.data, key=lambda d: d.index)
+        ]
+    )
@@ -0,0 +1,190 @@
+import os
+import base64
+import numpy as np
+
+
+from typing import Hashable, List
+
+
+from service.chat.resilience import is_client_error
+from service.chat.service_router import rate_limiter
+from service.clients import provider_settings
+from service.embeddings.azure_openai import (
+    AZURE_OPENAI_EMBEDDING_MODEL,
+    Azure_OpenAI_Embeddings,
+)
+from service.embeddings.google_gemini import Google_Gemini_Embeddings
+from service.embeddings.stub import Stub_Embeddings
+from pydantic_types.embeddings import (
+    CreateEmbeddingRequest,
+    CreateEmbeddingResponse,
+    Embedding,
+    EmbeddingUsage,
+)
+from utils.micro_batch import MicroBatcher
+from utils.telemetry import set_route, stage, upstream_call
+from utils.tokenizer import count_text_tokens
+
+
+# Model name -> (provider, adapter).
+EMBEDDING_MODELS = {
+    "text-embedding-3-small": ("azure_openai", Azure_OpenAI_Embeddings),
+    "text-embedding-3-large": ("azure_openai", Azure_OpenAI_Embeddings),
+    "text-embedding-ada-002": ("azure_openai", Azure_OpenAI_Embeddings),
+    "text-embedding-004": ("gemini", Google_Gemini_Embeddings),
+}
+
+if os.getenv("STUB_PROVIDER_ENABLED", "false").lower() == "true":
+    EMBEDDING_MODELS = {
+        model: (provider, Stub_Embeddings)
+        for model, (provider, _) in EMBEDDING_MODELS.items()
+    }
+
+
+# Most inputs one request may carry, as in the OpenAI API.
+MAX_INPUTS = 2048
+# Longest input, in tokens, each model accepts.
+MAX_INPUT_TOKENS = {
+    "text-embedding-3-small": 8191,
+    "text-embedding-3-large": 8191,
+    "text-embedding-ada-002": 8191,
+    "text-embedding-004": 2048,
+}
+
+
+class InvalidEmbeddingRequest(ValueError):
+    status_code = 400
+
+
+class UnknownEmbeddingModel(InvalidEmbeddingRequest):
+    pass
+
+
+def input_tokens(item) -> int:
+    return len(item) if isinstance(item, list) else count_text_tokens(item)
+
+
+async def _embed_batch(key: Hashable, items: List) -> List[np.ndarray]:
+    model, dimensions, _ = key
+    provider, adapter = EMBEDDING_MODELS[model]
+    # One upstream request per batch, however many callers it serves.
+    await rate_limiter.acquire_provider(
+        provider, sum(input_tokens(item) for item in items)
+    )
+    with upstream_call(model, provider):
+        return list(await adapter(items, model=model, dimensions=dimensions))
+
+
+embedding_batcher = MicroBatcher(
+    _embed_batch,
+    max_wait=float(os.getenv("EMBEDDING_BATCH_WINDOW", "0.005")),
+    # A batch rejected upstream is retried per request, so an input that slipped
+    # past validation only fails the request that sent it.
+    isolate=is_client_error,
+)
+
+
+def normalize_input(request: CreateEmbeddingRequest) -> List:
+    """
+    The request's inputs as a list of strings or a list of token arrays.
+    """
+    if isinstance(request.input, str):
+        return [request.input]
+    if request.input and isinstance(request.input[0], int):
+        return [request.input]
+    return list(request.input)
+
+
+def embedding_tokens(request: CreateEmbeddingRequest) -> int:
+    return sum(input_tokens(item) for item in normalize_input(request))
+
+
+def check_input_lengths(model: str, inputs: List) -> None:
+    """
+    :raises InvalidEmbeddingRequest: If an input is longer than the model accepts.
+    """
+    limit = MAX_INPUT_TOKENS.get(model)
+    if limit is None:
+        return
+    for index, item in enumerate(inputs):
+        # A text of n characters is at most 4n UTF-8 bytes, so at most 4n tokens.
+        if not isinstance(item, list) and len(item) * 4 <= limit:
+            continue
+        tokens = input_tokens(item)
+        if tokens > limit:
+            raise InvalidEmbeddingRequest(
+                f"input[{index}] is {tokens} tokens long; {model} accepts at most "
+                f"{limit} tokens per input."
+            )
+
+
+async def embed(model: str, inputs: List, dimensions: int = None) -> List[np.ndarray]:
+    """
+    Embed inputs, sharing the upstream call with concurrent requests for the
+    same model and dimensions.
+
+    :param model: An EMBEDDING_MODELS key.
+    :param inputs: Strings, or token arrays, to embed.
+    :param dimensions: Optional number of output dimensions.
+    :return: One float32 vector per input, in order.
+    :raises UnknownEmbeddingModel: If the model is not served.
+    :raises InvalidEmbeddingRequest: If an input is longer than the model accepts.
+    """
+    if model not in EMBEDDING_MODELS:
+        raise UnknownEmbeddingModel(
+            f"Unknown embedding model {model}. Available: {', '.join(EMBEDDING_MODELS)}."
+        )
+    # Checked before batching, so a bad input cannot fail other callers' requests.
+    check_input_lengths(model, inputs)
+    provider = EMBEDDING_MODELS[model][0]
+    kind = "tokens" if isinstance(inputs[0], list) else "text"
+    return await embedding_batcher.submit(
+        (model, dimensions, kind),
+        inputs,
+        provider_settings(provider)["embedding_max_batch"],
+    )
+
+
+async def embed_texts(texts: List[str]) -> List[np.ndarray]:
+    """
+    Embed texts with the default embedding model (used by the semantic cache).
+    """
+    model = (
+        AZURE_OPENAI_EMBEDDING_MODEL
+        if AZURE_OPENAI_EMBEDDING_MODEL in EMBEDDING_MODELS
+        else "text-embedding-3-small"
+    )
+    return await embed(model, texts)
+
+
+def pack_embedding(vector: np.ndarray, encoding_format: str):
+    if encoding_format == "base64":
+        return base64.b64encode(vector.astype("<f4", copy=False).tobytes()).decode()
+    return vector.tolist()
+
+
+async def create_embeddings(request: CreateEmbeddingRequest) -> CreateEmbeddingResponse:
+    """
+    Serve a /v1/embeddings request.
+
+    :raises InvalidEmbeddingRequest: If the input or model is invalid.
+    """
+    inputs = normalize_input(request)
+    if not inputs or any(len(item) == 0 for item in inputs):
+        raise InvalidEmbeddingRequest("input must not be empty.")
+    if len(inputs) > MAX_INPUTS:
+        raise InvalidEmbeddingRequest(f"input can hold at most {MAX_INPUTS} items.")
+    with stage("embed"):
+        vectors = await embed(request.model, inputs, request.dimensions)
+    set_route(request.model, EMBEDDING_MODELS[request.model][0])
+    prompt_tokens = embedding_tokens(request)
+    return CreateEmbeddingResponse(
+        data=[
+            Embedding(
+                index=i, embedding=pack_embedding(vector, request.encoding_format)
+            )
+            for i, vector in enumerate(vectors)
+        ],
+        model=request.model,
+        usage=EmbeddingUsage(prompt_tokens=prompt_tokens, total_tokens=prompt_tokens),
+    )
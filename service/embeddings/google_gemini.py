@@ -0,0 +1,26 @@
+import numpy as np
+from service.clients import provider_clients
+
+GEMINI_EMBEDDING_MODEL = "text-embedding-004"
+
+
+async def Google_Gemini_Embeddings(inputs, model=None, dimensions=None):
+    """Generate embeddings using a Google Gemini embedding model.
+
+    Args:
+        inputs: A list of strings to embed. Token arrays are not supported.
+        model: The Gemini embedding model; defaults to text-embedding-004.
+        dimensions: Optional number of output dimensions.
+
+    Returns:
+        numpy.ndarray: A float32 matrix with one embedding row per input, in input order.
+    """
+    if any(not isinstance(text, str) for text in inputs):
+        raise ValueError("Gemini embedding models only accept text input.")
+    genai = provider_clients.get("gemini")
+    response = await genai.embed_content_async(
+        model=f"models/{model or GEMINI_EMBEDDING_MODEL}",
+        content=inputs,
+        output_dimensionality=dimensions,
+    )
+    return np.asarray(response["embedding"], dtype=np.float32)
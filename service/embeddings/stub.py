@@ -0,0 +1,31 @@
+import asyncio
+import hashlib
+import numpy as np
+from service.chat.stub import STUB_LATENCY
+
+STUB_DIMENSIONS = 1536
+
+
+async def Stub_Embeddings(inputs, model=None, dimensions=None):
+    """Generate deterministic embeddings locally without calling any provider.
+
+    Each input maps to a fixed unit vector seeded from its hash, so equal inputs
+    embed identically. Used with STUB_PROVIDER_ENABLED to exercise the
+    embeddings endpoint and its batching with no credentials.
+
+    Args:
+        inputs: A list of strings, or a list of token arrays, to embed.
+        model: Ignored.
+        dimensions: Optional number of output dimensions (1536 by default).
+
+    Returns:
+        numpy.ndarray: A float32 matrix with one embedding row per input, in input order.
+    """
+    await asyncio.sleep(STUB_LATENCY)
+    rows = []
+    for item in inputs:
+        seed = hashlib.sha256(str(item).encode()).digest()[:8]
+        rng = np.random.default_rng(int.from_bytes(seed, "little"))
+        row = rng.standard_normal(dimensions or STUB_DIMENSIONS).astype(np.float32)
+        rows.append(row / np.linalg.norm(row))
+    return np.stack(rows)
@@ -0,0 +1,186 @@
+import os
+import time
+import uuid
+import asyncio
+import logging
+
+
+from typing import AsyncIterator, List, Optional, Tuple
+
+
+from pydantic_types.batch import OpenAIFile
+from service.files.streaming import MultipartError, receive_multipart
+from utils.postgres import (
+    delete_file_record,
+    fetch_file_record,
+    insert_file_record,
+    list_file_records,
+)
+
+
+READ_CHUNK_SIZE = 1024 * 1024
+# Longest JSONL line accepted; bounds the memory a single malformed line can take.
+MAX_LINE_BYTES = int(os.getenv("FILE_MAX_LINE_BYTES", str(16 * 1024 * 1024)))
+MAX_FILE_BYTES = int(os.getenv("FILE_MAX_BYTES", str(512 * 1024 * 1024)))
+FILE_PURPOSES = {"batch"}
+
+
+class JsonlLineTooLong(ValueError):
+    def __init__(self, line_no: int):
+        super().__init__(f"Line {line_no} is longer than {MAX_LINE_BYTES} bytes.")
+        self.line_no = line_no
+
+
+def new_file_id() -> str:
+    return f"file-{uuid.uuid4().hex}"
+
+
+async def iter_jsonl_lines(
+    path: str, chunk_size: int = READ_CHUNK_SIZE, max_line: int = MAX_LINE_BYTES
+) -> AsyncIterator[Tuple[int, bytes]]:
+    """
+    Yield the non-empty lines of a JSONL file with their 1-based line numbers.
+
+    The file is read in fixed-size chunks on a worker thread, so memory stays
+    bounded by the chunk size and `max_line`.
+
+    :raises JsonlLineTooLong: If a line is longer than `max_line` bytes.
+    """
+    line_no = 0
+    remainder = b""
+    with open(path, "rb") as f:
+        while True:
+            chunk = await asyncio.to_thread(f.read, chunk_size)
+            if not chunk:
+                break
+            lines = (remainder + chunk).split(b"\n")
+            remainder = lines.pop()
+            for line in lines:
+                line_no += 1
+                if len(line) > max_line:
+                    raise JsonlLineTooLong(line_no)
+                if line.strip():
+                    yield line_no, line
+            if len(remainder) > max_line:
+                raise JsonlLineTooLong(line_no + 1)
+    if remainder.strip():
+        yield line_no + 1, remainder
+
+
+class JsonlWriter:
+    """
+    Appends JSON lines to a file, buffering in memory and writing on a worker
+    thread once `buffer_size` bytes are pending.
+    """
+
+    def __init__(self, path: str, buffer_size: int = 256 * 1024):
+        self.path = path
+        self.buffer_size = buffer_size
+        self.buffer: List[bytes] = []
+        self.pending = 0
+        self.lines = 0
+        self._file = None
+
+    async def write(self, line: bytes) -> None:
+        self.buffer.append(line + b"\n")
+        self.pending += len(line) + 1
+        self.lines += 1
+        if self.pending >= self.buffer_size:
+            await self.flush()
+
+    async def flush(self) -> None:
+        if not self.buffer:
+            return
+        data, self.buffer, self.pending = b"".join(self.buffer), [], 0
+        await asyncio.to_thread(self._write, data)
+
+    def _write(self, data: bytes) -> None:
+        if self._file is None:
+            self._file = open(self.path, "ab")
+        self._file.write(data)
+
+    async def close(self) -> None:
+        await self.flush()
+        if self._file is not None:
+            await asyncio.to_thread(self._file.close)
+            self._file = None
+
+
+class FileStore:
+    """
+    Uploaded and generated files: contents on disk under `root`, metadata in
+    Postgres. Point FILE_STORE_DIR at shared storage (e.g. an Azure Files mount)
+    when running more than one instance.
+    """
+
+    def __init__(self, pool, root: str):
+        self.pool = pool
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+
+    def path(self, file_id: str) -> str:
+        return os.path.join(self.root, os.path.basename(file_id))
+
+    def new_file(self) -> Tuple[str, str]:
+        """
+        Reserve an ID and path for a file that will be written and then registered.
+        """
+        file_id = new_file_id()
+        return file_id, self.path(file_id)
+
+    async def save_upload(self, user_id: str, request) -> OpenAIFile:
+        """
+        Store a file sent as multipart/form-data with `file` and `purpose`
+        fields, streaming it to disk as it arrives.
+
+        :param user_id: The owner's userId.
+        :param request: The incoming starlette Request.
+        :return: The stored file's metadata.
+        :raises MultipartError: If the request is malformed or the purpose unsupported.
+        """
+        file_id, path = self.new_file()
+        upload = await receive_multipart(request, "file", path, MAX_FILE_BYTES)
+        purpose = upload.fields.get("purpose")
+        if purpose not in FILE_PURPOSES:
+            os.remove(path)
+            raise MultipartError(
+                f"purpose must be one of: {', '.join(sorted(FILE_PURPOSES))}."
+            )
+        return await self.register(
+            user_id, file_id, upload.filename or file_id, purpose
+        )
+
+    async def register(
+        self, user_id: str, file_id: str, filename: str, purpose: str
+    ) -> OpenAIFile:
+        """
+        Record the metadata of a file already written to `path(file_id)`.
+        """
+        file = OpenAIFile(
+            id=file_id,
+            bytes=os.path.getsize(self.path(file_id)),
+            created_at=int(time.time()),
+            filename=filename,
+            purpose=purpose,
+        )
+        await insert_file_record(self.pool, user_id, file.model_dump())
+        return file
+
+    async def get(self, user_id: str, file_id: str) -> Optional[OpenAIFile]:
+        record = await fetch_file_record(self.pool, file_id, user_id)
+        return OpenAIFile(**record) if record else None
+
+    async def list(self, user_id: str, purpose: str = None) -> List[OpenAIFile]:
+        return [
+            OpenAIFile(**record)
+            for record in await list_file_records(self.pool, user_id, purpose)
+        ]
+
+    async def delete(self, user_id: str, file_id: str) -> bool:
+        if not await delete_file_record(self.pool, file_id, user_id):
+            return False
+        try:
+            os.remove(self.path(file_id))
+        except FileNotFoundError:
+            logging.error(f"File {file_id} had no contents on disk.")
+        return True
@@ -0,0 +1,259 @@
+import os
+import re
+import asyncio
+
+
+from typing import Dict, Optional, Tuple
+
+
+import multipart
+from multipart.multipart import parse_options_header
+from starlette.requests import Request
+from starlette.responses import FileResponse
+
+
+# Form fields other than the file are small (e.g. `purpose`); cap them so a
+# malformed request cannot grow memory without bound.
+MAX_FIELD_BYTES = 64 * 1024
+RANGE_PATTERN = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+class MultipartError(Exception):
+    """
+    Raised when a multipart upload is malformed.
+    """
+
+    status_code = 400
+
+
+class UploadTooLarge(MultipartError):
+    status_code = 413
+
+
+class ReceivedUpload:
+    """
+    Result of streaming a multipart request to disk.
+    """
+
+    def __init__(self):
+        self.fields: Dict[str, str] = {}
+        self.filename: Optional[str] = None
+        self.bytes = 0
+
+
+async def receive_multipart(
+    request: Request, file_field: str, path: str, max_bytes: int
+) -> ReceivedUpload:
+    """
+    Parse a multipart/form-data request as it arrives, writing the contents of
+    `file_field` straight to `path`.
+
+    Unlike starlette's form parser, nothing is spooled to a temporary file first:
+    each network chunk is parsed and appended to the target on a worker thread,
+    so memory stays bounded by the size of one chunk.
+
+    :param request: The incoming request.
+    :param file_field: Name of the form field holding the file.
+    :param path: Where to write the file's contents.
+    :param max_bytes: Largest accepted file size.
+    :return: The other form fields and the file's name and size.
+    :raises MultipartError: If the body is not valid multipart or lacks the file.
+    :raises UploadTooLarge: If the file is larger than `max_bytes`.
+    """
+    _, params = parse_options_header(request.headers.get("Content-Type", ""))
+    boundary = params.get(b"boundary")
+    if not boundary:
+        raise MultipartError("Expected a multipart/form-data request.")
+
+    received = ReceivedUpload()
+    state = {"name": b"", "value": b"", "disposition": b"", "field": None}
+    field_data = bytearray()
+    pending = []
+    found = False
+
+    def on_part_begin():
+        state["disposition"] = b""
+        field_data.clear()
+
+    def on_header_field(data, start, end):
+        state["name"] += data[start:end]
+
+    def on_header_value(data, start, end):
+        state["value"] += data[start:end]
+
+    def on_header_end():
+        if state["name"].lower() == b"content-disposition":
+            state["disposition"] = state["value"]
+        state["name"], state["value"] = b"", b""
+
+    def on_headers_finished():
+        nonlocal found
+        _, options = parse_options_header(state["disposition"])
+        name = options.get(b"name", b"").decode("utf-8", "replace")
+        state["field"] = name
+        if name == file_field:
+            found = True
+            received.filename = options.get(b"filename", b"").decode("utf-8", "replace")
+
+    def on_part_data(data, start, end):
+        if state["field"] == file_field:
+            received.bytes += end - start
+            if received.bytes > max_bytes:
+                raise UploadTooLarge(f"Files can be at most {max_bytes} bytes.")
+            pending.append(data[start:end])
+        else:
+            field_data.extend(data[start:end])
+            if len(field_data) > MAX_FIELD_BYTES:
+                raise MultipartError(f"Form field {state['field']} is too large.")
+
+    def on_part_end():
+        if state["field"] != file_field:
+            received.fields[state["field"]] = field_data.decode("utf-8", "replace")
+
+    parser = multipart.MultipartParser(
+        boundary,
+        {
+            "on_part_begin": on_part_begin,
+            "on_part_data": on_part_data,
+            "on_part_end": on_part_end,
+            "on_header_field": on_header_field,
+            "on_header_value": on_header_value,
+            "on_header_end": on_header_end,
+            "on_headers_finished": on_headers_finished,
+        },
+    )
+
+    target = await asyncio.to_thread(open, path, "wb")
+    try:
+        async for chunk in request.stream():
+            try:
+                parser.write(chunk)
+            except MultipartError:
+                raise
+            except Exception as e:
+                raise MultipartError(f"Malformed multipart body: {e}")
+            if pending:
+                data = b"".join(pending)
+                pending.clear()
+                await asyncio.to_thread(target.write, data)
+        parser.finalize()
+    except BaseException:
+        await asyncio.to_thread(target.close)
+        os.remove(path)
+        raise
+    await asyncio.to_thread(target.close)
+
+    if not found:
+        os.remove(path)
+        raise MultipartError(f"The request has no `{file_field}` field.")
+    return received
+
+
+def parse_range(header: str, size: int) -> Optional[Tuple[int, int]]:
+    """
+    Parse a single-range `Range` header into an inclusive (start, end) pair.
+
+    :return: None when the header should be ignored (not a single byte range).
+    :raises ValueError: If the range cannot be satisfied for a file of `size` bytes.
+    """
+    match = RANGE_PATTERN.match(header.strip())
+    if match is None:
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        start, end = max(0, size - int(last)), size - 1
+    else:
+        start = int(first)
+        end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        raise ValueError(header)
+    return start, end
+
+
+class RangeFileResponse(FileResponse):
+    """
+    FileResponse with HTTP Range support that hands the file descriptor to the
+    server when it offers the ASGI `http.response.zerocopysend` extension, so
+    the kernel copies the file to the socket without passing through Python.
+    Servers without the extension get the file in chunks read on a worker
+    thread.
+    """
+
+    chunk_size = 1024 * 1024
+
+    async def __call__(self, scope, receive, send) -> None:
+        stat_result = await asyncio.to_thread(os.stat, self.path)
+        size = stat_result.st_size
+        self.set_stat_headers(stat_result)
+        self.headers["accept-ranges"] = "bytes"
+
+        start, end = 0, size - 1
+        headers = dict(scope["headers"])
+        range_header = headers.get(b"range", b"").decode("latin-1")
+        if_range = headers.get(b"if-range", b"").decode("latin-1")
+        if range_header and (not if_range or if_range == self.headers["etag"]):
+            try:
+                requested = parse_range(range_header, size)
+            except ValueError:
+                self.status_code = 416
+                self.headers["content-range"] = f"bytes */{size}"
+                self.headers["content-length"] = "0"
+                await send(
+                    {
+                        "type": "http.response.start",
+                        "status": 416,
+                        "headers": self.raw_headers,
+                    }
+                )
+                await send({"type": "http.response.body", "body": b""})
+                return
+            if requested is not None:
+                start, end = requested
+                self.status_code = 206
+                self.headers["content-range"] = f"bytes {start}-{end}/{size}"
+        count = end - start + 1 if size else 0
+        self.headers["content-length"] = str(count)
+
+        await send(
+            {
+                "type": "http.response.start",
+                "status": self.status_code,
+                "headers": self.raw_headers,
+            }
+        )
+        if scope["method"].upper() == "HEAD" or count == 0:
+            await send({"type": "http.response.body", "body": b""})
+            return
+
+        with open(self.path, "rb") as file:
+            if "http.response.zerocopysend" in scope.get("extensions", {}):
+                await send(
+                    {
+                        "type": "http.response.zerocopysend",
+                        "file": file.fileno(),
+                        "offset": start,
+                        "count": count,
+                    }
+                )
+                return
+            offset, remaining = start, count
+            while remaining > 0:
+                chunk = await asyncio.to_thread(
+                    os.pread, file.fileno(), min(self.chunk_size, remaining), offset
+                )
+                if not chunk:
+                    break
+                offset += len(chunk)
+                remaining -= len(chunk)
+                await send(
+                    {
+                        "type": "http.response.body",
+                        "body": chunk,
+                        "more_body": remaining > 0,
+                    }
+                )
+            if remaining > 0:
+                # The file shrank while it was being sent.
+                await send({"type": "http.response.body", "body": b""})
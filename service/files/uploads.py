@@ -0,0 +1,206 @@
+import os
+import time
+import uuid
+import shutil
+import asyncio
+import hashlib
+
+
+from typing import List, Optional
+
+
+from pydantic_types.upload import (
+    CompleteUploadRequest,
+    CreateUploadRequest,
+    Upload,
+    UploadPart,
+)
+from service.files.store import FILE_PURPOSES, READ_CHUNK_SIZE, FileStore
+from service.files.streaming import receive_multipart
+from utils.postgres import (
+    delete_upload_parts,
+    fetch_upload,
+    fetch_upload_parts,
+    insert_upload_part,
+    upsert_upload,
+)
+
+
+UPLOAD_TTL = 3600
+MAX_UPLOAD_BYTES = int(os.getenv("UPLOAD_MAX_BYTES", str(8 * 1024**3)))
+MAX_PART_BYTES = 64 * 1024 * 1024
+
+
+class UploadError(Exception):
+    """
+    Raised when an upload request cannot be applied to the upload's state.
+    """
+
+    status_code = 400
+
+
+def concatenate(paths: List[str], target: str) -> None:
+    """
+    Join part files into `target`, copying inside the kernel with
+    copy_file_range where the platform and filesystem support it.
+    """
+    with open(target, "wb") as out:
+        for path in paths:
+            with open(path, "rb") as part:
+                remaining = os.fstat(part.fileno()).st_size
+                if hasattr(os, "copy_file_range"):
+                    try:
+                        while remaining > 0:
+                            copied = os.copy_file_range(
+                                part.fileno(), out.fileno(), remaining
+                            )
+                            if copied == 0:
+                                break
+                            remaining -= copied
+                        continue
+                    except OSError:
+                        # Not supported across these filesystems; fall back.
+                        part.seek(os.fstat(part.fileno()).st_size - remaining)
+                shutil.copyfileobj(part, out, READ_CHUNK_SIZE)
+                out.flush()
+
+
+def md5_file(path: str) -> str:
+    digest = hashlib.md5(usedforsecurity=False)
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(READ_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class UploadManager:
+    """
+    Multi-part uploads for files too large to send in one request. Parts are
+    streamed to their own files under the file store; completing the upload
+    joins them into a regular file without reading them back into Python.
+    """
+
+    def __init__(self, pool, files: FileStore):
+        self.pool = pool
+        self.files = files
+
+    def part_dir(self, upload_id: str) -> str:
+        return os.path.join(self.files.root, "uploads", os.path.basename(upload_id))
+
+    def part_path(self, upload_id: str, part_id: str) -> str:
+        return os.path.join(self.part_dir(upload_id), os.path.basename(part_id))
+
+    async def create(self, user_id: str, body: CreateUploadRequest) -> Upload:
+        if body.purpose not in FILE_PURPOSES:
+            raise UploadError(
+                f"purpose must be one of: {', '.join(sorted(FILE_PURPOSES))}."
+            )
+        if body.bytes > MAX_UPLOAD_BYTES:
+            raise UploadError(f"Uploads can be at most {MAX_UPLOAD_BYTES} bytes.")
+        now = int(time.time())
+        upload = Upload(
+            id=f"upload_{uuid.uuid4().hex}",
+            created_at=now,
+            filename=body.filename,
+            bytes=body.bytes,
+            purpose=body.purpose,
+            mime_type=body.mime_type,
+            status="pending",
+            expires_at=now + UPLOAD_TTL,
+        )
+        os.makedirs(self.part_dir(upload.id), exist_ok=True)
+        await upsert_upload(self.pool, upload.model_dump(), user_id)
+        return upload
+
+    async def get(self, user_id: str, upload_id: str) -> Optional[Upload]:
+        data = await fetch_upload(self.pool, upload_id, user_id)
+        if data is None:
+            return None
+        upload = Upload(**data)
+        if upload.status == "pending" and time.time() >= upload.expires_at:
+            upload.status = "expired"
+            await self._discard(user_id, upload)
+        return upload
+
+    async def _pending(self, user_id: str, upload_id: str) -> Optional[Upload]:
+        upload = await self.get(user_id, upload_id)
+        if upload is not None and upload.status != "pending":
+            raise UploadError(f"Upload {upload_id} is already {upload.status}.")
+        return upload
+
+    async def add_part(
+        self, user_id: str, upload_id: str, request
+    ) -> Optional[UploadPart]:
+        """
+        Stream the `data` field of a multipart request into a new part.
+
+        :return: The part, or None if the upload does not exist.
+        """
+        upload = await self._pending(user_id, upload_id)
+        if upload is None:
+            return None
+        part = UploadPart(
+            id=f"part_{uuid.uuid4().hex}",
+            created_at=int(time.time()),
+            upload_id=upload_id,
+        )
+        received = await receive_multipart(
+            request, "data", self.part_path(upload_id, part.id), MAX_PART_BYTES
+        )
+        await insert_upload_part(self.pool, part.model_dump(), received.bytes)
+        return part
+
+    async def complete(
+        self, user_id: str, upload_id: str, body: CompleteUploadRequest
+    ) -> Optional[Upload]:
+        """
+        Join the given parts, in order, into a file.
+
+        :raises UploadError: If a part is unknown or the sizes do not add up.
+        """
+        upload = await self._pending(user_id, upload_id)
+        if upload is None:
+            return None
+        sizes = await fetch_upload_parts(self.pool, upload_id)
+        unknown = [part_id for part_id in body.part_ids if part_id not in sizes]
+        if unknown:
+            raise UploadError(f"Unknown parts: {', '.join(unknown)}.")
+        if len(set(body.part_ids)) != len(body.part_ids):
+            raise UploadError("part_ids must not repeat a part.")
+        total = sum(sizes[part_id] for part_id in body.part_ids)
+        if total != upload.bytes:
+            raise UploadError(
+                f"The parts hold {total} bytes but the upload expects {upload.bytes}."
+            )
+
+        file_id, path = self.files.new_file()
+        paths = [self.part_path(upload_id, part_id) for part_id in body.part_ids]
+        await asyncio.to_thread(concatenate, paths, path)
+        if body.md5 and await asyncio.to_thread(md5_file, path) != body.md5.lower():
+            os.remove(path)
+            raise UploadError("The uploaded bytes do not match the md5 checksum.")
+
+        upload.file = await self.files.register(
+            user_id, file_id, upload.filename, upload.purpose
+        )
+        upload.status = "completed"
+        await self._discard(user_id, upload)
+        return upload
+
+    async def cancel(self, user_id: str, upload_id: str) -> Optional[Upload]:
+        upload = await self._pending(user_id, upload_id)
+        if upload is None:
+            return None
+        upload.status = "cancelled"
+        await self._discard(user_id, upload)
+        return upload
+
+    async def _discard(self, user_id: str, upload: Upload) -> None:
+        """
+        Save the upload's final state and delete its parts.
+        """
+        await upsert_upload(self.pool, upload.model_dump(), user_id)
+        await delete_upload_parts(self.pool, upload.id)
+        await asyncio.to_thread(
+            shutil.rmtree, self.part_dir(upload.id), ignore_errors=True
+        )
@@ -0,0 +1,337 @@
+import json
+import time
+import uuid
+
+
+import asyncpg
+
+
+from cachetools import LRUCache
+from typing import Dict, List, Optional, Tuple
+
+
+from pydantic_types.chat import Message
+from pydantic_types.thread import (
+    MessageContent,
+    MessageObject,
+    MessageText,
+    ThreadObject,
+)
+from utils.postgres import (
+    delete_thread_record,
+    fetch_thread_messages,
+    insert_thread_messages,
+    insert_thread_record,
+    update_thread_metadata,
+)
+
+
+# Bytes charged to the hot tier per message on top of its content: the record,
+# the Message and their list slots.
+MESSAGE_OVERHEAD = 512
+
+
+class ThreadConflict(Exception):
+    """
+    Raised when messages cannot be appended because other writers keep taking
+    the thread's next positions.
+    """
+
+    status_code = 409
+
+
+class ThreadMessage:
+    """
+    A stored thread message, holding the chat `Message` sent upstream for it.
+    """
+
+    __slots__ = ("id", "created_at", "message", "metadata")
+
+    def __init__(
+        self, id: str, created_at: int, message: Message, metadata: Optional[Dict]
+    ):
+        self.id = id
+        self.created_at = created_at
+        self.message = message
+        self.metadata = metadata
+
+    def to_row(self) -> Dict:
+        return {
+            "id": self.id,
+            "role": self.message.role,
+            "content": self.message.content,
+            "created_at": self.created_at,
+            "metadata": self.metadata,
+        }
+
+
+def new_message(
+    role: str, content: str, metadata: Optional[Dict] = None
+) -> ThreadMessage:
+    """
+    Build a message to append to a thread.
+    """
+    return ThreadMessage(
+        f"msg_{uuid.uuid4().hex}",
+        int(time.time()),
+        Message.model_construct(role=role, content=content),
+        metadata,
+    )
+
+
+def reply_message(completion) -> ThreadMessage:
+    """
+    The assistant message to add to a thread for a completion's first choice.
+    """
+    message = completion.choices[0].get("message") or {}
+    return new_message("assistant", message.get("content") or "")
+
+
+class Thread:
+    """
+    A thread as held in the hot tier: its messages in order, and the chat
+    `Message` list a completion on the thread starts from.
+    """
+
+    __slots__ = (
+        "id",
+        "user_id",
+        "created_at",
+        "metadata",
+        "messages",
+        "context",
+        "size",
+    )
+
+    def __init__(
+        self, id: str, user_id: str, created_at: int, metadata: Optional[Dict]
+    ):
+        self.id = id
+        self.user_id = user_id
+        self.created_at = created_at
+        self.metadata = metadata
+        self.messages: List[ThreadMessage] = []
+        self.context: List[Message] = []
+        self.size = MESSAGE_OVERHEAD
+
+    def add(self, start: int, records: List[ThreadMessage]) -> None:
+        """
+        Add messages stored at positions `start` onwards, skipping those already
+        held, which concurrent syncs of the same thread may both have read.
+        """
+        for position, record in enumerate(records, start):
+            if position != len(self.messages):
+                continue
+            self.messages.append(record)
+            self.context.append(record.message)
+            self.size += len(record.message.content) + MESSAGE_OVERHEAD
+
+    def find(self, message_id: str) -> Optional[ThreadMessage]:
+        for record in self.messages:
+            if record.id == message_id:
+                return record
+        return None
+
+    def page(
+        self,
+        limit: int,
+        order: str = "desc",
+        after: Optional[str] = None,
+        before: Optional[str] = None,
+    ) -> Tuple[List[ThreadMessage], bool]:
+        """
+        A page of messages, paginated by message ID as in the list endpoints.
+
+        :return: Tuple of (messages, whether more follow after the last one).
+        """
+        records = self.messages if order == "asc" else self.messages[::-1]
+        ids = [record.id for record in records]
+        begin = ids.index(after) + 1 if after in ids else 0
+        end = ids.index(before) if before in ids else len(records)
+        page = records[begin:end]
+        return page[:limit], len(page) > limit
+
+
+def _metadata(value) -> Optional[Dict]:
+    return json.loads(value) if value is not None else None
+
+
+def thread_object(thread: Thread) -> ThreadObject:
+    return ThreadObject(
+        id=thread.id, created_at=thread.created_at, metadata=thread.metadata
+    )
+
+
+def message_object(thread: Thread, record: ThreadMessage) -> MessageObject:
+    return MessageObject(
+        id=record.id,
+        created_at=record.created_at,
+        thread_id=thread.id,
+        role=record.message.role,
+        content=[MessageContent(text=MessageText(value=record.message.content))],
+        metadata=record.metadata,
+    )
+
+
+class ThreadStore:
+    """
+    Server-side conversation threads, so clients continuing a conversation send
+    only its new turn.
+
+    Postgres holds every thread and its messages, each at a fixed position. The
+    threads in use are also kept in process, in an LRU bounded by the bytes of
+    their messages. A thread taken from it is synced by reading only the
+    messages stored after the ones it holds, which is a single query returning
+    no message rows unless another worker appended to the thread; messages are
+    turned into chat `Message` objects once, when first read or written.
+
+    Appends are optimistic: new messages take the positions after the last one
+    known and, if another writer got there first, the thread is synced and the
+    append retried.
+    """
+
+    def __init__(self, pool, capacity_bytes: int = 256 * 1024 * 1024, retries: int = 5):
+        self.pool = pool
+        self.retries = retries
+        self.cache: LRUCache = LRUCache(
+            maxsize=capacity_bytes, getsizeof=lambda thread: thread.size
+        )
+        self.hits = 0
+        self.misses = 0
+        self.loaded = 0
+        self.appended = 0
+        self.conflicts = 0
+
+    def _keep(self, thread: Thread) -> None:
+        # Set again after every change so the LRU charges the thread's new size.
+        try:
+            self.cache[thread.id] = thread
+        except ValueError:
+            # Larger than the whole hot tier: read from Postgres each time.
+            self.cache.pop(thread.id, None)
+
+    async def _sync(
+        self, user_id: str, thread_id: str, thread: Optional[Thread] = None
+    ) -> Optional[Thread]:
+        start = len(thread.messages) if thread is not None else 0
+        rows = await fetch_thread_messages(self.pool, thread_id, user_id, start)
+        if not rows:
+            self.cache.pop(thread_id, None)
+            return None
+        if thread is None:
+            thread = Thread(
+                thread_id,
+                user_id,
+                rows[0]["thread_created_at"],
+                _metadata(rows[0]["thread_metadata"]),
+            )
+        else:
+            thread.metadata = _metadata(rows[0]["thread_metadata"])
+        if rows[0]["id"] is not None:
+            thread.add(
+                rows[0]["position"],
+                [
+                    ThreadMessage(
+                        row["id"],
+                        row["created_at"],
+                        Message.model_construct(
+                            role=row["role"], content=row["content"]
+                        ),
+                        _metadata(row["metadata"]),
+                    )
+                    for row in rows
+                ],
+            )
+            self.loaded += len(rows)
+        self._keep(thread)
+        return thread
+
+    async def create(
+        self,
+        user_id: str,
+        messages: List[ThreadMessage],
+        metadata: Optional[Dict] = None,
+    ) -> Thread:
+        thread = Thread(
+            f"thread_{uuid.uuid4().hex}", user_id, int(time.time()), metadata
+        )
+        await insert_thread_record(
+            self.pool, thread.id, user_id, thread.created_at, metadata
+        )
+        if messages:
+            await insert_thread_messages(
+                self.pool, thread.id, 0, [record.to_row() for record in messages]
+            )
+            thread.add(0, messages)
+            self.appended += len(messages)
+        self._keep(thread)
+        return thread
+
+    async def get(self, user_id: str, thread_id: str) -> Optional[Thread]:
+        """
+        The user's thread, up to date with every message stored for it.
+
+        :return: The thread, or None if the user has no such thread.
+        """
+        thread = self.cache.get(thread_id)
+        if thread is None:
+            self.misses += 1
+        elif thread.user_id != user_id:
+            return None
+        else:
+            self.hits += 1
+        return await self._sync(user_id, thread_id, thread)
+
+    async def append(self, thread: Thread, messages: List[ThreadMessage]) -> bool:
+        """
+        Add messages to the end of a thread.
+
+        :param thread: The thread, as returned by `get`.
+        :param messages: Messages built with `new_message`.
+        :return: False if the thread has been deleted.
+        :raises ThreadConflict: If the positions kept being taken by other writers.
+        """
+        rows = [record.to_row() for record in messages]
+        for _ in range(self.retries):
+            start = len(thread.messages)
+            try:
+                await insert_thread_messages(self.pool, thread.id, start, rows)
+            except asyncpg.UniqueViolationError:
+                self.conflicts += 1
+                if await self._sync(thread.user_id, thread.id, thread) is None:
+                    return False
+                continue
+            except asyncpg.ForeignKeyViolationError:
+                self.cache.pop(thread.id, None)
+                return False
+            thread.add(start, messages)
+            self.appended += len(messages)
+            self._keep(thread)
+            return True
+        raise ThreadConflict(
+            "The thread is being modified by another request. Please retry."
+        )
+
+    async def modify(
+        self, user_id: str, thread_id: str, metadata: Optional[Dict]
+    ) -> Optional[Thread]:
+        if not await update_thread_metadata(self.pool, thread_id, user_id, metadata):
+            return None
+        return await self.get(user_id, thread_id)
+
+    async def delete(self, user_id: str, thread_id: str) -> bool:
+        if not await delete_thread_record(self.pool, thread_id, user_id):
+            return False
+        self.cache.pop(thread_id, None)
+        return True
+
+    def stats(self) -> Dict:
+        return {
+            "threads": len(self.cache),
+            "bytes": self.cache.currsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "messages_loaded": self.loaded,
+            "messages_appended": self.appended,
+            "conflicts": self.conflicts,
+        }
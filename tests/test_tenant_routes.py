@@ -0,0 +1,110 @@
+import time
+import asyncio
+
+import pytest
+
+from llmhub.pipeline import ContextLengthExceeded, fit_context_window
+from llmhub.tenant_routes import (
+    PATTERN_MAX_LENGTH,
+    InvalidRoutingConfig,
+    RouteNotAllowed,
+    compile_config,
+)
+from pydantic_types.chat import CreateChatCompletionRequest, Message
+from pydantic_types.routing import RoutingRule, TenantRoutingConfig
+from service.chat.resilience import ResilientDispatcher
+
+
+def config(*patterns: str) -> TenantRoutingConfig:
+    return TenantRoutingConfig(
+        rules=[RoutingRule(name="rule", model="gpt-4o-mini", patterns=list(patterns))]
+    )
+
+
+@pytest.mark.parametrize(
+    "pattern", ["(a+)+$", "(a*)*b", "(?:x|y+)*z", "((ab)*c)+", "(a{2,}){3,}"]
+)
+def test_nested_quantifiers_are_rejected(pattern):
+    with pytest.raises(InvalidRoutingConfig, match="nests quantifiers"):
+        compile_config(config(pattern))
+
+
+def test_overlong_pattern_is_rejected():
+    with pytest.raises(InvalidRoutingConfig, match="at most"):
+        compile_config(config("a" * (PATTERN_MAX_LENGTH + 1)))
+
+
+def test_safe_patterns_match():
+    table = compile_config(config(r"\bdef \w+\(", r"(?:foo|bar)+ baz", r"a?b{1,3}"))
+    assert table.match("please fix def parse(") is not None
+    assert table.match("FOOBAR baz") is not None
+    assert table.match("nothing here") is None
+
+
+def test_backtracking_pattern_times_out():
+    # Exponential without nesting quantifiers, so it gets past compile_config.
+    table = compile_config(config("(a|aa)+$"))
+    started = time.perf_counter()
+    assert table.match("a" * 40 + "!") is None
+    assert time.perf_counter() - started < 1
+
+
+def test_cost_ceiling_picks_the_cheapest_allowed_model():
+    table = compile_config(
+        TenantRoutingConfig(
+            allowed_models=["claude-3.5-sonnet", "gpt-4o-mini"], max_request_cost=0.01
+        )
+    )
+    assert table.constrain("claude-3.5-sonnet", 10000, 500) == "gpt-4o-mini"
+
+
+def test_cost_ceiling_rejects_requests_no_allowed_model_can_afford():
+    table = compile_config(
+        TenantRoutingConfig(allowed_models=["claude-3.5-sonnet"], max_request_cost=0.01)
+    )
+    with pytest.raises(RouteNotAllowed, match="max_request_cost"):
+        table.constrain("claude-3.5-sonnet", 10000, 500)
+
+
+def test_permitted_models_are_allowed_and_within_the_cost_ceiling():
+    table = compile_config(
+        TenantRoutingConfig(
+            allowed_models=["claude-3.5-sonnet", "gpt-4o-mini"], max_request_cost=0.01
+        )
+    )
+    assert table.permitted(10000, 500) == {"gpt-4o-mini"}
+    assert compile_config(TenantRoutingConfig()).permitted(10000, 500) is None
+
+
+def test_context_fitting_stays_within_the_allowed_models():
+    request = CreateChatCompletionRequest(
+        model="automatic", messages=[Message(role="user", content="hi")]
+    )
+    _, model = asyncio.run(
+        fit_context_window(
+            request, "gpt-4o-mini", 150000, {"gpt-4o-mini", "claude-3.5-sonnet"}
+        )
+    )
+    assert model == "claude-3.5-sonnet"
+    with pytest.raises(ContextLengthExceeded):
+        asyncio.run(
+            fit_context_window(request, "gpt-4o-mini", 150000, {"gpt-4o-mini"})
+        )
+
+
+def test_failover_stays_within_the_allowed_models():
+    dispatcher = ResilientDispatcher(
+        {
+            "gpt-4o-mini": ("azure_openai", None),
+            "gemini-1.5-flash": ("google_gemini", None),
+            "meta-llama": ("azure_meta", None),
+        }
+    )
+    assert dispatcher.candidates("gpt-4o-mini") == [
+        "gpt-4o-mini",
+        "gemini-1.5-flash",
+        "meta-llama",
+    ]
+    assert dispatcher.candidates(
+        "gpt-4o-mini", allowed={"gpt-4o-mini", "meta-llama"}
+    ) == ["gpt-4o-mini", "meta-llama"]
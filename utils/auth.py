@@ -1,11 +1,20 @@
 import jwt
 import os
+import logging
+import time
+import hashlib
+
+
+from cachetools import TTLCache
+from typing import Iterable, List, Optional
 
 
 from pydantic_types.chat import CreateChatCompletionRequest
+from utils.json_body import json_body
+from utils.telemetry import stage
 
 
-from fastapi import HTTPException, Security
+from fastapi import Depends, HTTPException, Security
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 
 
@@ -18,6 +27,89 @@ from starlette.status import (
 SECRET_KEY = os.getenv("SECRET_KEY")
 ALGORITHM = os.getenv("ALGORITHM")
 security = HTTPBearer()
+# Decodes a chat completion body once per request, for the route and its checks.
+parse_chat_request = json_body(CreateChatCompletionRequest)
+
+
+def token_hash(token: str) -> str:
+    """
+    SHA-256 hex digest of a token, used to key the verified-token cache and the
+    revocation list without keeping raw keys around.
+    """
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+class VerifiedTokenCache:
+    """
+    Bounded cache of tokens whose signature has already been verified.
+
+    Entries live for at most `ttl` seconds and never past the token's own `exp`
+    claim. Revoked token hashes are remembered for `revoked_ttl` seconds, which
+    should be the longest lifetime of an API key, so a revoked key is rejected
+    even if it is still cached elsewhere or presented again later.
+    """
+
+    def __init__(
+        self,
+        maxsize: int = 10000,
+        ttl: float = 300.0,
+        revoked_maxsize: int = 100000,
+        revoked_ttl: float = 30 * 24 * 3600.0,
+    ):
+        self.entries = TTLCache(maxsize=maxsize, ttl=ttl)
+        self.revoked_ttl = revoked_ttl
+        self.revoked = TTLCache(maxsize=revoked_maxsize, ttl=revoked_ttl)
+        self.hits = 0
+        self.misses = 0
+        self.rejected = 0
+
+    def get(self, key: str) -> Optional[List[str]]:
+        entry = self.entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        authorized, expires_at = entry
+        if expires_at is not None and expires_at <= time.time():
+            self.entries.pop(key, None)
+            self.misses += 1
+            return None
+        self.hits += 1
+        return authorized
+
+    def put(self, key: str, authorized: List[str], expires_at: Optional[float]) -> None:
+        self.entries[key] = (authorized, expires_at)
+
+    def is_revoked(self, key: str) -> bool:
+        return key in self.revoked
+
+    def revoke(self, keys: Iterable[str]) -> None:
+        """
+        Add token hashes to the revocation list and evict them from the cache.
+
+        :param keys: SHA-256 hex digests of the revoked tokens (see `token_hash`).
+        """
+        for key in keys:
+            self.revoked[key] = True
+            self.entries.pop(key, None)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self.entries),
+            "revoked": len(self.revoked),
+            "hits": self.hits,
+            "misses": self.misses,
+            "rejected": self.rejected,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+token_cache = VerifiedTokenCache(
+    maxsize=int(os.getenv("TOKEN_CACHE_SIZE", "10000")),
+    ttl=float(os.getenv("TOKEN_CACHE_TTL", "300")),
+    revoked_maxsize=int(os.getenv("REVOKED_KEYS_MAX", "100000")),
+    revoked_ttl=float(os.getenv("REVOKED_KEY_TTL", str(30 * 24 * 3600))),
+)
 
 
 def create_access_token(data: dict) -> str:
@@ -38,9 +130,19 @@ def verify_token(token: str):
     """
     Verify a given JWT token.
 
+    Tokens seen before are answered from `token_cache` without re-checking the
+    signature; revoked tokens are always rejected.
+
     :param token: The JWT token to verify.
     :return: The decoded payload if the token is valid, otherwise None.
     """
+    key = token_hash(token)
+    if token_cache.is_revoked(key):
+        token_cache.rejected += 1
+        return None
+    authorized = token_cache.get(key)
+    if authorized is not None:
+        return authorized
 
     try:
         payload = jwt.decode(
@@ -53,15 +155,32 @@ def verify_token(token: str):
         name: str = token
         if username is None:
             return None
+        token_cache.put(key, [username, name], payload.get("exp"))
         return [username, name]
     except jwt.PyJWTError:
         return None
 
 
-def verify_api_key(
+def warm_jwt() -> None:
+    """
+    Sign and verify a throwaway token, so the key is checked and the signing
+    backend loaded at startup instead of on the first request.
+    """
+    try:
+        jwt.decode(
+            jwt.encode({"userId": None}, SECRET_KEY, algorithm=ALGORITHM),
+            SECRET_KEY,
+            algorithms=[ALGORITHM],
+        )
+    except Exception as e:
+        logging.error(f"JWT key check failed: {e}")
+
+
+async def verify_api_key(
     credentials: HTTPAuthorizationCredentials = Security(security),
 ):
-    authorized = verify_token(credentials.credentials)
+    with stage("auth"):
+        authorized = verify_token(credentials.credentials)
     if authorized is None:  # Corrected the comparison here
         raise HTTPException(
             status_code=HTTP_403_FORBIDDEN,
@@ -71,7 +190,18 @@ def verify_api_key(
     return authorized
 
 
-def validate_request(request: CreateChatCompletionRequest):
+async def validate_request(
+    request: CreateChatCompletionRequest = Depends(parse_chat_request),
+):
+    """
+    Validates the chat completion request, timed as the "validate" stage.
+    Raises an HTTP 400 exception if validation fails.
+    """
+    with stage("validate"):
+        return await _validate_request(request)
+
+
+async def _validate_request(request: CreateChatCompletionRequest):
     """
     Validates the chat completion request.
     Raises an HTTP 400 exception if validation fails.
@@ -0,0 +1,170 @@
+import os
+import time
+import logging
+
+
+from typing import Dict, List, Optional, Tuple
+
+
+# One bucket in a reservation: (key, refill rate per second, burst capacity, amount).
+Bucket = Tuple[str, float, float, float]
+
+
+def gcra_reserve(
+    state: Dict[str, float], now: float, buckets: List[Bucket], max_wait: float
+) -> Tuple[bool, float, Dict[str, float]]:
+    """
+    Reserve `amount` from every bucket at once, token-bucket style (GCRA form).
+
+    Each bucket is tracked by a single "theoretical arrival time". A reservation
+    is granted when all buckets can cover it within `max_wait` seconds; otherwise
+    nothing is taken.
+
+    :param state: Current arrival time per bucket key (missing keys are full).
+    :param now: Current time in seconds.
+    :param buckets: Buckets to reserve from.
+    :param max_wait: Longest the caller is willing to wait for headroom.
+    :return: Tuple of (granted, seconds to wait or retry after, new state to store).
+    """
+    wait = 0.0
+    updates = {}
+    for key, rate, capacity, amount in buckets:
+        tat = max(state.get(key) or 0.0, now)
+        new_tat = tat + amount / rate
+        wait = max(wait, new_tat - capacity / rate - now)
+        updates[key] = new_tat
+    if wait > max_wait:
+        return False, wait, {}
+    return True, max(wait, 0.0), updates
+
+
+class InMemoryStore:
+    """
+    Process-local stand-in for a Redis-compatible store.
+
+    Implements the small async subset of the Redis API the caches rely on, so it
+    can be swapped in for tests and single-instance deployments.
+    """
+
+    def __init__(self):
+        self._data: Dict[str, Tuple[bytes, Optional[float]]] = {}
+
+    def _live(self, key: str):
+        item = self._data.get(key)
+        if item is None:
+            return None
+        value, expires_at = item
+        if expires_at is not None and expires_at <= time.monotonic():
+            del self._data[key]
+            return None
+        return value
+
+    async def get(self, key: str) -> Optional[bytes]:
+        return self._live(key)
+
+    async def set(self, key: str, value: bytes, ttl: Optional[float] = None) -> None:
+        expires_at = time.monotonic() + ttl if ttl else None
+        self._data[key] = (value, expires_at)
+
+    async def delete(self, key: str) -> None:
+        self._data.pop(key, None)
+
+    async def incr(self, key: str) -> int:
+        value = int(self._live(key) or 0) + 1
+        self._data[key] = (str(value).encode(), None)
+        return value
+
+    async def reserve(self, buckets: List[Bucket], max_wait: float) -> Tuple[bool, float]:
+        now = time.monotonic()
+        state = {key: float(self._live(key) or 0) for key, _, _, _ in buckets}
+        granted, wait, updates = gcra_reserve(state, now, buckets, max_wait)
+        for key, tat in updates.items():
+            self._data[key] = (str(tat).encode(), tat + 1)
+        return granted, wait
+
+    async def close(self) -> None:
+        self._data.clear()
+
+
+# Redis-side twin of `gcra_reserve`, so every instance shares the same buckets.
+# KEYS are bucket keys; ARGV is max_wait followed by rate, capacity, amount per key.
+GCRA_RESERVE_SCRIPT = """
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+local max_wait = tonumber(ARGV[1])
+local wait = 0
+local new_tats = {}
+for i, key in ipairs(KEYS) do
+    local rate = tonumber(ARGV[i * 3 - 1])
+    local capacity = tonumber(ARGV[i * 3])
+    local amount = tonumber(ARGV[i * 3 + 1])
+    local tat = math.max(tonumber(redis.call('GET', key) or 0), now)
+    new_tats[i] = tat + amount / rate
+    wait = math.max(wait, new_tats[i] - capacity / rate - now)
+end
+if wait > max_wait then
+    return {0, tostring(wait)}
+end
+for i, key in ipairs(KEYS) do
+    redis.call('SET', key, tostring(new_tats[i]), 'PX', math.ceil((new_tats[i] - now) * 1000) + 1000)
+end
+return {1, tostring(math.max(wait, 0))}
+"""
+
+
+class RedisStore:
+    """
+    Shared store backed by any Redis-compatible server (Redis, Valkey, Azure Cache).
+
+    The `redis` package is imported lazily so it is only needed when a shared
+    backend is actually configured.
+    """
+
+    def __init__(self, url: str):
+        import redis.asyncio as redis
+
+        self._client = redis.from_url(url)
+        self._reserve_script = self._client.register_script(GCRA_RESERVE_SCRIPT)
+
+    async def get(self, key: str) -> Optional[bytes]:
+        return await self._client.get(key)
+
+    async def set(self, key: str, value: bytes, ttl: Optional[float] = None) -> None:
+        await self._client.set(key, value, px=int(ttl * 1000) if ttl else None)
+
+    async def delete(self, key: str) -> None:
+        await self._client.delete(key)
+
+    async def incr(self, key: str) -> int:
+        return await self._client.incr(key)
+
+    async def reserve(self, buckets: List[Bucket], max_wait: float) -> Tuple[bool, float]:
+        args = [max_wait]
+        for _, rate, capacity, amount in buckets:
+            args.extend((rate, capacity, amount))
+        granted, wait = await self._reserve_script(
+            keys=[key for key, _, _, _ in buckets], args=args
+        )
+        return bool(granted), float(wait)
+
+    async def close(self) -> None:
+        await self._client.aclose()
+
+
+def shared_store_from_env(env_var: str = "REDIS_URL"):
+    """
+    Build the shared cache store configured in the environment.
+
+    :param env_var: Name of the env var holding the store URL.
+    :return: A RedisStore, an InMemoryStore for "memory://", or None if unset.
+    """
+    url = os.getenv(env_var)
+    if not url:
+        return None
+    if url.startswith("memory://"):
+        return InMemoryStore()
+    try:
+        return RedisStore(url)
+    except Exception as e:
+        logging.error(f"Failed to create shared cache store: {e}")
+        return None
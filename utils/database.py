@@ -2,41 +2,106 @@ import os
 import logging
 
 
-from pymongo.mongo_client import MongoClient
-from pymongo.server_api import ServerApi
-from pymongo.collection import Collection
+from typing import TYPE_CHECKING, Callable, Optional, Dict, List
 
-
-from typing import Optional, Dict
-from prisma import Prisma
+# The MongoDB drivers are imported where the clients are created and Prisma only
+# annotates a signature, so importing this module (on every cold start) loads
+# none of them.
+if TYPE_CHECKING:
+    from motor.motor_asyncio import AsyncIOMotorClient
+    from pymongo.mongo_client import MongoClient
+    from pymongo.collection import Collection
+    from prisma import Prisma
 
 
 from pydantic_types.chat import ChatCompletion
 
 logging.basicConfig(level=logging.INFO)
 
+# Routing mode under which a tenant's custom routing rules are stored.
+TENANT_MODE_PREFIX = "tenant:"
+
+_route_config_listeners: List[Callable[[str], None]] = []
+# One client per process: each MongoClient owns a connection pool and
+# background monitor threads, so creating one per call is expensive.
+_mongo_client: Optional["MongoClient"] = None
+_async_mongo_client: Optional["AsyncIOMotorClient"] = None
+
 
-def get_mongo_client() -> MongoClient:
+def on_route_config_change(callback: Callable[[str], None]) -> None:
     """
-    Fetch MongoDB client from environment variable.
-    :return: MongoClient instance.
-    :raises ValueError: If MongoDB URI is not found in environment variables.
+    Register a callback to run whenever a route configuration is written.
+    :param callback: Called with the routing mode whose config changed.
     """
+    _route_config_listeners.append(callback)
+
+
+def _notify_route_config_change(mode: str) -> None:
+    for callback in _route_config_listeners:
+        try:
+            callback(mode)
+        except Exception as e:
+            logging.error(f"Route config change listener failed: {e}")
+
+
+def _mongo_uri() -> str:
     uri = os.getenv("MONGO_URI")
     if not uri:
         logging.error("MONGO_URI not found in environment variables.")
         raise ValueError("MONGO_URI not set in environment variables.")
+    return uri
+
+
+def get_mongo_client() -> "MongoClient":
+    """
+    Fetch the shared MongoDB client, creating it on first use.
+    :return: MongoClient instance.
+    :raises ValueError: If MongoDB URI is not found in environment variables.
+    """
+    global _mongo_client
+    if _mongo_client is not None:
+        return _mongo_client
+    uri = _mongo_uri()
+    from pymongo.mongo_client import MongoClient
+    from pymongo.server_api import ServerApi
 
     try:
-        client = MongoClient(uri, server_api=ServerApi("1"))
-        return client
+        _mongo_client = MongoClient(uri, server_api=ServerApi("1"))
+        return _mongo_client
     except Exception as e:
         logging.error(f"Failed to connect to MongoDB: {e}")
         raise ConnectionError(f"Failed to connect to MongoDB: {e}")
 
 
+def get_async_mongo_client() -> "AsyncIOMotorClient":
+    """
+    Fetch the shared asyncio MongoDB client, creating it on first use.
+    Must first be called from the event loop that will use it.
+    :return: AsyncIOMotorClient instance.
+    :raises ValueError: If MongoDB URI is not found in environment variables.
+    """
+    global _async_mongo_client
+    if _async_mongo_client is None:
+        from motor.motor_asyncio import AsyncIOMotorClient
+        from pymongo.server_api import ServerApi
+
+        _async_mongo_client = AsyncIOMotorClient(_mongo_uri(), server_api=ServerApi("1"))
+    return _async_mongo_client
+
+
+def close_mongo_clients() -> None:
+    """
+    Close the shared MongoDB clients, if they were created.
+    """
+    global _mongo_client, _async_mongo_client
+    for client in (_mongo_client, _async_mongo_client):
+        if client is not None:
+            client.close()
+    _mongo_client = _async_mongo_client = None
+
+
 def get_custom_config(
-    client: MongoClient,
+    client: "MongoClient",
     db_name: str = "Routers",
     collection_name: str = "route-config",
     mode: str = "automatic",
@@ -67,13 +132,10 @@ def get_routing_info(
     model: str = "automatic",
 ) -> Optional[str]:
     """
-    Fetch the routing system prompt from MongoDB.
-    :param client: MongoDB client instance.
-    :param db_name: Database name.
-    :param collection_name: Collection name.
-    :param mode: Mode of routing configuration.
-    :return: Routing system prompt or default prompt for 'automatic' mode.
-    :raises LookupError: If system prompt is not found for the given mode.
+    Default routing system prompt, used when no prompt is stored in MongoDB.
+    Stored prompts are served from llmhub.route_config.route_configs.
+    :param model: Mode of routing configuration.
+    :return: Default prompt for 'automatic' mode, None otherwise.
     """
 
     if model == "automatic":
@@ -93,7 +155,7 @@ def get_routing_info(
 
 
 def write_custom_route_config(
-    client: MongoClient,
+    client: "MongoClient",
     system_prompt: str,
     db_name: str = "Routers",
     collection_name: str = "route-config",
@@ -117,17 +179,61 @@ def write_custom_route_config(
         query_filter = {"mode": mode}
         update_operation = {"$set": {"system_prompt": system_prompt}}
         result = collection.update_one(query_filter, update_operation)
+        _notify_route_config_change(mode)
         return
 
     except Exception as e:
         logging.error(f"Error writing Route Info to database: {e}")
         raise RuntimeError(f"Error writing Route Info to database: {e}")
 
+async def write_tenant_routing_config(
+    client: "AsyncIOMotorClient",
+    tenant: str,
+    config: Dict,
+    db_name: str = "Routers",
+    collection_name: str = "route-config",
+) -> None:
+    """
+    Store a tenant's custom routing rules alongside the route configurations.
+    :param client: Shared AsyncIOMotorClient.
+    :param tenant: The tenant's userId.
+    :param config: The TenantRoutingConfig as a dictionary.
+    :param db_name: Database name.
+    :param collection_name: Collection name.
+    """
+    mode = f"{TENANT_MODE_PREFIX}{tenant}"
+    collection = client[db_name][collection_name]
+    await collection.replace_one(
+        {"mode": mode}, {"mode": mode, "tenant": tenant, **config}, upsert=True
+    )
+    _notify_route_config_change(mode)
+
+
+async def delete_tenant_routing_config(
+    client: "AsyncIOMotorClient",
+    tenant: str,
+    db_name: str = "Routers",
+    collection_name: str = "route-config",
+) -> bool:
+    """
+    Remove a tenant's custom routing rules.
+    :param client: Shared AsyncIOMotorClient.
+    :param tenant: The tenant's userId.
+    :param db_name: Database name.
+    :param collection_name: Collection name.
+    :return: True if the tenant had rules stored.
+    """
+    mode = f"{TENANT_MODE_PREFIX}{tenant}"
+    result = await client[db_name][collection_name].delete_one({"mode": mode})
+    _notify_route_config_change(mode)
+    return result.deleted_count > 0
+
+
 async def insert_api_call_log(
     response_data:ChatCompletion,
     user_id: str,
     api_key_id: str,
-    db: Prisma
+    db: "Prisma"
 ):
     """
     Inserts an API call log into the database.
@@ -0,0 +1,122 @@
+import asyncio
+
+
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional, Tuple
+
+
+class MicroBatcher:
+    """
+    Coalesces concurrent small calls into batched upstream calls.
+
+    Items submitted under the same key within `max_wait` seconds of the first
+    pending one are sent together as a single `fn(key, items)` call, which must
+    return one result per item in order. A batch is sent early once it holds
+    `max_batch` items; a submission that is a full batch on its own skips the
+    queue and is sent in `max_batch`-sized slices.
+
+    When a batch of several submissions fails with an error for which
+    `isolate(error)` is true, such as one caused by a bad item, each submission
+    is retried on its own so only the one that caused it fails.
+    """
+
+    def __init__(
+        self,
+        fn: Callable[[Hashable, List[Any]], Awaitable[List[Any]]],
+        max_wait: float = 0.005,
+        isolate: Optional[Callable[[Exception], bool]] = None,
+    ):
+        self.fn = fn
+        self.max_wait = max_wait
+        self.isolate = isolate
+        self.pending: Dict[Hashable, List[Tuple[List[Any], asyncio.Future]]] = {}
+        self.pending_items: Dict[Hashable, int] = {}
+        self.timers: Dict[Hashable, asyncio.TimerHandle] = {}
+        self.running = set()
+        self.submissions = 0
+        self.items = 0
+        self.batches = 0
+        self.isolated = 0
+
+    async def submit(
+        self, key: Hashable, items: List[Any], max_batch: int
+    ) -> List[Any]:
+        """
+        Queue items for the next batched call under `key`.
+
+        :param key: Calls are only batched with others under the same key.
+        :param items: The items to process.
+        :param max_batch: Largest number of items one upstream call may carry.
+        :return: One result per item, in order.
+        """
+        self.submissions += 1
+        self.items += len(items)
+        if len(items) >= max_batch:
+            slices = await asyncio.gather(
+                *(
+                    self._call(key, items[start : start + max_batch])
+                    for start in range(0, len(items), max_batch)
+                )
+            )
+            return [result for batch in slices for result in batch]
+
+        if self.pending_items.get(key, 0) + len(items) > max_batch:
+            self._flush(key)
+        future = asyncio.get_running_loop().create_future()
+        self.pending.setdefault(key, []).append((items, future))
+        self.pending_items[key] = self.pending_items.get(key, 0) + len(items)
+        if self.pending_items[key] >= max_batch:
+            self._flush(key)
+        elif key not in self.timers:
+            self.timers[key] = asyncio.get_running_loop().call_later(
+                self.max_wait, self._flush, key
+            )
+        return await future
+
+    async def _call(self, key: Hashable, items: List[Any]) -> List[Any]:
+        self.batches += 1
+        return await self.fn(key, items)
+
+    def _flush(self, key: Hashable) -> None:
+        timer = self.timers.pop(key, None)
+        if timer is not None:
+            timer.cancel()
+        entries = self.pending.pop(key, None)
+        self.pending_items.pop(key, None)
+        if entries:
+            task = asyncio.create_task(self._run(key, entries))
+            self.running.add(task)
+            task.add_done_callback(self.running.discard)
+
+    async def _run(
+        self, key: Hashable, entries: List[Tuple[List[Any], asyncio.Future]]
+    ) -> None:
+        items = [item for batch, _ in entries for item in batch]
+        try:
+            results = await self._call(key, items)
+        except Exception as e:
+            if len(entries) > 1 and self.isolate is not None and self.isolate(e):
+                self.isolated += 1
+                await asyncio.gather(*(self._run(key, [entry]) for entry in entries))
+                return
+            for _, future in entries:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        offset = 0
+        for batch, future in entries:
+            if not future.done():
+                future.set_result(results[offset : offset + len(batch)])
+            offset += len(batch)
+
+    def stats(self) -> Dict:
+        return {
+            "pending": sum(self.pending_items.values()),
+            "in_flight": len(self.running),
+            "submissions": self.submissions,
+            "items": self.items,
+            "batches": self.batches,
+            "isolated": self.isolated,
+            "avg_items_per_batch": (
+                round(self.items / self.batches, 2) if self.batches else 0.0
+            ),
+        }
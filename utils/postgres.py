@@ -1,9 +1,13 @@
+import os
+import json
+import asyncio
 import asyncpg
 import uuid
-from datetime import datetime
+from datetime import datetime, timedelta
 from decimal import Decimal
 import logging
 from pydantic_types.chat import ChatCompletion
+from utils.telemetry import record_usage, stage
 
 
 async def insert_api_call_log(
@@ -75,3 +79,648 @@ async def insert_api_call_log(
         # Log any errors that occur during the insertion process
         logging.error(f"Error inserting log: {str(e)}")
         return None
+
+
+API_CALL_LOG_COLUMNS = [
+    "id",
+    "userId",
+    "apiKeyId",
+    "model_name",
+    "prompt_tokens",
+    "completion_tokens",
+    "total_tokens",
+    "credits_used",
+    "timestamp",
+    "cache_hit",
+    "cached_tokens",
+]
+
+
+# Columns added to api_call_logs after it was first created; brought up to date
+# at startup, before the sink copies rows with them.
+API_CALL_LOG_SCHEMA = """
+ALTER TABLE api_call_logs ADD COLUMN IF NOT EXISTS cache_hit boolean NOT NULL DEFAULT false;
+ALTER TABLE api_call_logs ADD COLUMN IF NOT EXISTS cached_tokens integer NOT NULL DEFAULT 0;
+"""
+
+
+async def ensure_api_call_log_schema(pool: asyncpg.Pool) -> None:
+    """
+    Add the api_call_logs columns the log sink writes that older tables lack.
+    """
+    await pool.execute(API_CALL_LOG_SCHEMA)
+
+
+def api_call_log_record(
+    response_data, user_id: str, api_key_id: str, cache_hit: bool = False
+) -> tuple:
+    """
+    Build an api_call_logs row in API_CALL_LOG_COLUMNS order.
+
+    :param response_data: A Completion, or a CreateEmbeddingResponse (no completion tokens).
+    """
+    return (
+        str(uuid.uuid4()),
+        user_id,
+        api_key_id,
+        response_data.model,
+        response_data.usage.prompt_tokens,
+        getattr(response_data.usage, "completion_tokens", 0),
+        response_data.usage.total_tokens,
+        Decimal(response_data.usage.total_tokens),
+        datetime.utcnow(),
+        cache_hit,
+        getattr(response_data.usage, "cached_tokens", 0) or 0,
+    )
+
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    raise TypeError(f"Cannot serialize {type(value).__name__}")
+
+
+def _encode_record(record: tuple) -> str:
+    return json.dumps(record, default=_json_default)
+
+
+def _decode_record(line: str) -> tuple:
+    values = json.loads(line)
+    values[7] = Decimal(values[7])
+    values[8] = datetime.fromisoformat(values[8])
+    # Spilled before the cache_hit and cached_tokens columns existed.
+    defaults = [False, 0]
+    values.extend(defaults[len(values) + len(defaults) - len(API_CALL_LOG_COLUMNS) :])
+    return tuple(values)
+
+
+class ApiCallLogSink:
+    """
+    Buffers api_call_logs rows and writes them to Postgres in the background.
+
+    Requests hand their usage to `submit()`, which never waits on the database.
+    A background task drains the bounded queue and writes batches with COPY
+    whenever `batch_size` rows are waiting or `flush_interval` seconds have
+    passed. Rows that cannot be queued (queue full) or written (Postgres slow or
+    down) are appended to a local spill file, which is replayed on the next
+    start. `close()` drains everything still queued.
+    """
+
+    def __init__(
+        self,
+        pool: asyncpg.Pool,
+        max_queue: int = 10000,
+        batch_size: int = 500,
+        flush_interval: float = 0.5,
+        flush_timeout: float = 10.0,
+        spill_path: str = "api_call_logs.spill.jsonl",
+    ):
+        self.pool = pool
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=max_queue)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.flush_timeout = flush_timeout
+        self.spill_path = spill_path
+        self._task = None
+        self._wake = asyncio.Event()
+        self._closing = False
+        self.submitted = 0
+        self.written = 0
+        self.spilled = 0
+        self.dropped = 0
+        self.batches = 0
+
+    async def start(self) -> None:
+        await self.replay_spill()
+        self._task = asyncio.create_task(self._run())
+
+    def submit(
+        self, response_data, user_id: str, api_key_id: str, cache_hit: bool = False
+    ) -> None:
+        """
+        Queue one usage record without blocking the caller.
+
+        :param response_data: The Completion whose usage is logged.
+        :param user_id: The ID of the user making the API call.
+        :param api_key_id: The ID of the API key being used.
+        :param cache_hit: Whether the response was served from the response cache.
+        """
+        record = api_call_log_record(response_data, user_id, api_key_id, cache_hit)
+        record_usage(
+            getattr(response_data, "model", None),
+            getattr(response_data, "usage", None),
+            cache_hit,
+        )
+        self.submitted += 1
+        try:
+            self.queue.put_nowait(record)
+        except asyncio.QueueFull:
+            self._spill([record])
+            return
+        if self.queue.qsize() >= self.batch_size:
+            self._wake.set()
+
+    async def write_records(self, records: list) -> None:
+        """
+        Write many usage rows right away, bypassing the queue (bulk jobs that
+        already batch their own results). Failed writes spill like queued ones.
+
+        :param records: Rows built with `api_call_log_record`.
+        """
+        self.submitted += len(records)
+        for start in range(0, len(records), self.batch_size):
+            await self._flush(records[start : start + self.batch_size])
+
+    async def _run(self) -> None:
+        while not self._closing:
+            try:
+                await asyncio.wait_for(self._wake.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            await self._drain()
+
+    async def _drain(self) -> None:
+        while not self.queue.empty():
+            size = min(self.batch_size, self.queue.qsize())
+            await self._flush([self.queue.get_nowait() for _ in range(size)])
+
+    async def _flush(self, batch: list) -> None:
+        try:
+            with stage("log_flush"):
+                await asyncio.wait_for(
+                    self.pool.copy_records_to_table(
+                        "api_call_logs", records=batch, columns=API_CALL_LOG_COLUMNS
+                    ),
+                    self.flush_timeout,
+                )
+            self.written += len(batch)
+            self.batches += 1
+        except Exception as e:
+            logging.error(f"Error writing {len(batch)} logs, spilling to disk: {e}")
+            await asyncio.to_thread(self._spill, batch)
+
+    def _spill(self, records: list) -> None:
+        # Never raises: a failing spill must not stop the background writer.
+        try:
+            with open(self.spill_path, "a") as f:
+                for record in records:
+                    f.write(_encode_record(record) + "\n")
+        except Exception as e:
+            logging.error(f"Error spilling {len(records)} logs, dropping them: {e}")
+            self.dropped += len(records)
+            return
+        self.spilled += len(records)
+
+    async def replay_spill(self) -> None:
+        """
+        Write rows left in the spill file by an earlier run, then remove it.
+        """
+        if not os.path.isfile(self.spill_path):
+            return
+        replay_path = self.spill_path + ".replay"
+        os.replace(self.spill_path, replay_path)
+        with open(replay_path) as f:
+            records = [_decode_record(line) for line in f if line.strip()]
+        logging.info(f"Replaying {len(records)} spilled api call logs.")
+        for start in range(0, len(records), self.batch_size):
+            await self._flush(records[start : start + self.batch_size])
+        os.remove(replay_path)
+
+    async def close(self) -> None:
+        """
+        Stop the background writer and flush everything still queued.
+        """
+        self._closing = True
+        self._wake.set()
+        if self._task is not None:
+            await self._task
+            self._task = None
+        await self._drain()
+        logging.info(f"Api call log sink stats: {self.stats()}")
+
+    def stats(self) -> dict:
+        return {
+            "queued": self.queue.qsize(),
+            "submitted": self.submitted,
+            "written": self.written,
+            "spilled": self.spilled,
+            "dropped": self.dropped,
+            "batches": self.batches,
+        }
+
+
+REVOCATION_CHANNEL = "llmhub_api_key_revoked"
+
+REVOCATION_SCHEMA = """
+CREATE TABLE IF NOT EXISTS revoked_api_keys (
+    token_hash text PRIMARY KEY,
+    revoked_at timestamptz NOT NULL DEFAULT now()
+);
+CREATE INDEX IF NOT EXISTS revoked_api_keys_revoked_at
+    ON revoked_api_keys (revoked_at);
+"""
+
+
+async def ensure_revocation_schema(pool: asyncpg.Pool) -> None:
+    """
+    Create the revoked key table if it does not exist yet.
+    """
+    await pool.execute(REVOCATION_SCHEMA)
+
+
+class RevocationSync:
+    """
+    Keeps a token cache's revocation list in step with Postgres.
+
+    Revoked keys live in the `revoked_api_keys` table, keyed by the SHA-256 hex
+    digest of the token. Revocations are pushed with
+    `NOTIFY llmhub_api_key_revoked, '<token_hash>'` and picked up immediately
+    through LISTEN; the table is also polled every `poll_interval` seconds so
+    nothing is missed while the listening connection is down.
+    """
+
+    def __init__(self, pool: asyncpg.Pool, cache, poll_interval: float = 30.0):
+        self.pool = pool
+        self.cache = cache
+        self.poll_interval = poll_interval
+        self.last_revoked_at = None
+        self._connection = None
+        self._task = None
+        self._stop = asyncio.Event()
+
+    async def start(self) -> None:
+        await self.poll()
+        try:
+            self._connection = await self.pool.acquire()
+            await self._connection.add_listener(REVOCATION_CHANNEL, self._on_notify)
+        except Exception as e:
+            logging.error(f"Could not listen for key revocations, polling only: {e}")
+            await self._release()
+        self._task = asyncio.create_task(self._run())
+
+    def _on_notify(self, connection, pid, channel, payload) -> None:
+        self.cache.revoke([payload])
+
+    async def poll(self) -> None:
+        """
+        Load revocations recorded since the last poll.
+        """
+        try:
+            if self.last_revoked_at is None:
+                # Older revocations would already have aged out of the cache.
+                rows = await self.pool.fetch(
+                    "SELECT token_hash, revoked_at FROM revoked_api_keys "
+                    "WHERE revoked_at >= now() - $1::interval",
+                    timedelta(seconds=self.cache.revoked_ttl),
+                )
+            else:
+                rows = await self.pool.fetch(
+                    "SELECT token_hash, revoked_at FROM revoked_api_keys "
+                    "WHERE revoked_at >= $1",
+                    self.last_revoked_at,
+                )
+        except Exception as e:
+            logging.error(f"Error polling revoked api keys: {e}")
+            return
+        self.cache.revoke(row["token_hash"] for row in rows)
+        if rows:
+            self.last_revoked_at = max(row["revoked_at"] for row in rows)
+
+    async def _run(self) -> None:
+        while not self._stop.is_set():
+            try:
+                await asyncio.wait_for(self._stop.wait(), self.poll_interval)
+            except asyncio.TimeoutError:
+                await self.poll()
+
+    async def _release(self) -> None:
+        if self._connection is not None:
+            try:
+                await self.pool.release(self._connection)
+            except Exception as e:
+                logging.error(f"Error releasing revocation listener: {e}")
+            self._connection = None
+
+    async def close(self) -> None:
+        self._stop.set()
+        if self._task is not None:
+            await self._task
+            self._task = None
+        if self._connection is not None:
+            try:
+                await self._connection.remove_listener(
+                    REVOCATION_CHANNEL, self._on_notify
+                )
+            except Exception as e:
+                logging.error(f"Error removing revocation listener: {e}")
+            await self._release()
+
+
+BATCH_SCHEMA = """
+CREATE TABLE IF NOT EXISTS llmhub_files (
+    id text PRIMARY KEY,
+    "userId" text NOT NULL,
+    filename text NOT NULL,
+    purpose text NOT NULL,
+    bytes bigint NOT NULL,
+    created_at bigint NOT NULL
+);
+CREATE TABLE IF NOT EXISTS llmhub_batches (
+    id text PRIMARY KEY,
+    "userId" text NOT NULL,
+    "apiKeyId" text NOT NULL,
+    status text NOT NULL,
+    created_at bigint NOT NULL,
+    data jsonb NOT NULL
+);
+CREATE INDEX IF NOT EXISTS llmhub_batches_user_created
+    ON llmhub_batches ("userId", created_at DESC);
+CREATE TABLE IF NOT EXISTS llmhub_uploads (
+    id text PRIMARY KEY,
+    "userId" text NOT NULL,
+    status text NOT NULL,
+    created_at bigint NOT NULL,
+    data jsonb NOT NULL
+);
+CREATE TABLE IF NOT EXISTS llmhub_upload_parts (
+    id text PRIMARY KEY,
+    upload_id text NOT NULL,
+    bytes bigint NOT NULL,
+    created_at bigint NOT NULL
+);
+CREATE INDEX IF NOT EXISTS llmhub_upload_parts_upload
+    ON llmhub_upload_parts (upload_id);
+"""
+
+
+async def ensure_batch_schema(pool: asyncpg.Pool) -> None:
+    """
+    Create the file, upload and batch tables if they do not exist yet.
+    """
+    await pool.execute(BATCH_SCHEMA)
+
+
+async def insert_file_record(pool: asyncpg.Pool, user_id: str, file: dict) -> None:
+    await pool.execute(
+        'INSERT INTO llmhub_files (id, "userId", filename, purpose, bytes, created_at) '
+        "VALUES ($1, $2, $3, $4, $5, $6)",
+        file["id"],
+        user_id,
+        file["filename"],
+        file["purpose"],
+        file["bytes"],
+        file["created_at"],
+    )
+
+
+async def fetch_file_record(pool: asyncpg.Pool, file_id: str, user_id: str):
+    row = await pool.fetchrow(
+        "SELECT id, filename, purpose, bytes, created_at FROM llmhub_files "
+        'WHERE id = $1 AND "userId" = $2',
+        file_id,
+        user_id,
+    )
+    return dict(row) if row else None
+
+
+async def list_file_records(pool: asyncpg.Pool, user_id: str, purpose: str = None) -> list:
+    rows = await pool.fetch(
+        "SELECT id, filename, purpose, bytes, created_at FROM llmhub_files "
+        'WHERE "userId" = $1 AND ($2::text IS NULL OR purpose = $2) '
+        "ORDER BY created_at DESC",
+        user_id,
+        purpose,
+    )
+    return [dict(row) for row in rows]
+
+
+async def delete_file_record(pool: asyncpg.Pool, file_id: str, user_id: str) -> bool:
+    result = await pool.execute(
+        'DELETE FROM llmhub_files WHERE id = $1 AND "userId" = $2', file_id, user_id
+    )
+    return result != "DELETE 0"
+
+
+async def upsert_batch(
+    pool: asyncpg.Pool, batch: dict, user_id: str, api_key_id: str
+) -> None:
+    """
+    Persist a batch object, inserting it or replacing its stored state.
+
+    :param batch: The Batch object as a dictionary.
+    """
+    await pool.execute(
+        'INSERT INTO llmhub_batches (id, "userId", "apiKeyId", status, created_at, data) '
+        "VALUES ($1, $2, $3, $4, $5, $6::jsonb) "
+        "ON CONFLICT (id) DO UPDATE SET status = EXCLUDED.status, data = EXCLUDED.data",
+        batch["id"],
+        user_id,
+        api_key_id,
+        batch["status"],
+        batch["created_at"],
+        json.dumps(batch),
+    )
+
+
+async def fetch_batch(pool: asyncpg.Pool, batch_id: str, user_id: str):
+    row = await pool.fetchrow(
+        'SELECT data FROM llmhub_batches WHERE id = $1 AND "userId" = $2',
+        batch_id,
+        user_id,
+    )
+    return json.loads(row["data"]) if row else None
+
+
+async def fetch_batch_status(pool: asyncpg.Pool, batch_id: str):
+    return await pool.fetchval("SELECT status FROM llmhub_batches WHERE id = $1", batch_id)
+
+
+async def list_batch_records(
+    pool: asyncpg.Pool, user_id: str, after: str = None, limit: int = 20
+) -> list:
+    """
+    List a user's batches newest first, paginated by the ID of the last batch seen.
+    """
+    rows = await pool.fetch(
+        'SELECT data FROM llmhub_batches WHERE "userId" = $1 AND ($2::text IS NULL OR '
+        '(created_at, id) < (SELECT created_at, id FROM llmhub_batches WHERE id = $2)) '
+        "ORDER BY created_at DESC, id DESC LIMIT $3",
+        user_id,
+        after,
+        limit,
+    )
+    return [json.loads(row["data"]) for row in rows]
+
+
+async def upsert_upload(pool: asyncpg.Pool, upload: dict, user_id: str) -> None:
+    """
+    Persist an upload object, inserting it or replacing its stored state.
+
+    :param upload: The Upload object as a dictionary.
+    """
+    await pool.execute(
+        'INSERT INTO llmhub_uploads (id, "userId", status, created_at, data) '
+        "VALUES ($1, $2, $3, $4, $5::jsonb) "
+        "ON CONFLICT (id) DO UPDATE SET status = EXCLUDED.status, data = EXCLUDED.data",
+        upload["id"],
+        user_id,
+        upload["status"],
+        upload["created_at"],
+        json.dumps(upload),
+    )
+
+
+async def fetch_upload(pool: asyncpg.Pool, upload_id: str, user_id: str):
+    row = await pool.fetchrow(
+        'SELECT data FROM llmhub_uploads WHERE id = $1 AND "userId" = $2',
+        upload_id,
+        user_id,
+    )
+    return json.loads(row["data"]) if row else None
+
+
+async def insert_upload_part(pool: asyncpg.Pool, part: dict, size: int) -> None:
+    await pool.execute(
+        "INSERT INTO llmhub_upload_parts (id, upload_id, bytes, created_at) "
+        "VALUES ($1, $2, $3, $4)",
+        part["id"],
+        part["upload_id"],
+        size,
+        part["created_at"],
+    )
+
+
+async def fetch_upload_parts(pool: asyncpg.Pool, upload_id: str) -> dict:
+    """
+    :return: Part ID -> size in bytes for every part added to the upload.
+    """
+    rows = await pool.fetch(
+        "SELECT id, bytes FROM llmhub_upload_parts WHERE upload_id = $1", upload_id
+    )
+    return {row["id"]: row["bytes"] for row in rows}
+
+
+async def delete_upload_parts(pool: asyncpg.Pool, upload_id: str) -> None:
+    await pool.execute("DELETE FROM llmhub_upload_parts WHERE upload_id = $1", upload_id)
+
+
+THREAD_SCHEMA = """
+CREATE TABLE IF NOT EXISTS llmhub_threads (
+    id text PRIMARY KEY,
+    "userId" text NOT NULL,
+    created_at bigint NOT NULL,
+    metadata jsonb
+);
+CREATE TABLE IF NOT EXISTS llmhub_thread_messages (
+    thread_id text NOT NULL REFERENCES llmhub_threads (id) ON DELETE CASCADE,
+    position integer NOT NULL,
+    id text NOT NULL,
+    role text NOT NULL,
+    content text NOT NULL,
+    created_at bigint NOT NULL,
+    metadata jsonb,
+    PRIMARY KEY (thread_id, position)
+);
+"""
+
+
+async def ensure_thread_schema(pool: asyncpg.Pool) -> None:
+    """
+    Create the thread and thread message tables if they do not exist yet.
+    """
+    await pool.execute(THREAD_SCHEMA)
+
+
+async def insert_thread_record(
+    pool: asyncpg.Pool, thread_id: str, user_id: str, created_at: int, metadata: dict
+) -> None:
+    await pool.execute(
+        'INSERT INTO llmhub_threads (id, "userId", created_at, metadata) '
+        "VALUES ($1, $2, $3, $4::jsonb)",
+        thread_id,
+        user_id,
+        created_at,
+        json.dumps(metadata) if metadata is not None else None,
+    )
+
+
+async def update_thread_metadata(
+    pool: asyncpg.Pool, thread_id: str, user_id: str, metadata: dict
+) -> bool:
+    result = await pool.execute(
+        'UPDATE llmhub_threads SET metadata = $3::jsonb WHERE id = $1 AND "userId" = $2',
+        thread_id,
+        user_id,
+        json.dumps(metadata) if metadata is not None else None,
+    )
+    return result != "UPDATE 0"
+
+
+async def delete_thread_record(pool: asyncpg.Pool, thread_id: str, user_id: str) -> bool:
+    """
+    Delete a thread; its messages go with it.
+    """
+    result = await pool.execute(
+        'DELETE FROM llmhub_threads WHERE id = $1 AND "userId" = $2', thread_id, user_id
+    )
+    return result != "DELETE 0"
+
+
+async def fetch_thread_messages(
+    pool: asyncpg.Pool, thread_id: str, user_id: str, start: int = 0
+) -> list:
+    """
+    Read a thread and the messages it has from position `start` on, in one round
+    trip.
+
+    :param start: The first message position to return; the number of messages
+        the caller already has.
+    :return: Empty if the user has no such thread. Otherwise one row per message
+        in order, or a single row with null message columns if there are none,
+        each also carrying the thread's `thread_created_at` and `thread_metadata`.
+    """
+    return await pool.fetch(
+        "SELECT t.created_at AS thread_created_at, t.metadata AS thread_metadata, "
+        "m.position, m.id, m.role, m.content, m.created_at, m.metadata "
+        "FROM llmhub_threads t LEFT JOIN llmhub_thread_messages m "
+        "ON m.thread_id = t.id AND m.position >= $3 "
+        'WHERE t.id = $1 AND t."userId" = $2 ORDER BY m.position',
+        thread_id,
+        user_id,
+        start,
+    )
+
+
+async def insert_thread_messages(
+    pool: asyncpg.Pool, thread_id: str, start: int, messages: list
+) -> None:
+    """
+    Append messages to a thread at positions `start` onwards, all or none.
+
+    :param messages: Dictionaries with id, role, content, created_at and metadata.
+    :raises asyncpg.UniqueViolationError: If another writer already took one of
+        the positions.
+    :raises asyncpg.ForeignKeyViolationError: If the thread no longer exists.
+    """
+    await pool.executemany(
+        "INSERT INTO llmhub_thread_messages "
+        "(thread_id, position, id, role, content, created_at, metadata) "
+        "VALUES ($1, $2, $3, $4, $5, $6, $7::jsonb)",
+        [
+            (
+                thread_id,
+                start + i,
+                message["id"],
+                message["role"],
+                message["content"],
+                message["created_at"],
+                json.dumps(message["metadata"])
+                if message["metadata"] is not None
+                else None,
+            )
+            for i, message in enumerate(messages)
+        ],
+    )
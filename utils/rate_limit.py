@@ -0,0 +1,165 @@
+import os
+import math
+import asyncio
+import logging
+
+
+from typing import Dict, List, Optional, Tuple
+
+
+from utils.cache import Bucket, InMemoryStore, shared_store_from_env
+from utils.tokenizer import count_message_tokens
+
+
+class RateLimitExceeded(Exception):
+    """
+    Raised when a request cannot be admitted within the allowed queueing time.
+    """
+
+    status_code = 429
+
+    def __init__(self, scope: str, retry_after: float):
+        super().__init__(f"Rate limit exceeded for {scope}.")
+        self.scope = scope
+        self.retry_after = retry_after
+
+    @property
+    def retry_after_header(self) -> str:
+        return str(max(1, math.ceil(self.retry_after)))
+
+
+def estimate_tokens(request, prompt_tokens: Optional[int] = None) -> int:
+    """
+    Token cost of a chat request for budgeting: its prompt tokens plus the
+    requested completion budget.
+
+    :param request: The chat completion request.
+    :param prompt_tokens: Prompt tokens if already counted; counted otherwise.
+    """
+    if prompt_tokens is None:
+        prompt_tokens = count_message_tokens(request.messages)
+    return prompt_tokens + (request.max_completion_tokens or 0)
+
+
+class RateLimiter:
+    """
+    Token-bucket admission control on requests/sec and estimated tokens/min.
+
+    Every API key gets a requests/sec bucket (with `key_burst` capacity) and a
+    tokens/min bucket; each upstream provider can have the same pair. Buckets
+    live in the shared store when one is configured so the limits hold across
+    Function instances, and in process memory otherwise (or when the shared
+    store is unreachable). A request that would fit within `max_wait` seconds is
+    held until then instead of being rejected.
+    """
+
+    def __init__(
+        self,
+        key_rps: float = 0.0,
+        key_burst: float = 0.0,
+        key_tpm: float = 0.0,
+        provider_limits: Optional[Dict[str, Tuple[float, float]]] = None,
+        max_wait: float = 1.0,
+        shared=None,
+    ):
+        self.key_rps = key_rps
+        self.key_burst = key_burst or key_rps
+        self.key_tpm = key_tpm
+        self.provider_limits = provider_limits or {}
+        self.max_wait = max_wait
+        self.local = InMemoryStore()
+        self.shared = shared
+        self.admitted = 0
+        self.queued = 0
+        self.rejected = 0
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.key_rps or self.key_tpm or self.provider_limits)
+
+    def _buckets(
+        self, scope: str, rps: float, burst: float, tpm: float, tokens: int
+    ) -> List[Bucket]:
+        buckets = []
+        if rps:
+            buckets.append((f"llmhub:ratelimit:{scope}:rps", rps, burst, 1))
+        if tpm:
+            # A single request larger than a whole minute's budget may still run
+            # once the bucket is full, rather than never.
+            buckets.append(
+                (f"llmhub:ratelimit:{scope}:tpm", tpm / 60, tpm, min(tokens, tpm))
+            )
+        return buckets
+
+    async def _reserve(self, scope: str, buckets: List[Bucket]) -> None:
+        if not buckets:
+            return
+        granted, wait = None, 0.0
+        if self.shared is not None:
+            try:
+                granted, wait = await self.shared.reserve(buckets, self.max_wait)
+            except Exception as e:
+                logging.error(f"Shared rate limiter unavailable, using local buckets: {e}")
+        if granted is None:
+            granted, wait = await self.local.reserve(buckets, self.max_wait)
+
+        if not granted:
+            self.rejected += 1
+            raise RateLimitExceeded(scope, wait)
+        self.admitted += 1
+        if wait > 0:
+            self.queued += 1
+            await asyncio.sleep(wait)
+
+    async def acquire_key(self, key: str, tokens: int) -> None:
+        """
+        Admit one request for an API key, waiting briefly for headroom if needed.
+
+        :param key: Stable identifier of the API key (e.g. its token hash).
+        :param tokens: Estimated tokens the request will consume.
+        :raises RateLimitExceeded: If the key is out of budget for longer than `max_wait`.
+        """
+        await self._reserve(
+            "api key",
+            self._buckets(f"key:{key}", self.key_rps, self.key_burst, self.key_tpm, tokens),
+        )
+
+    async def acquire_provider(self, provider: str, tokens: int) -> None:
+        """
+        Admit one upstream call to a provider, waiting briefly for headroom if needed.
+
+        :param provider: Provider name, one of service.clients.PROVIDERS.
+        :param tokens: Estimated tokens the call will consume.
+        :raises RateLimitExceeded: If the provider is out of budget for longer than `max_wait`.
+        """
+        if provider not in self.provider_limits:
+            return
+        rps, tpm = self.provider_limits[provider]
+        await self._reserve(
+            provider, self._buckets(f"provider:{provider}", rps, rps, tpm, tokens)
+        )
+
+    def stats(self) -> Dict:
+        return {
+            "admitted": self.admitted,
+            "queued": self.queued,
+            "rejected": self.rejected,
+        }
+
+
+def rate_limiter_from_env(provider_limits: Dict[str, Tuple[float, float]]) -> RateLimiter:
+    """
+    Build the rate limiter configured in the environment.
+
+    :param provider_limits: Provider name -> (requests/sec, tokens/min); zero disables a limit.
+    """
+    return RateLimiter(
+        key_rps=float(os.getenv("RATE_LIMIT_KEY_RPS", "0")),
+        key_burst=float(os.getenv("RATE_LIMIT_KEY_BURST", "0")),
+        key_tpm=float(os.getenv("RATE_LIMIT_KEY_TPM", "0")),
+        provider_limits={
+            name: limits for name, limits in provider_limits.items() if any(limits)
+        },
+        max_wait=float(os.getenv("RATE_LIMIT_MAX_WAIT", "1.0")),
+        shared=shared_store_from_env(),
+    )
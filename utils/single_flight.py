@@ -0,0 +1,54 @@
+import asyncio
+
+
+from typing import Any, Awaitable, Callable, Dict, Tuple
+
+
+class SingleFlight:
+    """
+    Collapses concurrent calls that share a key into one execution.
+
+    The first caller for a key starts the call as its own task; callers that
+    arrive while it is running await the same task. The call is shielded, so a
+    caller that disconnects does not cancel it for the others.
+    """
+
+    def __init__(self):
+        self.calls: Dict[str, asyncio.Task] = {}
+        self.leaders = 0
+        self.followers = 0
+
+    async def do(
+        self, key: str, fn: Callable[[], Awaitable[Any]]
+    ) -> Tuple[Any, bool]:
+        """
+        Run `fn` once for all concurrent callers with the same key.
+
+        :param key: Identity of the call.
+        :param fn: Coroutine function to run if no call for `key` is in flight.
+        :return: Tuple of (result, whether it was shared from another caller's call).
+        """
+        task = self.calls.get(key)
+        shared = task is not None
+        if shared:
+            self.followers += 1
+        else:
+            self.leaders += 1
+            task = asyncio.create_task(fn())
+            self.calls[key] = task
+            task.add_done_callback(lambda done: self._forget(key, done))
+        return await asyncio.shield(task), shared
+
+    def _forget(self, key: str, task: asyncio.Task) -> None:
+        if self.calls.get(key) is task:
+            del self.calls[key]
+        if not task.cancelled():
+            # Mark the exception as retrieved when every caller has gone away.
+            task.exception()
+
+    def stats(self) -> Dict:
+        return {
+            "in_flight": len(self.calls),
+            "leaders": self.leaders,
+            "followers": self.followers,
+        }
@@ -0,0 +1,428 @@
+import os
+import re
+import time
+import uuid
+import asyncio
+import logging
+import importlib.util
+
+
+import httpx
+from contextlib import contextmanager
+from contextvars import ContextVar
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+)
+from prometheus_client.core import GaugeMetricFamily
+from starlette.datastructures import Headers
+
+
+from typing import Callable, Dict, List, Optional, Tuple
+
+
+TRACING_AVAILABLE = (
+    importlib.util.find_spec("opentelemetry") is not None
+    and importlib.util.find_spec("opentelemetry.sdk") is not None
+)
+TRACING_ENABLED = os.getenv("OTEL_TRACING_ENABLED", "false").lower() == "true"
+
+REQUEST_ID_HEADER = "X-Request-ID"
+# Caller-supplied request IDs are echoed back and forwarded upstream, so only
+# short header-safe values are kept; anything else is replaced by a new ID.
+REQUEST_ID_PATTERN = re.compile(r"^[A-Za-z0-9._:\-]{1,128}$")
+
+# Label used for the model and provider of requests that never got routed.
+UNROUTED = "none"
+
+STAGE_BUCKETS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0,
+)  # fmt: skip
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.0, 5.0, 10.0, 20.0, 30.0, 60.0, 120.0)
+
+STAGE_SECONDS = Histogram(
+    "llmhub_stage_duration_seconds",
+    "Time spent in each stage of serving a request.",
+    ["stage", "model", "provider"],
+    buckets=STAGE_BUCKETS,
+)
+REQUEST_SECONDS = Histogram(
+    "llmhub_request_duration_seconds",
+    "End-to-end request latency, until the last byte of the response was sent.",
+    ["endpoint", "status", "model"],
+    buckets=LATENCY_BUCKETS,
+)
+REQUESTS_IN_FLIGHT = Gauge(
+    "llmhub_requests_in_flight", "HTTP requests currently being served."
+)
+UPSTREAM_TTFB_SECONDS = Histogram(
+    "llmhub_upstream_ttfb_seconds",
+    "Time from starting a provider call until its response headers arrived.",
+    ["model", "provider"],
+    buckets=LATENCY_BUCKETS,
+)
+UPSTREAM_SECONDS = Histogram(
+    "llmhub_upstream_duration_seconds",
+    "Provider call latency; for streams, until the stream was opened.",
+    ["model", "provider", "outcome"],
+    buckets=LATENCY_BUCKETS,
+)
+TOKENS = Counter(
+    "llmhub_tokens_total",
+    "Tokens reported in response usage.",
+    ["model", "type", "cache"],
+)
+CHAT_CACHE = Counter(
+    "llmhub_chat_cache_total",
+    "Chat completions by response cache status.",
+    ["status"],
+)
+
+
+class RequestTrace:
+    """
+    Per-request telemetry state: the request ID, stage timings and the model
+    and provider the request was routed to.
+
+    Stage timings are kept until the response is finished so every stage can
+    be labelled with the model that was eventually used.
+    """
+
+    __slots__ = ("request_id", "started", "stages", "model", "provider", "span")
+
+    def __init__(self, request_id: str):
+        self.request_id = request_id
+        self.started = time.perf_counter()
+        self.stages: List[Tuple[str, float]] = []
+        self.model: Optional[str] = None
+        self.provider: Optional[str] = None
+        self.span = None
+
+    def finish(self, endpoint: str, status: int) -> None:
+        model = self.model or UNROUTED
+        provider = self.provider or UNROUTED
+        for name, seconds in self.stages:
+            STAGE_SECONDS.labels(name, model, provider).observe(seconds)
+        REQUEST_SECONDS.labels(endpoint, str(status), model).observe(
+            time.perf_counter() - self.started
+        )
+
+
+_request_trace: ContextVar[Optional[RequestTrace]] = ContextVar(
+    "llmhub_request_trace", default=None
+)
+# (model, provider, start time, TTFB recorded) for the provider call in progress.
+_upstream_call: ContextVar[Optional[list]] = ContextVar(
+    "llmhub_upstream_call", default=None
+)
+
+_tracer = None
+_tracer_provider = None
+_propagate = None
+_span_kind = None
+
+
+def setup_tracing() -> None:
+    """
+    Export spans over OTLP/HTTP when OTEL_TRACING_ENABLED=true.
+
+    The exporter follows the standard OTEL_EXPORTER_OTLP_* variables and
+    defaults to a collector on localhost:4318.
+    """
+    global _tracer, _tracer_provider, _propagate, _span_kind
+    if not TRACING_ENABLED or _tracer is not None:
+        return
+    if not TRACING_AVAILABLE:
+        logging.error(
+            "OTEL_TRACING_ENABLED is set but opentelemetry-sdk is not installed; "
+            "tracing is disabled."
+        )
+        return
+    from opentelemetry import propagate, trace
+    from opentelemetry.exporter.otlp.proto.http.trace_exporter import (
+        OTLPSpanExporter,
+    )
+    from opentelemetry.sdk.resources import Resource
+    from opentelemetry.sdk.trace import TracerProvider
+    from opentelemetry.sdk.trace.export import BatchSpanProcessor
+
+    _tracer_provider = TracerProvider(
+        resource=Resource.create(
+            {"service.name": os.getenv("OTEL_SERVICE_NAME", "llmhub")}
+        )
+    )
+    _tracer_provider.add_span_processor(BatchSpanProcessor(OTLPSpanExporter()))
+    trace.set_tracer_provider(_tracer_provider)
+    _tracer = _tracer_provider.get_tracer("llmhub")
+    _propagate = propagate
+    _span_kind = trace.SpanKind
+    logging.info("OpenTelemetry tracing enabled.")
+
+
+async def shutdown_tracing() -> None:
+    """
+    Flush buffered spans and stop the exporter.
+    """
+    global _tracer, _tracer_provider
+    if _tracer_provider is not None:
+        await asyncio.to_thread(_tracer_provider.shutdown)
+    _tracer = _tracer_provider = None
+
+
+@contextmanager
+def _span(name: str, kind: Optional[str] = None, attributes: Optional[Dict] = None):
+    if _tracer is None:
+        yield None
+        return
+    with _tracer.start_as_current_span(
+        name,
+        kind=getattr(_span_kind, kind) if kind else _span_kind.INTERNAL,
+        attributes=attributes,
+    ) as span:
+        yield span
+
+
+def current_request_id() -> Optional[str]:
+    trace = _request_trace.get()
+    return trace.request_id if trace is not None else None
+
+
+@contextmanager
+def stage(name: str):
+    """
+    Time one stage of the current request and trace it as a span.
+
+    Outside a request (background work) the stage is recorded right away
+    without a model or provider.
+    """
+    started = time.perf_counter()
+    try:
+        with _span(name):
+            yield
+    finally:
+        elapsed = time.perf_counter() - started
+        trace = _request_trace.get()
+        if trace is not None:
+            trace.stages.append((name, elapsed))
+        else:
+            STAGE_SECONDS.labels(name, UNROUTED, UNROUTED).observe(elapsed)
+
+
+def set_route(model: str, provider: str) -> None:
+    """
+    Record the model and provider that serve the current request.
+    """
+    trace = _request_trace.get()
+    if trace is None:
+        return
+    trace.model, trace.provider = model, provider
+    if trace.span is not None:
+        trace.span.set_attribute("llmhub.model", model)
+        trace.span.set_attribute("llmhub.provider", provider)
+
+
+@contextmanager
+def upstream_call(model: str, provider: str):
+    """
+    Instrument one provider call: latency by outcome, time to response headers
+    (for providers called over httpx) and a client span whose context is sent
+    upstream.
+    """
+    set_route(model, provider)
+    started = time.perf_counter()
+    token = _upstream_call.set([model, provider, started, False])
+    outcome = "error"
+    try:
+        with _span(
+            f"upstream {provider}",
+            kind="CLIENT",
+            attributes={"llmhub.model": model, "llmhub.provider": provider},
+        ):
+            yield
+        outcome = "ok"
+    except asyncio.CancelledError:
+        outcome = "cancelled"
+        raise
+    finally:
+        _upstream_call.reset(token)
+        elapsed = time.perf_counter() - started
+        UPSTREAM_SECONDS.labels(model, provider, outcome).observe(elapsed)
+        trace = _request_trace.get()
+        if trace is not None:
+            trace.stages.append(("upstream", elapsed))
+
+
+async def on_upstream_request(request: httpx.Request) -> None:
+    """
+    httpx request hook: forward the request ID and trace context upstream.
+    """
+    request_id = current_request_id()
+    if request_id is not None and REQUEST_ID_HEADER not in request.headers:
+        request.headers[REQUEST_ID_HEADER] = request_id
+    if _propagate is not None:
+        _propagate.inject(request.headers)
+
+
+async def on_upstream_response(response: httpx.Response) -> None:
+    """
+    httpx response hook: record the time to the first response headers.
+    """
+    call = _upstream_call.get()
+    if call is not None and not call[3]:
+        call[3] = True
+        UPSTREAM_TTFB_SECONDS.labels(call[0], call[1]).observe(
+            time.perf_counter() - call[2]
+        )
+
+
+def record_usage(model: Optional[str], usage, cache_hit: bool = False) -> None:
+    """
+    Count the tokens in a response's Usage.
+    """
+    if usage is None:
+        return
+    model = model or UNROUTED
+    cache = "hit" if cache_hit else "miss"
+    for kind in ("prompt", "completion", "cached"):
+        tokens = getattr(usage, f"{kind}_tokens", None)
+        if tokens:
+            TOKENS.labels(model, kind, cache).inc(tokens)
+
+
+def record_cache_status(status: Optional[str]) -> None:
+    CHAT_CACHE.labels(status or "disabled").inc()
+
+
+class StatsCollector:
+    """
+    Exposes the `stats()` dictionaries of long-lived components as gauges.
+
+    Sources are read at scrape time, so queue depths and cache counters cost
+    nothing between scrapes. Numeric values become `llmhub_<component>_<key>`;
+    with `label`, the source returns one dictionary per label value (e.g. per
+    provider).
+    """
+
+    def __init__(self):
+        self.sources: Dict[str, Tuple[Callable[[], Dict], Optional[str]]] = {}
+
+    def register(
+        self, component: str, source: Callable[[], Dict], label: Optional[str] = None
+    ) -> None:
+        self.sources[component] = (source, label)
+
+    def collect(self):
+        for component, (source, label) in list(self.sources.items()):
+            try:
+                stats = source()
+            except Exception as e:
+                logging.error(f"Failed to collect {component} stats: {e}")
+                continue
+            rows = stats.items() if label else [(None, stats)]
+            families: Dict[str, GaugeMetricFamily] = {}
+            for label_value, values in rows:
+                for key, value in values.items():
+                    if isinstance(value, bool):
+                        value = int(value)
+                    if not isinstance(value, (int, float)):
+                        continue
+                    name = f"llmhub_{component}_{key}"
+                    family = families.get(name)
+                    if family is None:
+                        family = families[name] = GaugeMetricFamily(
+                            name,
+                            f"{component} {key.replace('_', ' ')}",
+                            labels=[label] if label else [],
+                        )
+                    family.add_metric([str(label_value)] if label else [], value)
+            yield from families.values()
+
+
+stats_collector = StatsCollector()
+REGISTRY.register(stats_collector)
+
+
+def metrics_payload() -> Tuple[bytes, str]:
+    """
+    :return: Tuple of (Prometheus exposition of every metric, its content type).
+    """
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
+
+
+class TelemetryMiddleware:
+    """
+    ASGI middleware that gives every HTTP request an ID and a trace.
+
+    The ID comes from the caller's X-Request-ID header when it is a safe
+    value, is returned in the response's X-Request-ID header and is forwarded
+    to providers. The request's server span continues any incoming W3C trace
+    context. Stage timings and the request latency are recorded once the last
+    byte of the response, streamed or not, has been sent.
+    """
+
+    def __init__(self, app, exclude: Tuple[str, ...] = ("/metrics",)):
+        self.app = app
+        self.exclude = exclude
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] in self.exclude:
+            await self.app(scope, receive, send)
+            return
+
+        headers = Headers(scope=scope)
+        request_id = headers.get(REQUEST_ID_HEADER)
+        if not request_id or not REQUEST_ID_PATTERN.match(request_id):
+            request_id = uuid.uuid4().hex
+        # Read by the exception handlers, which run outside this middleware.
+        scope.setdefault("state", {})["request_id"] = request_id
+        trace = RequestTrace(request_id)
+        token = _request_trace.set(trace)
+        status = [500]
+
+        async def send_with_request_id(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+                message["headers"] = list(message.get("headers", [])) + [
+                    (b"x-request-id", request_id.encode())
+                ]
+            await send(message)
+
+        REQUESTS_IN_FLIGHT.inc()
+        try:
+            with self._server_span(scope, headers) as span:
+                trace.span = span
+                if span is not None:
+                    span.set_attribute("llmhub.request_id", request_id)
+                try:
+                    await self.app(scope, receive, send_with_request_id)
+                finally:
+                    if span is not None:
+                        span.set_attribute("http.response.status_code", status[0])
+                        span.update_name(f"{scope['method']} {_endpoint(scope)}")
+        finally:
+            REQUESTS_IN_FLIGHT.dec()
+            _request_trace.reset(token)
+            trace.finish(_endpoint(scope), status[0])
+
+    @contextmanager
+    def _server_span(self, scope, headers: Headers):
+        if _tracer is None:
+            yield None
+            return
+        with _tracer.start_as_current_span(
+            scope["method"],
+            context=_propagate.extract(dict(headers)),
+            kind=_span_kind.SERVER,
+            attributes={"http.request.method": scope["method"]},
+        ) as span:
+            yield span
+
+
+def _endpoint(scope) -> str:
+    # The route template, so IDs in paths do not become label values.
+    route = scope.get("route")
+    return getattr(route, "path", "unmatched")
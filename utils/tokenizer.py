@@ -0,0 +1,198 @@
+import os
+import math
+import asyncio
+import logging
+import threading
+import importlib.util
+
+
+from cachetools import LRUCache
+from functools import lru_cache
+from typing import List, Optional
+
+
+TIKTOKEN_AVAILABLE = importlib.util.find_spec("tiktoken") is not None
+
+DEFAULT_MODEL = "gpt-4o-mini"
+
+# Encoding per model family. Only the OpenAI models use these vocabularies
+# natively; for the others cl100k_base is a close stand-in for budgeting.
+MODEL_ENCODINGS = {
+    "gpt-4o-mini": "o200k_base",
+    "claude-3.5-sonnet": "cl100k_base",
+    "gemini-1.5-flash": "cl100k_base",
+    "meta-llama": "cl100k_base",
+    "mistral-nemo": "cl100k_base",
+}
+
+# Context window (prompt + completion) per model, in tokens.
+CONTEXT_WINDOWS = {
+    "gpt-4o-mini": 128000,
+    "claude-3.5-sonnet": 200000,
+    "gemini-1.5-flash": 1048576,
+    "meta-llama": 128000,
+    "mistral-nemo": 128000,
+}
+
+# Chat formatting overhead, following OpenAI's accounting: every message is
+# wrapped in a few special tokens and the reply is primed with three more.
+TOKENS_PER_MESSAGE = 3
+REPLY_PRIMING_TOKENS = 3
+
+# Texts shorter than this are cheaper to count than to look up.
+COUNT_CACHE_MIN_CHARS = 256
+# Prompts larger than this are counted off the event loop.
+OFFLOAD_CHARS = int(os.getenv("TOKENIZER_OFFLOAD_CHARS", "20000"))
+# Truncation drops old turns in multiples of this, so the kept conversation
+# starts at the same turn for several requests and provider prompt caches,
+# which match on an identical prefix, keep hitting.
+TRUNCATE_DROP_STEP = max(int(os.getenv("TRUNCATE_DROP_STEP", "8")), 1)
+
+_count_cache = LRUCache(maxsize=int(os.getenv("TOKENIZER_CACHE_SIZE", "4096")))
+# Counts are also taken from worker threads (see count_prompt_tokens).
+_count_cache_lock = threading.Lock()
+
+
+@lru_cache(maxsize=None)
+def get_encoding(name: str):
+    """
+    Load a tiktoken encoding once per process.
+
+    :param name: Encoding name, e.g. "o200k_base".
+    :return: The encoding, or None when tiktoken or its vocabulary is unavailable,
+        in which case token counts fall back to an estimate.
+    """
+    if not TIKTOKEN_AVAILABLE:
+        return None
+    import tiktoken
+
+    try:
+        return tiktoken.get_encoding(name)
+    except Exception as e:
+        logging.error(f"Failed to load tokenizer {name}, estimating token counts: {e}")
+        return None
+
+
+def encoding_name(model: Optional[str]) -> str:
+    return MODEL_ENCODINGS.get(model or DEFAULT_MODEL, "cl100k_base")
+
+
+def estimate_text_tokens(text: str) -> int:
+    """
+    Tokenizer-free estimate: about four UTF-8 bytes per token, which holds for
+    English and over-counts slightly for code and non-Latin scripts.
+    """
+    return math.ceil(len(text.encode("utf-8")) / 4)
+
+
+def count_text_tokens(text: str, model: Optional[str] = None) -> int:
+    """
+    Count the tokens in a piece of text with the model family's encoding.
+
+    Counts of longer texts are cached by content, so conversation history that is
+    re-sent on every turn is only tokenized once.
+    """
+    if not text:
+        return 0
+    name = encoding_name(model)
+    key = None
+    if len(text) >= COUNT_CACHE_MIN_CHARS:
+        key = (name, len(text), hash(text))
+        with _count_cache_lock:
+            count = _count_cache.get(key)
+        if count is not None:
+            return count
+
+    encoding = get_encoding(name)
+    if encoding is None:
+        count = estimate_text_tokens(text)
+    else:
+        count = len(encoding.encode_ordinary(text))
+
+    if key is not None:
+        with _count_cache_lock:
+            _count_cache[key] = count
+    return count
+
+
+def count_message_tokens(messages: List, model: Optional[str] = None) -> int:
+    """
+    Count the prompt tokens of a chat request's messages, including formatting.
+
+    :param messages: The request's Message list.
+    :param model: Model whose encoding to use; defaults to DEFAULT_MODEL.
+    :return: Number of prompt tokens.
+    """
+    total = REPLY_PRIMING_TOKENS
+    for message in messages:
+        total += TOKENS_PER_MESSAGE + count_text_tokens(message.content, model)
+    return total
+
+
+async def count_prompt_tokens(messages: List, model: Optional[str] = None) -> int:
+    """
+    `count_message_tokens`, moved to a worker thread for large prompts so
+    tokenization does not stall other requests (tiktoken releases the GIL).
+    """
+    if sum(len(message.content) for message in messages) < OFFLOAD_CHARS:
+        return count_message_tokens(messages, model)
+    return await asyncio.to_thread(count_message_tokens, messages, model)
+
+
+def truncate_text_tokens(text: str, max_tokens: int, model: Optional[str] = None) -> str:
+    """
+    Keep the last `max_tokens` tokens of a text (the end of a prompt usually
+    carries the actual question).
+    """
+    if max_tokens <= 0:
+        return ""
+    encoding = get_encoding(encoding_name(model))
+    if encoding is None:
+        encoded = text.encode("utf-8")
+        return encoded[-max_tokens * 4 :].decode("utf-8", errors="ignore")
+    tokens = encoding.encode_ordinary(text)
+    if len(tokens) <= max_tokens:
+        return text
+    return encoding.decode(tokens[-max_tokens:])
+
+
+def warm_encodings() -> None:
+    """
+    Load every model family's encoding up front, so the first request does not
+    pay for reading (or downloading) the vocabulary.
+    """
+    for name in set(MODEL_ENCODINGS.values()):
+        get_encoding(name)
+
+
+def truncate_messages(messages: List, max_prompt_tokens: int, model: Optional[str] = None):
+    """
+    Shrink a conversation to fit `max_prompt_tokens`.
+
+    System messages and the final message are kept; the oldest other turns are
+    dropped first, TRUNCATE_DROP_STEP at a time, then the start of the final
+    message is cut.
+
+    :param messages: The request's Message list.
+    :param max_prompt_tokens: Prompt budget in tokens.
+    :param model: Model whose encoding to use.
+    :return: The shortened message list, or None if the system messages alone
+        exceed the budget.
+    """
+    last = messages[-1]
+    system = [message for message in messages[:-1] if message.role == "system"]
+    history = [message for message in messages[:-1] if message.role != "system"]
+
+    dropped = 0
+    while dropped < len(history) and count_message_tokens(system + history[dropped:] + [last], model) > max_prompt_tokens:
+        dropped += 1
+    dropped = min(-(-dropped // TRUNCATE_DROP_STEP) * TRUNCATE_DROP_STEP, len(history))
+    kept = system + history[dropped:]
+    if count_message_tokens(kept + [last], model) <= max_prompt_tokens:
+        return kept + [last]
+
+    allowed = max_prompt_tokens - count_message_tokens(kept, model) - TOKENS_PER_MESSAGE
+    if allowed <= 0:
+        return None
+    content = truncate_text_tokens(last.content, allowed, model)
+    return kept + [last.model_copy(update={"content": content})]